@@ -1,33 +1,48 @@
+import importlib
+import time
 import streamlit as st
-from team_intro import introduction_page  # Import for the 'Introduction and Summary' page
-from data_cleaning import data_cleaning_page  # Import for the 'Data Cleaning' page
-from eda import eda_page  # Import for the 'Exploratory Data Analysis' page
-from ml_model import ml_model_page  # Import for the 'ML Model Creation' page
-from business_insights import business_insights_page  # Import for the 'Business Insights' page
-from simulation import bike_usage_simulation  # Import the 'Simulation' page function
+from perf import configure_logging, perf_panel, section, start_rerun
+
+# Page registry: menu label -> (module, page function). Modules are imported on first selection,
+# so heavy dependencies (plotting libraries, sklearn, the model) only load for pages that need them.
+PAGES = {
+    "Introduction and Summary": ("team_intro", "introduction_page"),
+    "Data Cleaning": ("data_cleaning", "data_cleaning_page"),
+    "Exploratory Data Analysis": ("eda", "eda_page"),
+    "ML Model Creation": ("ml_model", "ml_model_page"),
+    "Business Insights": ("business_insights", "business_insights_page"),
+    "Simulation": ("simulation", "bike_usage_simulation"),
+}
+
+# Seconds spent importing each page module in this process
+import_times = {}
+
+
+# Import a page module on first use and return its page function
+def load_page(selection):
+    module_name, function_name = PAGES[selection]
+    if module_name not in import_times:
+        start = time.perf_counter()
+        with section(f"Import {module_name}"):
+            importlib.import_module(module_name)
+        import_times[module_name] = time.perf_counter() - start
+    return getattr(importlib.import_module(module_name), function_name)
+
 
 # Main app function
 def main():
+    configure_logging()
+    start_rerun()
     st.sidebar.title("Menu")
-    selection = st.sidebar.radio(
-        "Choose a page:",
-        ["Introduction and Summary", "Data Cleaning", "Exploratory Data Analysis",
-         "ML Model Creation", "Business Insights", "Simulation"]
-    )
+    selection = st.sidebar.radio("Choose a page:", list(PAGES))
 
     # Page selection logic
-    if selection == "Introduction and Summary":
-        introduction_page()
-    elif selection == "Data Cleaning":
-        data_cleaning_page()
-    elif selection == "Exploratory Data Analysis":
-        eda_page()
-    elif selection == "ML Model Creation":
-        ml_model_page()
-    elif selection == "Business Insights":
-        business_insights_page()
-    elif selection == "Simulation":
-        bike_usage_simulation()  # Calls the simulation page from simulation.py
+    page = load_page(selection)
+    with section(selection):
+        page()
+
+    # Per-section timings of this rerun, only with ?debug=1 or BIKE_APP_DEBUG=1
+    perf_panel()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,15 @@
+import streamlit as st
+from drift import DriftMonitor, load_baseline
+from model_router import ModelRouter
+
+
+# One router per process: station models are loaded on demand and evicted least recently used first
+@st.cache_resource
+def get_router():
+    return ModelRouter()
+
+
+# Drift monitor of the default model's live predictions, shared by every session
+@st.cache_resource
+def get_drift_monitor(version):
+    return DriftMonitor(load_baseline())
@@ -0,0 +1,154 @@
+import os
+from math import factorial
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from model_store import TREE_ARRAYS, ServingModel, flatten_ensemble, init_prediction
+from scoring import FEATURE_COLUMNS, split_pipeline
+
+# Shapley tables hold 2 ** depth branch patterns per root-to-leaf path, which bounds the supported depth
+MAX_ATTRIBUTION_DEPTH = 6
+
+
+# Path-dependent TreeSHAP over the padded trees of model_store.flatten_ensemble.
+# Along one root-to-leaf path the leaf contributes v * prod(o_j if j in S else z_j) to E[f(x) | x_S],
+# where z_j is the fraction of training weight following the path at feature j's splits and o_j (0 or 1)
+# says whether x follows it. o only takes 2 ** m values on a path with m distinct features, so every
+# feature's Shapley share is precomputed per path and pattern; explaining rows is then a comparison,
+# a table gather and one matrix product.
+class PathAttribution:
+    def __init__(self, tree_feature, tree_threshold, tree_leaf_value, tree_cover, init, learning_rate, n_features):
+        n_internal = tree_feature.shape[1]
+        depth = int(np.log2(n_internal + 1))
+        if depth > MAX_ATTRIBUTION_DEPTH:
+            raise ValueError(f"Trees of depth {depth} are too deep for attribution tables (max {MAX_ATTRIBUTION_DEPTH})")
+        self.depth = depth
+        self.n_features = n_features
+
+        # Padded node and branch (1 = right) at every level of every root-to-leaf path
+        leaves = np.arange(2 ** depth)
+        levels = np.arange(depth)
+        nodes = (2 ** levels - 1) + (leaves[:, None] >> (depth - levels))
+        right = (leaves[:, None] >> (depth - levels - 1)) & 1
+        children = 2 * nodes + 1 + right
+
+        # Paths never reached in training (right branches of pass-through nodes) carry no weight
+        trees, leaf = np.nonzero(tree_cover[:, n_internal + leaves] > 0)
+        node = nodes[leaf]
+        self.path_feature = tree_feature[trees[:, None], node]
+        self.path_threshold = tree_threshold[trees[:, None], node]
+        self.path_right = right[leaf].astype(bool)
+        ratio = tree_cover[trees[:, None], children[leaf]] / tree_cover[trees[:, None], node]
+        value = learning_rate * tree_leaf_value[trees, leaf]
+        n_paths = len(trees)
+        rows = np.arange(n_paths)
+
+        # Repeated features on a path share one slot; pass-through nodes go to the spare slot `depth`
+        passthrough = np.isinf(self.path_threshold)
+        self.slot = np.full((n_paths, depth), depth)
+        slot_feature = np.full((n_paths, depth), -1)
+        n_used = np.zeros(n_paths, dtype=int)
+        for k in range(depth):
+            match = slot_feature == self.path_feature[:, k:k + 1]
+            seen = match.any(axis=1)
+            new = ~passthrough[:, k] & ~seen
+            self.slot[:, k] = np.where(passthrough[:, k], depth, np.where(seen, match.argmax(axis=1), n_used))
+            slot_feature[new, n_used[new]] = self.path_feature[new, k]
+            n_used += new
+        self.used = np.arange(depth) < n_used[:, None]
+
+        z = np.ones((n_paths, depth + 1))
+        for k in range(depth):
+            z[rows, self.slot[:, k]] *= ratio[:, k]
+        z = z[:, :depth]
+        self.expected_value = init + float(np.sum(value * np.prod(z, axis=1)))
+
+        # table[p, pattern, i]: Shapley share of slot i on path p when x follows the path at the slots set in pattern
+        patterns = (np.arange(2 ** depth)[:, None] >> np.arange(depth)) & 1
+        weights = np.array([[factorial(s) * factorial(m - s - 1) / factorial(m) if s < m else 0.0
+                             for s in range(depth + 1)] for m in range(depth + 1)])[n_used]
+        self.table = np.zeros((n_paths, 2 ** depth, depth))
+        for i in range(depth):
+            coefficients = np.zeros((n_paths, 2 ** depth, depth + 1))
+            coefficients[..., 0] = 1.0
+            for j in range(depth):
+                if j == i:
+                    continue
+                # Multiply the polynomial by (z_j + o_j t); unused slots multiply by 1
+                zj = np.where(self.used[:, j], z[:, j], 1.0)[:, None, None]
+                oj = (patterns[None, :, j] * self.used[:, j:j + 1])[..., None]
+                shifted = np.concatenate([np.zeros_like(coefficients[..., :1]), coefficients[..., :-1]], axis=-1)
+                coefficients = coefficients * zj + shifted * oj
+            share = (coefficients * weights[:, None, :]).sum(axis=-1)
+            self.table[..., i] = np.where(self.used[:, i:i + 1], value[:, None] * (patterns[None, :, i] - z[:, i:i + 1]) * share, 0.0)
+
+        # Sparse slot -> encoded feature matrix, so contributions of all paths are summed with one product
+        used_rows = np.nonzero(self.used.ravel())[0]
+        self.slot_matrix = sparse.csr_matrix((np.ones(len(used_rows)), (used_rows, slot_feature.ravel()[used_rows])),
+                                             shape=(n_paths * depth, n_features))
+        # Pattern bit of every path node (0 for pass-through nodes) and the bits of each path's used slots
+        self.slot_bits = np.where(self.slot < depth, 1 << np.minimum(self.slot, depth - 1), 0).astype(np.uint8)
+        self.used_bits = (self.used * (1 << np.arange(depth))).sum(axis=1).astype(np.uint8)
+        self.flat_table = self.table.reshape(-1, depth)
+
+    # (rows, encoded features) contributions; rows are processed in chunks to bound memory
+    def contributions(self, X_encoded, chunk_cells=1 << 20):
+        # sklearn compares float32 features against float64 thresholds, do the same for identical splits
+        X = np.asarray(X_encoded, dtype=np.float32).astype(np.float64)
+        n_paths = len(self.path_feature)
+        offsets = np.arange(n_paths) * 2 ** self.depth
+        result = np.empty((len(X), self.n_features))
+        step = max(1, chunk_cells // (n_paths * self.depth))
+        for start in range(0, len(X), step):
+            x = X[start:start + step]
+            leaves_path = (x[:, self.path_feature] > self.path_threshold) != self.path_right
+            # A slot's bit is set when x follows the path at every node of that feature
+            missed = np.bitwise_or.reduce(leaves_path * self.slot_bits, axis=2)
+            pattern = self.used_bits & ~missed
+            shares = np.take(self.flat_table, offsets + pattern, axis=0)
+            result[start:start + step] = (self.slot_matrix.T @ shares.reshape(len(x), -1).T).T
+        return result
+
+
+# Attribution model for a fitted GradientBoostingRegressor, None for engines without flat trees
+def attribution_from_regressor(regressor):
+    if not hasattr(regressor, 'estimators_'):
+        return None
+    arrays, depth = flatten_ensemble(regressor)
+    if depth > MAX_ATTRIBUTION_DEPTH:
+        return None
+    return PathAttribution(init=init_prediction(regressor), learning_rate=regressor.learning_rate,
+                           n_features=regressor.n_features_in_, **arrays)
+
+
+# Encoded column -> model feature, so one-hot columns add up to their source feature
+def encoded_feature_groups(encoder):
+    groups = []
+    for name in encoder.get_feature_names_out():
+        name = str(name).split('__', 1)[-1]
+        groups.append(next(f for f in FEATURE_COLUMNS if name == f or name.startswith(f + '_')))
+    return groups
+
+
+# Per-row contributions of every model feature plus the baseline, summing to the unclipped prediction
+def feature_contributions(model, attribution, features):
+    encoder, _ = split_pipeline(model)
+    encoded = attribution.contributions(encoder.transform(features[FEATURE_COLUMNS]))
+    frame = pd.DataFrame(encoded, columns=encoded_feature_groups(encoder), index=features.index)
+    frame = frame.T.groupby(level=0).sum().T.reindex(columns=FEATURE_COLUMNS)
+    frame.insert(0, 'baseline', attribution.expected_value)
+    return frame
+
+
+# Attribution model for the deployed model. Artifacts that carry tree_cover.npy are read from their
+# memory-mapped arrays; older artifacts and pickled pipelines are flattened again from the full pipeline.
+def load_attribution(model):
+    if isinstance(model, ServingModel):
+        manifest, ensemble = model.manifest, model.manifest['ensemble']
+        if ensemble is not None and 'tree_cover.npy' in manifest['files'] and ensemble['depth'] <= MAX_ATTRIBUTION_DEPTH:
+            arrays = {name: np.load(os.path.join(model.directory, f'{name}.npy'), mmap_mode='r')
+                      for name in TREE_ARRAYS + ['tree_cover']}
+            return PathAttribution(init=ensemble['init'], learning_rate=ensemble['learning_rate'],
+                                   n_features=len(manifest['encoded_feature_names']), **arrays)
+    pipeline = model.pipeline() if isinstance(model, ServingModel) else model
+    return attribution_from_regressor(split_pipeline(pipeline)[1])
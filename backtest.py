@@ -0,0 +1,173 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.linear_model import Ridge
+from model_store import ModelArtifactError, current_pipeline
+from scoring import model_version, split_pipeline
+from training import DATA_PATH, GBR_PARAMS, HGB_PARAMS, RANDOM_STATE, make_encoder, prepare_training_data
+
+WINDOWS = ['expanding', 'sliding']
+MIN_TRAIN_MONTHS = 12   # the first fold trains on all of 2011
+SLIDING_MONTHS = 12
+
+# Regressors compared against the deployed gradient boosting model, all fitted on the same encoded matrix
+ALTERNATIVES = {
+    'hgb': lambda: HistGradientBoostingRegressor(random_state=RANDOM_STATE, **HGB_PARAMS),
+    'extra_trees': lambda: ExtraTreesRegressor(n_estimators=200, min_samples_leaf=2, n_jobs=1, random_state=RANDOM_STATE),
+    'ridge': lambda: Ridge(alpha=1.0),
+}
+MODELS = ['gbr'] + list(ALTERNATIVES)
+
+# Encoded matrices by hour.csv version, built once and shared by every fold
+_matrix_cache = {}
+
+
+# (label, unfitted regressor): a copy of the deployed gradient boosting model, or the training defaults
+# when no model is deployed or the deployed engine is another one (hgb's name-based categorical_features
+# cannot be fitted on the one-hot matrix)
+def deployed_regressor():
+    try:
+        regressor = split_pipeline(current_pipeline())[1]
+    except ModelArtifactError:
+        regressor = None
+    if isinstance(regressor, GradientBoostingRegressor):
+        return 'gbr (deployed)', clone(regressor)
+    return 'gbr (training defaults)', GradientBoostingRegressor(random_state=RANDOM_STATE, **GBR_PARAMS)
+
+
+def make_regressor(name):
+    if name == 'gbr':
+        return deployed_regressor()
+    if name in ALTERNATIVES:
+        return name, ALTERNATIVES[name]()
+    raise ValueError(f"Unknown model {name!r}, expected one of {MODELS}")
+
+
+# One-hot encode hour.csv once. The hourly-average columns are target means, so they are
+# recomputed inside every fold from its training months; everything else is reused as is.
+def encoded_matrix(path=DATA_PATH):
+    version = model_version(path)
+    if version not in _matrix_cache:
+        data = pd.read_csv(path)
+        X, y = prepare_training_data(data)
+        encoder = make_encoder().fit(X)
+        names = [str(name) for name in encoder.get_feature_names_out()]
+        _matrix_cache[version] = {
+            'X': np.ascontiguousarray(encoder.transform(X), dtype=float),
+            'y': y.to_numpy(dtype=float),
+            # Months since January 2011 and the (mnth, weekday, hr) cell of each row
+            'period': (data['yr'] * 12 + data['mnth'] - 1).to_numpy(),
+            'cell': ((data['mnth'] - 1) * 168 + data['weekday'] * 24 + data['hr']).to_numpy(),
+            'workingday': data['workingday'].to_numpy() == 1,
+            'average_columns': [names.index('remainder__hourly_avg_workingday'),
+                                names.index('remainder__hourly_avg_nonworkingday')],
+        }
+    return _matrix_cache[version]
+
+
+# Monthly folds: test on one month, train on every earlier month or the last window months
+def monthly_folds(periods, window='expanding', min_train_months=MIN_TRAIN_MONTHS, window_months=SLIDING_MONTHS):
+    if window not in WINDOWS:
+        raise ValueError(f"Unknown window {window!r}, expected one of {WINDOWS}")
+    last = int(periods.max())
+    folds = []
+    for test_period in range(min_train_months, last + 1):
+        start = 0 if window == 'expanding' else max(test_period - window_months, 0)
+        folds.append((start, test_period))
+    return folds
+
+
+# Per-cell mean of y over the given rows, 0 for cells that were never seen (as in training)
+def cell_means(cells, y, mask):
+    sums = np.bincount(cells[mask], weights=y[mask], minlength=12 * 168)
+    counts = np.bincount(cells[mask], minlength=12 * 168)
+    return np.divide(sums, counts, out=np.zeros(len(sums)), where=counts > 0)
+
+
+# Fit and score one (model, fold); hourly averages only use the fold's training months
+def run_fold(name, matrix, start, test_period):
+    period, cell, working, y = matrix['period'], matrix['cell'], matrix['workingday'], matrix['y']
+    train = (period >= start) & (period < test_period)
+    test = period == test_period
+
+    X = matrix['X'].copy()
+    working_means = cell_means(cell, y, train & working)
+    non_working_means = cell_means(cell, y, train & ~working)
+    column_w, column_nw = matrix['average_columns']
+    X[:, column_w] = np.where(working, working_means[cell], 0)
+    X[:, column_nw] = np.where(~working, non_working_means[cell], 0)
+
+    label, regressor = make_regressor(name)
+    fit_start = time.perf_counter()
+    regressor.fit(X[train], y[train])
+    fit_s = time.perf_counter() - fit_start
+
+    predict_start = time.perf_counter()
+    predictions = regressor.predict(X[test])
+    predict_s = time.perf_counter() - predict_start
+    single_start = time.perf_counter()
+    regressor.predict(X[test][:1])
+    single_ms = (time.perf_counter() - single_start) * 1000
+
+    residuals = y[test] - predictions
+    return {
+        'model': label,
+        'train_start': start,
+        'test_month': test_period,
+        'train_rows': int(train.sum()),
+        'test_rows': int(test.sum()),
+        'MAE': float(np.mean(np.abs(residuals))),
+        'RMSE': float(np.sqrt(np.mean(residuals ** 2))),
+        'bias': float(np.mean(predictions - y[test])),
+        'fit_s': fit_s,
+        'predict_us_per_row': predict_s / max(int(test.sum()), 1) * 1e6,
+        'single_row_ms': single_ms,
+    }
+
+
+def month_label(period):
+    return f'{2011 + period // 12}-{period % 12 + 1:02d}'
+
+
+# Run every (model, fold) pair in parallel; the encoded matrix is memory-mapped into the workers
+def backtest(models=MODELS, window='expanding', min_train_months=MIN_TRAIN_MONTHS,
+             window_months=SLIDING_MONTHS, n_jobs=-1, path=DATA_PATH):
+    matrix = encoded_matrix(path)
+    folds = monthly_folds(matrix['period'], window, min_train_months, window_months)
+    rows = Parallel(n_jobs=n_jobs)(
+        delayed(run_fold)(name, matrix, start, test_period) for name in models for start, test_period in folds
+    )
+    results = pd.DataFrame(rows)
+    results['train_start'] = results['train_start'].map(month_label)
+    results['test_month'] = results['test_month'].map(month_label)
+    return results
+
+
+# Mean error and latency per model across folds
+def summarize(results):
+    return results.groupby('model')[['MAE', 'RMSE', 'bias', 'fit_s', 'predict_us_per_row', 'single_row_ms']].mean() \
+        .sort_values('RMSE')
+
+
+# python backtest.py [--window expanding|sliding] [--models gbr,hgb] [--n-jobs -1] [--output folds.csv]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rolling-origin monthly backtest over hour.csv')
+    parser.add_argument('--window', choices=WINDOWS, default='expanding')
+    parser.add_argument('--models', default=','.join(MODELS))
+    parser.add_argument('--min-train-months', type=int, default=MIN_TRAIN_MONTHS)
+    parser.add_argument('--window-months', type=int, default=SLIDING_MONTHS)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--output', help='write the per-fold table to this CSV file')
+    args = parser.parse_args()
+
+    results = backtest(args.models.split(','), args.window, args.min_train_months, args.window_months, args.n_jobs)
+    pd.set_option('display.width', 200)
+    print(results.round(3).to_string(index=False))
+    print()
+    print(summarize(results).round(3).to_string())
+    if args.output:
+        results.to_csv(args.output, index=False)
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import pickle
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor
+from model_store import ModelArtifactError, current_pipeline
+from scoring import split_pipeline
+from training import ENGINES, build_pipeline, load_training_data, split_training_data
+
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+UPSAMPLE_FACTOR = 100
+PREDICT_REPEATS = 3
+
+
+# Synthetic larger history: every hour repeated with jittered weather and a noisy count
+def upsample(X, y, factor, seed=0):
+    rng = np.random.default_rng(seed)
+    X_big = X.loc[X.index.repeat(factor)].reset_index(drop=True)
+    X_big['temp_expected_1'] += rng.normal(0, 1.0, len(X_big))
+    X_big['hum'] = np.clip(X_big['hum'] + rng.normal(0, 3.0, len(X_big)), 0, 100)
+    y_big = np.repeat(y.to_numpy(), factor) * rng.lognormal(0, 0.05, len(X_big))
+    return X_big, pd.Series(np.round(y_big), name=y.name)
+
+
+# The deployed model's tuned hyperparameters (model/ when exported, otherwise gbr_pipeline.pkl), so 'gbr'
+# benchmarks the served configuration; None (training defaults) when no GBR is deployed
+def current_gbr_params():
+    try:
+        _, regressor = split_pipeline(current_pipeline())
+    except ModelArtifactError:
+        return None
+    if not isinstance(regressor, GradientBoostingRegressor):
+        return None
+    return {k: v for k, v in regressor.get_params().items() if k in ('n_estimators', 'learning_rate', 'max_depth',
+            'min_samples_split', 'min_samples_leaf', 'subsample', 'max_features')}
+
+
+# One (engine, dataset) run; executed in a fresh process so peak RSS belongs to this run only
+def run_engine(engine, dataset, factor, gbr_params):
+    X_train, X_test, y_train, y_test = split_training_data(*load_training_data())
+    if dataset == 'upsampled':
+        # Split before upsampling so copies of one hour never land on both sides
+        X_train, y_train = upsample(X_train, y_train, factor, seed=0)
+        X_test, y_test = upsample(X_test, y_test, factor, seed=1)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    pipeline = build_pipeline(engine, gbr_params if engine == 'gbr' else None)
+    start = time.perf_counter()
+    pipeline.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    predict_seconds = []
+    for _ in range(PREDICT_REPEATS):
+        start = time.perf_counter()
+        predictions = pipeline.predict(X_test)
+        predict_seconds.append(time.perf_counter() - start)
+
+    residuals = y_test.to_numpy() - predictions
+    return {
+        'engine': engine,
+        'dataset': dataset,
+        'train_rows': len(X_train),
+        'test_rows': len(X_test),
+        'fit_seconds': fit_seconds,
+        'predict_rows_per_second': len(X_test) / min(predict_seconds),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'fit_rss_increase_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+        'model_mb': len(pickle.dumps(pipeline)) / 2 ** 20,
+        'test_mae': float(np.mean(np.abs(residuals))),
+        'test_rmse': float(np.sqrt(np.mean(residuals ** 2))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare GradientBoosting and HistGradientBoosting engines.')
+    parser.add_argument('--engines', nargs='+', default=ENGINES, choices=ENGINES)
+    parser.add_argument('--datasets', nargs='+', default=['hour', 'upsampled'], choices=['hour', 'upsampled'])
+    parser.add_argument('--factor', type=int, default=UPSAMPLE_FACTOR, help='upsample factor for the synthetic dataset')
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'engines.json'))
+    args = parser.parse_args()
+
+    gbr_params = current_gbr_params()
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for dataset in args.datasets:
+        for engine in args.engines:
+            # Classic GBR is single-threaded, on the 100x dataset this run takes a long time
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(run_engine, engine, dataset, args.factor, gbr_params).result()
+            results.append(result)
+            print(f"{dataset:<10}{engine:<5} fit {result['fit_seconds']:8.1f}s  "
+                  f"predict {result['predict_rows_per_second']:>12,.0f} rows/s  "
+                  f"peak RSS {result['peak_rss_mb']:7.0f} MB  "
+                  f"MAE {result['test_mae']:6.2f}  RMSE {result['test_rmse']:6.2f}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'factor': args.factor, 'gbr_params': gbr_params, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
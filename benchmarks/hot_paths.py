@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import numpy as np
+import pandas as pd
+from model_store import load_current_model
+from scoring import calculate_features, load_hourly_averages
+
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+FEATURE_ROWS = [1, 24, 10_000, 1_000_000]
+PREDICT_BATCHES = [1, 24, 256, 4_096, 65_536]
+# Name -> (module, page function) for headless page renders
+PAGES = {
+    'eda_page': ('eda', 'eda_page'),
+    'ml_model_page': ('ml_model', 'ml_model_page'),
+    'bike_usage_simulation': ('simulation', 'bike_usage_simulation'),
+}
+# A benchmark slower than baseline by more than this factor is reported as a regression
+REGRESSION_THRESHOLD = 1.2
+
+
+# Run fn repeatedly and summarize wall times in seconds
+def measure(fn, repeats=5, warmup=1):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times), 'mean': statistics.mean(times), 'repeats': repeats}
+
+
+# Random but valid Simulation page scenarios
+def random_scenarios(n, seed=0):
+    rng = np.random.default_rng(seed)
+    weekday = rng.integers(0, 7, n)
+    return pd.DataFrame({
+        'yr': 1,
+        'mnth': rng.integers(1, 13, n),
+        'weekday': weekday,
+        'hr': rng.integers(0, 24, n),
+        'workingday': np.where((weekday >= 1) & (weekday <= 5), rng.integers(0, 2, n), 0),
+        'hum': rng.integers(0, 101, n).astype(float),
+        'temp_expected_1': rng.integers(-20, 51, n).astype(float),
+        'weathersit': rng.integers(1, 5, n),
+    })
+
+
+def bench_features(workingday_counts, non_workingday_counts):
+    results = {}
+    for n in FEATURE_ROWS:
+        scenarios = random_scenarios(n)
+        repeats = 3 if n >= 1_000_000 else 10
+        results[str(n)] = measure(lambda: calculate_features(scenarios, workingday_counts, non_workingday_counts), repeats)
+        results[str(n)]['rows_per_second'] = n / results[str(n)]['min']
+    return results
+
+
+def bench_predict(pipeline, workingday_counts, non_workingday_counts):
+    results = {}
+    features = calculate_features(random_scenarios(max(PREDICT_BATCHES)), workingday_counts, non_workingday_counts)
+    for batch in PREDICT_BATCHES:
+        X = features.iloc[:batch]
+        repeats = 3 if batch >= 65_536 else 10
+        results[str(batch)] = measure(lambda: pipeline.predict(X), repeats)
+        results[str(batch)]['rows_per_second'] = batch / results[str(batch)]['min']
+    return results
+
+
+def bench_lookups():
+    def legacy_dicts():
+        for path in ['workingday_counts_with_weekday.csv', 'non_workingday_counts_with_weekday.csv']:
+            pd.read_csv(path).set_index(['mnth', 'weekday', 'hr'])['cnt'].to_dict()
+
+    def dense_arrays():
+        for path in ['workingday_counts_with_weekday.csv', 'non_workingday_counts_with_weekday.csv']:
+            load_hourly_averages(path)
+
+    return {'csv_to_dict': measure(legacy_dicts, 10), 'csv_to_array': measure(dense_arrays, 10)}
+
+
+def bench_hour_csv():
+    return {'read_csv': measure(lambda: pd.read_csv('hour.csv'), 5)}
+
+
+# Render each page function headlessly with Streamlit's app-testing API
+def bench_pages():
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    for name, (module, function) in PAGES.items():
+        script = f"from {module} import {function}\n{function}()"
+
+        def render():
+            at = AppTest.from_string(script, default_timeout=300).run()
+            if at.exception:
+                raise RuntimeError(f"{name} raised: {at.exception[0].message}")
+
+        results[name] = measure(render, repeats=3)
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    import sklearn
+    return {
+        'commit': commit or 'unknown',
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+    }
+
+
+# Flatten {group: {case: {'min': ...}}} into {'group/case': min seconds}
+def flatten(results):
+    return {f'{group}/{case}': stats['min'] for group, cases in results['benchmarks'].items() for case, stats in cases.items()}
+
+
+# Print the ratio to a baseline result file, returns the regressed benchmark names
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    with open(baseline_path) as f:
+        baseline = flatten(json.load(f))
+    regressions = []
+    print(f"\n{'benchmark':<40}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, seconds in flatten(results).items():
+        if name not in baseline:
+            continue
+        ratio = seconds / baseline[name]
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print(f"{name:<40}{baseline[name] * 1000:>10.2f}ms{seconds * 1000:>10.2f}ms{ratio:>8.2f}{flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the feature, prediction and page-render hot paths.')
+    parser.add_argument('--skip-pages', action='store_true', help='skip headless page renders')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/hot_paths-<commit>.json)')
+    parser.add_argument('--compare', help='baseline result file to compare against')
+    args = parser.parse_args()
+
+    pipeline, _ = load_current_model()
+    workingday_counts = load_hourly_averages('workingday_counts_with_weekday.csv')
+    non_workingday_counts = load_hourly_averages('non_workingday_counts_with_weekday.csv')
+
+    benchmarks = {
+        'calculate_features': bench_features(workingday_counts, non_workingday_counts),
+        'predict': bench_predict(pipeline, workingday_counts, non_workingday_counts),
+        'lookup_tables': bench_lookups(),
+        'hour_csv': bench_hour_csv(),
+    }
+    if not args.skip_pages:
+        benchmarks['pages'] = bench_pages()
+    results = {'metadata': metadata(), 'benchmarks': benchmarks}
+
+    for name, seconds in flatten(results).items():
+        print(f"{name:<40}{seconds * 1000:>12.3f} ms")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"hot_paths-{results['metadata']['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare and compare(results, args.compare):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""Multi-user load test of the Streamlit app over its websocket protocol.
+
+Drives sessions with Streamlit's own BackMsg/ForwardMsg protobufs (streamlit.proto), which are not a
+public API; tested with streamlit 1.66 and websockets 17.2 (websockets.sync needs 11 or later).
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import numpy as np
+from websockets.sync.client import connect
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from benchmarks.hot_paths import REGRESSION_THRESHOLD, metadata
+
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+PORT = 8599
+SESSION_COUNTS = [1, 2, 4, 8]
+# Scripted analyst sessions: (widget label, new value) steps; None reruns without a change, like any
+# interaction that does not touch a widget. Options of radios and selectboxes are given as displayed.
+SCENARIOS = {
+    'eda_page': [
+        ('Choose a page:', 'Exploratory Data Analysis'),
+        None,
+        None,
+    ],
+    'bike_usage_simulation': [
+        ('Choose a page:', 'Simulation'),
+        ('Temperature (°C)', 5),
+        ('Hour of the Day', '8:00'),
+        ('Weather Situation', 'Light Rain/Snow'),
+        ('Humidity (%)', 80),
+        ('Show feature contributions', True),
+        ('Show uncertainty bands', True),
+    ],
+}
+# Pause between an analyst's steps, drawn uniformly up to twice this so sessions do not move in lockstep
+THINK_SECONDS = 1.0
+# A session count is within capacity while the 95th percentile rerun stays under this
+SLO_SECONDS = 2.0
+SAMPLE_SECONDS = 0.2
+PERCENTILES = [50, 90, 95, 99]
+# WidgetState field per widget element type
+VALUE_FIELDS = {'radio': 'string_value', 'selectbox': 'string_value', 'number_input': 'double_value',
+                'checkbox': 'bool_value', 'toggle': 'bool_value'}
+
+
+# One simulated browser tab: reruns the script over the app's websocket with the tab's widget states
+class Session:
+    def __init__(self, ws):
+        self.ws = ws
+        self.widgets = {}   # label -> (element type, widget id, displayed options)
+        self.states = {}    # widget id -> WidgetState, resent with every rerun like the browser does
+
+    # Rerun the script and wait for it to finish; returns (seconds, whether the page raised)
+    def rerun(self):
+        msg = BackMsg()
+        msg.rerun_script.query_string = ''
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        start = time.perf_counter()
+        self.ws.send(msg.SerializeToString())
+        failed = False
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.ws.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                failed |= element_type == 'exception'
+                if element_type in VALUE_FIELDS:
+                    widget = getattr(element, element_type)
+                    self.widgets[widget.label] = (element_type, widget.id, list(getattr(widget, 'options', [])))
+            elif kind == 'script_finished':
+                return time.perf_counter() - start, failed
+
+    def step(self, step):
+        if step is not None:
+            label, value = step
+            element_type, widget_id, options = self.widgets[label]
+            state = WidgetState(id=widget_id)
+            if element_type in ('radio', 'selectbox') and value not in options:
+                raise ValueError(f"{value!r} is not an option of {label!r}")
+            setattr(state, VALUE_FIELDS[element_type], value)
+            self.states[widget_id] = state
+        return self.rerun()
+
+
+# One scripted session: the first rerun loads the app, every step is one timed rerun
+def run_session(url, steps, think_seconds, seed, results):
+    rng = random.Random(seed)
+    try:
+        with connect(url, subprotocols=['streamlit'], max_size=None, open_timeout=60) as ws:
+            session = Session(ws)
+            session.rerun()
+            for step in steps:
+                time.sleep(rng.uniform(0, 2 * think_seconds))
+                seconds, failed = session.step(step)
+                results.append({'step': 'open page' if step is steps[0] else 'interaction', 'seconds': seconds,
+                                'failed': failed})
+    except Exception as e:
+        results.append({'step': 'session', 'seconds': None, 'failed': True, 'error': repr(e)})
+
+
+# CPU seconds and resident MB of a process from /proc; None off Linux
+def process_usage(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    return (int(fields[11]) + int(fields[12])) / ticks, pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+# Samples the server's CPU use and memory while a load level runs
+class ServerSampler(threading.Thread):
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.stopped = threading.Event()
+        self.samples = []
+
+    def run(self):
+        while not self.stopped.is_set():
+            usage = process_usage(self.pid) if self.pid else None
+            if usage:
+                self.samples.append((time.perf_counter(), *usage))
+            self.stopped.wait(SAMPLE_SECONDS)
+
+    def summary(self):
+        self.stopped.set()
+        self.join()
+        if len(self.samples) < 2:
+            return {'server_cpu_cores': None, 'server_peak_rss_mb': None, 'server_end_rss_mb': None}
+        (t0, cpu0, _), (t1, cpu1, rss1) = self.samples[0], self.samples[-1]
+        return {'server_cpu_cores': (cpu1 - cpu0) / (t1 - t0),
+                'server_peak_rss_mb': max(rss for _, _, rss in self.samples), 'server_end_rss_mb': rss1}
+
+
+# N concurrent sessions running a page's script; latency percentiles of their interactions
+def run_level(url, pid, page, sessions, think_seconds, idle_rss_mb):
+    results = []
+    sampler = ServerSampler(pid)
+    sampler.start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run_session, args=(url, SCENARIOS[page], think_seconds, i, results))
+               for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    server = sampler.summary()
+
+    interactions = np.array([r['seconds'] for r in results if r['step'] == 'interaction' and r['seconds'] is not None])
+    opens = [r['seconds'] for r in results if r['step'] == 'open page' and r['seconds'] is not None]
+    level = {
+        'page': page,
+        'sessions': sessions,
+        'reruns': len(interactions),
+        'errors': sum(r['failed'] for r in results),
+        'open_page_p50': float(np.median(opens)) if opens else None,
+        **{f'p{p}': float(np.percentile(interactions, p)) if len(interactions) else None for p in PERCENTILES},
+        'max': float(interactions.max()) if len(interactions) else None,
+        'reruns_per_second': (len(interactions) + len(opens)) / wall,
+        **server,
+    }
+    if server['server_peak_rss_mb'] is not None and idle_rss_mb is not None:
+        level['rss_per_session_mb'] = (server['server_peak_rss_mb'] - idle_rss_mb) / sessions
+    errors = [r['error'] for r in results if 'error' in r]
+    if errors:
+        level['session_errors'] = errors[:3]
+    return level
+
+
+# Start `streamlit run app.py` headless and wait until it answers its health check
+def start_server(port):
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', 'app.py', '--server.headless', 'true',
+         '--server.port', str(port), '--server.fileWatcherType', 'none', '--browser.gatherUsageStats', 'false'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://localhost:{port}/_stcore/health', timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise SystemExit('The Streamlit server did not start within 60 s')
+
+
+# Largest session count per page whose p95 rerun latency meets the SLO without errors
+def capacity(levels, slo_seconds):
+    result = {}
+    for level in levels:
+        within = level['errors'] == 0 and level['p95'] is not None and level['p95'] <= slo_seconds
+        result.setdefault(level['page'], 0)
+        if within and level['sessions'] > result[level['page']]:
+            result[level['page']] = level['sessions']
+    return result
+
+
+def print_levels(levels):
+    print(f"{'page':<24}{'sessions':>9}{'reruns':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'errors':>8}{'cpu':>7}{'rss MB':>8}")
+    for level in levels:
+        cpu = f"{level['server_cpu_cores']:.2f}" if level['server_cpu_cores'] is not None else '-'
+        rss = f"{level['server_peak_rss_mb']:.0f}" if level['server_peak_rss_mb'] is not None else '-'
+        p50, p95, p99 = (f"{level[p]:.2f}" if level[p] is not None else '-' for p in ('p50', 'p95', 'p99'))
+        print(f"{level['page']:<24}{level['sessions']:>9}{level['reruns']:>8}{p50:>8}{p95:>8}{p99:>8}"
+              f"{level['errors']:>8}{cpu:>7}{rss:>8}")
+
+
+# Regressions against a baseline report: a slower p95 at the same page and session count, or lower capacity
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(level['page'], level['sessions']): level for level in baseline['levels']}
+    if baseline['think_seconds'] != results['think_seconds']:
+        print(f"Note: the baseline used {baseline['think_seconds']} s think time, this run {results['think_seconds']} s")
+    regressions = []
+    print(f"\n{'page':<24}{'sessions':>9}{'baseline p95':>14}{'current p95':>13}{'ratio':>8}")
+    for level in results['levels']:
+        old = before.get((level['page'], level['sessions']))
+        if old is None or not old['p95'] or level['p95'] is None:
+            continue
+        ratio = level['p95'] / old['p95']
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print(f"{level['page']:<24}{level['sessions']:>9}{old['p95']:>13.2f}s{level['p95']:>12.2f}s{ratio:>8.2f}{flag}")
+        if ratio > threshold:
+            regressions.append(f"{level['page']}/{level['sessions']}")
+    for page, sessions in results['capacity'].items():
+        if sessions < baseline['capacity'].get(page, 0):
+            print(f"{page}: capacity dropped from {baseline['capacity'][page]} to {sessions} sessions  REGRESSION")
+            regressions.append(f'{page}/capacity')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the Streamlit app with concurrent scripted sessions.')
+    parser.add_argument('--pages', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--sessions', nargs='+', type=int, default=SESSION_COUNTS, help='concurrent session counts')
+    parser.add_argument('--think', type=float, default=THINK_SECONDS, help='mean pause between steps in seconds')
+    parser.add_argument('--slo', type=float, default=SLO_SECONDS, help='p95 rerun latency target in seconds')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--url', help='test an already running app instead (no server CPU and memory figures)')
+    parser.add_argument('--output', help='report file (default: benchmarks/results/load_test-<commit>.json)')
+    parser.add_argument('--compare', help='baseline report to compare against')
+    args = parser.parse_args()
+
+    server = None if args.url else start_server(args.port)
+    url = (args.url or f'http://localhost:{args.port}').replace('http', 'ws', 1).rstrip('/') + '/_stcore/stream'
+    pid = server.pid if server else None
+    try:
+        # One unmeasured pass per page fills the process-wide caches (model, tables) like a warm server
+        cold = {}
+        for page in args.pages:
+            start = time.perf_counter()
+            run_session(url, SCENARIOS[page], 0, 0, [])
+            cold[page] = time.perf_counter() - start
+        usage = process_usage(pid) if pid else None
+        idle_rss_mb = usage[1] if usage else None
+
+        levels = []
+        for page in args.pages:
+            for sessions in args.sessions:
+                levels.append(run_level(url, pid, page, sessions, args.think, idle_rss_mb))
+                print(f"{page}: {sessions} sessions, p95 {levels[-1]['p95'] or 0:.2f} s")
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    results = {'metadata': metadata(), 'think_seconds': args.think, 'slo_seconds': args.slo,
+               'cold_session_seconds': cold, 'idle_rss_mb': idle_rss_mb, 'levels': levels,
+               'capacity': capacity(levels, args.slo)}
+    print()
+    print_levels(levels)
+    for page, sessions in results['capacity'].items():
+        print(f"{page}: up to {sessions} concurrent sessions with p95 <= {args.slo:.1f} s")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load_test-{results['metadata']['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nReport written to {output}")
+
+    if args.compare and compare(results, args.compare):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
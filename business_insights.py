@@ -1,4 +1,84 @@
 import streamlit as st
+import pandas as pd
+import history_store
+from app_resources import get_router
+from perf import section
+from calendar_features import season_from_dates
+from maintenance import (FLEET_CAP, SEASON_NAMES, WINDOW_HOURS, climatology_weather, daily_windows,
+                         maintenance_plan, season_hours)
+from model_router import DEFAULT_MODEL
+from model_store import ModelArtifactError
+from rebalancing import TRUCK_CAPACITY, TRUCKS, forecast_station_demand, rebalance
+
+
+# Lowest-demand window of every day of a season for the whole system, forecast with typical weather
+@st.cache_data
+def load_maintenance_windows(version, store_version, season, year, hours):
+    timestamps = season_hours(season, year)
+    demand = forecast_station_demand(get_router(), pd.DataFrame({'station': [DEFAULT_MODEL]}),
+                                     climatology_weather(timestamps))
+    starts, sums = daily_windows(demand, hours)
+    days = timestamps[::24]
+    return pd.DataFrame({
+        'date': days.date,
+        'day_type': pd.Series(days.dayofweek >= 5).map({True: 'Weekend', False: 'Weekday'}).to_numpy(),
+        'start': timestamps[starts[0]].strftime('%H:%M'),
+        'end': (timestamps[starts[0]] + pd.Timedelta(hours=hours)).strftime('%H:%M'),
+        'forecast_rentals': sums[0].round(0),
+        'share_of_day': (sums[0] / demand[0, :len(days) * 24].reshape(-1, 24).sum(axis=1) * 100).round(1),
+    })
+
+
+# Computed maintenance timing for a season, and a station schedule for an uploaded station table
+def maintenance_recommendation():
+    today = pd.Timestamp.today()
+    col1, col2 = st.columns(2)
+    with col1:
+        season = st.selectbox('Season', list(SEASON_NAMES), index=int(season_from_dates([today])[0]) - 1,
+                              format_func=SEASON_NAMES.get)
+    with col2:
+        hours = st.slider('Maintenance window (hours)', min_value=2, max_value=8, value=WINDOW_HOURS)
+    try:
+        history_store.ensure_store()
+        windows = load_maintenance_windows(get_router().version(DEFAULT_MODEL), history_store.store_version(),
+                                           season, today.year, hours)
+    except ModelArtifactError as e:
+        st.error(f"Maintenance windows could not be forecast: {e}")
+        return
+
+    typical = windows.groupby('day_type').agg(
+        start=('start', lambda s: s.mode().iloc[0]),
+        end=('end', lambda s: s.mode().iloc[0]),
+        forecast_rentals=('forecast_rentals', 'mean'),
+        share_of_day=('share_of_day', 'mean'),
+    )
+    weekday = typical.loc['Weekday']
+    st.write(f"""
+    **Recommendation:**
+    - **Maintenance Timing**: In {SEASON_NAMES[season].lower()} {today.year} the lowest-demand {hours}-hour window on weekdays is 
+    {weekday['start']}–{weekday['end']}, carrying about {weekday['forecast_rentals']:.0f} rentals 
+    ({weekday['share_of_day']:.1f}% of the day's forecast demand). Schedule regular maintenance there and allocate a 
+    percentage of the fleet for preventive maintenance overnight in peak seasons to avoid disruptions.
+    """)
+    st.dataframe(typical.round(1))
+    st.dataframe(windows, hide_index=True)
+
+    uploaded = st.file_uploader("Stations CSV for a station schedule: station, bikes (optional share)", type='csv')
+    if uploaded is not None:
+        fleet_cap = st.slider('Fleet share in maintenance at once (%)', min_value=1, max_value=50,
+                              value=int(FLEET_CAP * 100)) / 100
+        try:
+            stations = pd.read_csv(uploaded, dtype={'station': str})
+            schedule, _, summary = maintenance_plan(stations, season_hours(season, today.year), router=get_router(),
+                                                    hours=hours, fleet_cap=fleet_cap)
+        except (KeyError, ValueError, ModelArtifactError) as e:
+            st.error(f"The maintenance schedule could not be computed: {e}")
+        else:
+            st.write(f"{summary['scheduled']} of {summary['scheduled'] + summary['unscheduled']} weekly station visits "
+                     f"fit under the cap; at most {summary['peak_fleet_share']:.1%} of the fleet is in maintenance at once.")
+            st.dataframe(schedule, hide_index=True)
+            st.download_button('Download maintenance schedule', schedule.to_csv(index=False), 'schedule.csv', 'text/csv')
+
 
 def business_insights_page():
     # Page Title and Introduction
@@ -20,7 +100,7 @@ def business_insights_page():
     st.write("For more details on each insight, expand the sections below:")
 
     # Insight 1: Maintenance Scheduling and Bike Availability
-    with st.expander("1. Maintenance Scheduling and Bike Availability 🛠️"):
+    with st.expander("1. Maintenance Scheduling and Bike Availability 🛠️"), section("1. Maintenance Scheduling and Bike Availability 🛠️"):
         st.write("""
         **Insight:** Our analysis of bike usage by hour and season revealed distinct peaks in demand, especially during 
         morning (7–9 AM) and evening (5–7 PM) commuting hours on working days, and steady midday usage (11 AM–5 PM) on 
@@ -29,9 +109,9 @@ def business_insights_page():
         **Key Observations:**
         - **Seasonal Influence**: The highest average counts occurred during summer months (June–August), with weekends showing increased recreational demand.
         - **Nighttime Lows**: Usage between midnight and 5 AM remained consistently low across all months and days, making it an ideal time for maintenance.
-        
-        **Recommendation:**
-        - **Maintenance Timing**: Schedule regular maintenance during nighttime hours (12 AM–5 AM) when demand is lowest. For peak seasons, allocate a percentage of the fleet for preventive maintenance overnight to avoid disruptions.
+        """)
+        maintenance_recommendation()
+        st.write("""
         - **Seasonal Preparations**: Conduct thorough fleet inspections and repairs in late winter (February–March) to prepare for the summer surge.
         """)
 
@@ -67,6 +147,35 @@ def business_insights_page():
         - **Future Integration**: Consider incorporating GPS data or station-level demand in future analyses to refine reallocation efforts.
         """)
 
+    # Rebalancing plan for an uploaded station table, from next-day demand forecasts
+    with st.expander("4. Rebalancing Planner 🚚"), section("4. Rebalancing Planner 🚚"):
+        st.write("""
+        Upload the current station inventory to turn the reallocation recommendation into a move plan. Next-day hourly 
+        demand is forecast for every station, and bikes are moved from stations that will overflow to stations that will 
+        run empty, within the trucks' capacity, at the start of each time window.
+        """)
+        uploaded = st.file_uploader("Stations CSV: station, lat, lon, capacity, bikes (optional share, return_share)", type='csv')
+        if uploaded is not None:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                date = st.date_input('Plan date', value=pd.Timestamp.today().date() + pd.Timedelta(days=1))
+            with col2:
+                trucks = st.number_input('Trucks', min_value=1, max_value=200, value=TRUCKS)
+            with col3:
+                truck_capacity = st.number_input('Bikes per truck load', min_value=1, max_value=100, value=TRUCK_CAPACITY)
+            try:
+                stations = pd.read_csv(uploaded, dtype={'station': str})
+                moves, summary, timings = rebalance(stations, date, router=get_router(), trucks=trucks,
+                                                    truck_capacity=truck_capacity)
+            except (ValueError, ModelArtifactError) as e:
+                st.error(f"The rebalancing plan could not be computed: {e}")
+            else:
+                st.dataframe(summary, hide_index=True)
+                st.dataframe(moves, hide_index=True)
+                st.caption(f"{timings['stations']} stations forecast in {timings['forecast_seconds']:.2f} s "
+                           f"and planned in {timings['plan_seconds']:.2f} s.")
+                st.download_button('Download move plan', moves.to_csv(index=False), 'moves.csv', 'text/csv')
+
     # Conclusion
     st.subheader("Conclusion")
     st.write("""
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import USFederalHolidayCalendar, Holiday, nearest_workday
+
+# First year of hour.csv, 'yr' counts years from here (0 = 2011, 1 = 2012)
+FIRST_YEAR = 2011
+
+
+# Washington D.C. observes Emancipation Day on top of the federal holidays (hour.csv marks 2011-04-15 and 2012-04-16)
+class DCHolidayCalendar(USFederalHolidayCalendar):
+    rules = USFederalHolidayCalendar.rules + [
+        Holiday('DC Emancipation Day', month=4, day=16, start_date='2005-01-01', observance=nearest_workday),
+    ]
+
+
+# Season as coded in hour.csv: 1 winter, 2 spring, 3 summer, 4 fall (changing on the 21st/23rd)
+def season_from_dates(dates):
+    dates = pd.DatetimeIndex(dates)
+    month_day = dates.month * 100 + dates.day
+    return np.select(
+        [(month_day < 321) | (month_day >= 1221), month_day < 621, month_day < 923],
+        [1, 2, 3],
+        default=4,
+    )
+
+
+# Derive the hour.csv calendar columns for a sequence of timestamps
+def calendar_columns(timestamps, calendar=None):
+    timestamps = pd.DatetimeIndex(timestamps)
+    calendar = calendar or DCHolidayCalendar()
+    days = timestamps.normalize()
+    holidays = calendar.holidays(start=days.min(), end=days.max())
+
+    # hour.csv counts weekdays from Sunday = 0
+    weekday = (timestamps.dayofweek.to_numpy() + 1) % 7
+    holiday = days.isin(holidays).astype(int)
+    workingday = ((weekday >= 1) & (weekday <= 5) & (holiday == 0)).astype(int)
+
+    return pd.DataFrame({
+        'dteday': days,
+        'season': season_from_dates(timestamps),
+        'yr': timestamps.year.to_numpy() - FIRST_YEAR,
+        'mnth': timestamps.month.to_numpy(),
+        'hr': timestamps.hour.to_numpy(),
+        'holiday': holiday,
+        'weekday': weekday,
+        'workingday': workingday,
+    })
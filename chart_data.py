@@ -0,0 +1,134 @@
+import numpy as np
+import plotly.graph_objects as go
+
+# Size thresholds that pick the rendering level of a chart
+EXACT_POINT_LIMIT = 5_000       # up to this many points every point is drawn
+DOWNSAMPLE_POINT_LIMIT = 500_000  # up to this many points lines are downsampled (scatters drawn with WebGL), above it data is binned
+TARGET_POINTS = 2_000           # points kept by LTTB / min-max downsampling
+BIN_GRID = (200, 200)           # cells used for server-side 2D binning
+
+
+# Decide how a chart with n_points should be rendered
+def choose_level(n_points, exact_limit=EXACT_POINT_LIMIT, downsample_limit=DOWNSAMPLE_POINT_LIMIT):
+    if n_points <= exact_limit:
+        return 'exact'
+    if n_points <= downsample_limit:
+        return 'downsample'
+    return 'binned'
+
+
+# Largest-Triangle-Three-Buckets downsampling, x must be sorted
+def lttb(x, y, n_out=TARGET_POINTS):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for the n - 2 points between the fixed first and last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle corner
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i + 1], edges[i + 2]
+            avg_x = x[next_start:next_stop].mean()
+            avg_y = y[next_start:next_stop].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[prev] - avg_x) * (y[start:stop] - y[prev])
+                      - (x[prev] - x[start:stop]) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+# Keep the minimum and maximum y of each equal-count bucket, x must be sorted
+def minmax_downsample(x, y, n_out=TARGET_POINTS):
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    n_buckets = max(n_out // 2, 1)
+    if n <= n_out:
+        return np.arange(n)
+
+    bucket = np.arange(n) * n_buckets // n
+    # Sorting by (bucket, y) puts each bucket's min first and max last
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets), side='left')
+    stops = np.searchsorted(bucket[order], np.arange(n_buckets), side='right') - 1
+    return np.unique(np.concatenate([order[starts], order[stops]]))
+
+
+# Aggregate a point cloud into a 2D count grid
+def bin_2d(x, y, bins=BIN_GRID):
+    counts, x_edges, y_edges = np.histogram2d(np.asarray(x, dtype=float), np.asarray(y, dtype=float), bins=bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    return counts, x_centers, y_centers
+
+
+# Reduce a sorted series to at most target points, returns a DataFrame ready for plotting
+def line_points(df, x, y, target=TARGET_POINTS):
+    level = choose_level(len(df))
+    if level == 'exact':
+        return df
+    df = df.sort_values(x)
+    if level == 'downsample':
+        idx = lttb(df[x].to_numpy(), df[y].to_numpy(), target)
+    else:
+        # LTTB is sequential per bucket, min-max is fully vectorized for very long series
+        idx = minmax_downsample(df[x].to_numpy(), df[y].to_numpy(), target)
+    return df.iloc[idx]
+
+
+# Plotly line chart whose payload stays bounded as the series grows
+def line_figure(df, x, y, title=None, labels=None, target=TARGET_POINTS):
+    labels = labels or {}
+    level = choose_level(len(df))
+    points = line_points(df, x, y, target)
+    # WebGL traces keep the browser responsive once we are past exact rendering
+    trace = go.Scatter if level == 'exact' else go.Scattergl
+    fig = go.Figure(trace(x=points[x], y=points[y], mode='lines'))
+    fig.update_layout(title=title, xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y))
+    return fig
+
+
+# Plotly scatter chart: exact points, WebGL points or a server-side 2D histogram. A point cloud has no
+# order to downsample along, so between the limits every point is kept and drawn with WebGL instead.
+def scatter_figure(df, x, y, title=None, labels=None, bins=BIN_GRID):
+    labels = labels or {}
+    level = choose_level(len(df))
+    if level == 'binned':
+        counts, x_centers, y_centers = bin_2d(df[x], df[y], bins)
+        counts = np.where(counts > 0, counts, np.nan)
+        fig = go.Figure(go.Heatmap(x=x_centers, y=y_centers, z=counts.T, colorscale='Viridis',
+                                   colorbar={'title': 'Points'}))
+    else:
+        trace = go.Scatter if level == 'exact' else go.Scattergl
+        fig = go.Figure(trace(x=df[x], y=df[y], mode='markers', marker={'opacity': 0.5}))
+    fig.update_layout(title=title, xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y))
+    return fig
+
+
+# Collapse repeated (x, y) pairs into one point with a frequency column
+def frequency_points(df, x, y, name='frequency'):
+    return df.groupby([x, y]).size().reset_index(name=name)
+
+
+# Bubble chart of frequency_points output: marker size and colour show how often each (x, y) pair occurs
+def frequency_figure(freq, x, y, name='frequency', title=None, labels=None):
+    labels = labels or {}
+    trace = go.Scatter if choose_level(len(freq)) == 'exact' else go.Scattergl
+    size = 6 + 14 * freq[name] / max(freq[name].max(), 1)
+    fig = go.Figure(trace(x=freq[x], y=freq[y], mode='markers', text=freq[name],
+                          marker={'size': size, 'color': freq[name], 'colorscale': 'Viridis',
+                                  'colorbar': {'title': labels.get(name, name)}},
+                          hovertemplate=f"{labels.get(x, x)}: %{{x}}<br>{labels.get(y, y)}: %{{y}}<br>"
+                                        f"{labels.get(name, name)}: %{{text}}<extra></extra>"))
+    fig.update_layout(title=title, xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y))
+    return fig
@@ -0,0 +1,160 @@
+import argparse
+import copy
+import json
+import os
+import pickle
+import time
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.pipeline import Pipeline
+from model_store import (TREE_ARRAYS, FlatEnsemble, current_pipeline, export_model, flatten_ensemble,
+                         init_prediction, regression_metrics)
+from scoring import split_pipeline
+from training import RANDOM_STATE, load_training_data, split_training_data
+
+COMPACT_MODEL_DIR = 'model_compact'
+# Allowed relative increase of the RMSE over the full ensemble
+DEFAULT_TOLERANCE = 0.01
+# Latency is measured on a single hour, one simulated day and the whole test split
+LATENCY_BATCHES = [1, 24, None]
+LATENCY_REPEATS = 20
+
+
+# RMSE after every boosting stage, computed from a single staged_predict pass
+def staged_rmse(regressor, X_encoded, y):
+    y = np.asarray(y, dtype=float)
+    return np.array([np.sqrt(np.mean((y - stage) ** 2)) for stage in regressor.staged_predict(X_encoded)])
+
+
+# Smallest number of leading trees whose RMSE stays within tolerance of the full ensemble
+def smallest_prefix(rmse, tolerance=DEFAULT_TOLERANCE):
+    return int(np.argmax(rmse <= rmse[-1] * (1 + tolerance))) + 1
+
+
+# Copy of a fitted GradientBoostingRegressor that keeps only its first n_trees trees
+def truncate_ensemble(regressor, n_trees):
+    pruned = copy.deepcopy(regressor)
+    pruned.estimators_ = pruned.estimators_[:n_trees]
+    pruned.train_score_ = pruned.train_score_[:n_trees]
+    pruned.n_estimators = n_trees
+    pruned.n_estimators_ = n_trees
+    return pruned
+
+
+# Fit a shallower ensemble on the teacher's predictions instead of the noisy counts
+def distill(encoder, teacher, X_train, max_depth=3, n_estimators=300, learning_rate=0.1):
+    X_encoded = encoder.transform(X_train)
+    student = GradientBoostingRegressor(max_depth=max_depth, n_estimators=n_estimators,
+                                        learning_rate=learning_rate, random_state=RANDOM_STATE)
+    student.fit(X_encoded, teacher.predict(X_encoded))
+    return student
+
+
+# Median seconds of pipeline.predict per batch size
+def predict_latency(pipeline, X, batches=LATENCY_BATCHES, repeats=LATENCY_REPEATS):
+    latency = {}
+    for size in batches:
+        batch = X if size is None else X.iloc[:size]
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            pipeline.predict(batch)
+            times.append(time.perf_counter() - start)
+        latency[f'predict_ms_{size or "test"}'] = float(np.median(times) * 1000)
+    return latency
+
+
+# Median milliseconds of the serving path (memory-mapped flat trees) on one simulated day
+def flat_latency(encoder, regressor, X, rows=24, repeats=LATENCY_REPEATS):
+    arrays, _ = flatten_ensemble(regressor)
+    arrays = {name: arrays[name] for name in TREE_ARRAYS}
+    flat = FlatEnsemble(init=init_prediction(regressor), learning_rate=regressor.learning_rate, **arrays)
+    X_encoded = encoder.transform(X.iloc[:rows])
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        flat.predict(X_encoded)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000), sum(array.nbytes for array in arrays.values()) / 1024
+
+
+def ensemble_depth(regressor):
+    return int(max(tree.tree_.max_depth for tree in regressor.estimators_[:, 0]))
+
+
+# Accuracy, latency and size of one candidate model
+def describe(name, encoder, regressor, X_test, y_test):
+    pipeline = Pipeline([('encoder', encoder), ('regressor', regressor)])
+    flat_ms, flat_kb = flat_latency(encoder, regressor, X_test)
+    return {
+        'model': name,
+        'n_trees': len(regressor.estimators_),
+        'depth': ensemble_depth(regressor),
+        'nodes': int(sum(tree.tree_.node_count for tree in regressor.estimators_[:, 0])),
+        'pickle_kb': len(pickle.dumps(regressor)) / 1024,
+        'flat_kb': flat_kb,
+        **regression_metrics(y_test, pipeline.predict(X_test)),
+        **predict_latency(pipeline, X_test),
+        'flat_ms_24': flat_ms,
+    }
+
+
+# Compare candidates with the full ensemble: accuracy lost against latency and memory saved
+def compaction_report(rows):
+    full = rows[0]
+    for row in rows:
+        row['RMSE_increase_pct'] = (row['RMSE'] / full['RMSE'] - 1) * 100
+        row['pickle_saved_pct'] = (1 - row['pickle_kb'] / full['pickle_kb']) * 100
+        row['flat_saved_pct'] = (1 - row['flat_kb'] / full['flat_kb']) * 100
+        for key in [k for k in row if k.startswith('predict_ms_')] + ['flat_ms_24']:
+            row[key.replace('_ms', '_speedup')] = full[key] / row[key]
+    return rows
+
+
+# Prune the deployed ensemble to its smallest adequate prefix, optionally distill it, and export the result
+def compact(tolerance=DEFAULT_TOLERANCE, distill_depth=None, distill_trees=300, output=COMPACT_MODEL_DIR):
+    encoder, regressor = split_pipeline(current_pipeline())
+    if not hasattr(regressor, 'staged_predict') or not hasattr(regressor, 'estimators_'):
+        raise ValueError(f"{type(regressor).__name__} has no tree prefix to prune, compaction needs a GradientBoostingRegressor")
+
+    X, y = load_training_data()
+    X_train, X_test, y_train, y_test = split_training_data(X, y)
+
+    # The prefix is chosen on the training split so the test split stays an unbiased report
+    rmse = staged_rmse(regressor, encoder.transform(X_train), y_train)
+    n_trees = smallest_prefix(rmse, tolerance)
+    candidates = {'full': regressor, f'prefix_{n_trees}': truncate_ensemble(regressor, n_trees)}
+    if distill_depth:
+        candidates[f'distilled_d{distill_depth}'] = distill(encoder, regressor, X_train, distill_depth, distill_trees)
+
+    rows = compaction_report([describe(name, encoder, model, X_test, y_test) for name, model in candidates.items()])
+    # Ship the candidate with the fastest serving path among those within tolerance on the test split
+    eligible = [row for row in rows[1:] if row['RMSE_increase_pct'] <= tolerance * 100] or rows[1:2]
+    chosen = min(eligible, key=lambda row: row['flat_ms_24'])
+    compact_pipeline = Pipeline([('encoder', encoder), ('regressor', candidates[chosen['model']])])
+    manifest = export_model(compact_pipeline, output, X_train, y_train, X_test, y_test,
+                            metrics={'compaction': {'source_trees': len(regressor.estimators_), 'tolerance': tolerance,
+                                                    'chosen': chosen['model']}})
+    flat_kb = sum(manifest['files'][f'{name}.npy']['bytes'] for name in TREE_ARRAYS) / 1024 if manifest['ensemble'] else None
+    return {'tolerance': tolerance, 'prefix_trees': n_trees, 'chosen': chosen['model'],
+            'artifact': output, 'artifact_flat_kb': flat_kb, 'candidates': rows}
+
+
+# python compaction.py [--tolerance 0.01] [--distill-depth 3] [--output model_compact]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prune or distill the deployed gradient boosting ensemble')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed relative RMSE increase, 0.01 is 1%%')
+    parser.add_argument('--distill-depth', type=int, help='also distill into an ensemble of this depth')
+    parser.add_argument('--distill-trees', type=int, default=300)
+    parser.add_argument('--output', default=COMPACT_MODEL_DIR)
+    args = parser.parse_args()
+
+    report = compact(args.tolerance, args.distill_depth, args.distill_trees, args.output)
+    with open(os.path.join(args.output, 'compaction_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    columns = ['model', 'n_trees', 'depth', 'RMSE', 'RMSE_increase_pct', 'pickle_kb', 'flat_kb', 'flat_saved_pct',
+               'predict_ms_1', 'predict_ms_test', 'flat_ms_24', 'flat_speedup_24']
+    for row in report['candidates']:
+        print('  '.join(f'{c}={row[c]:.3f}' if isinstance(row[c], float) else f'{c}={row[c]}' for c in columns))
+    print(f"chosen: {report['chosen']} -> {report['artifact']}")
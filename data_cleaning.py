@@ -1,5 +1,7 @@
 import streamlit as st
+from perf import section
 import pandas as pd
+import history_store
 
 # Function definition for the data cleaning page
 def data_cleaning_page():
@@ -32,17 +34,19 @@ def data_cleaning_page():
     st.write("Explore this section to understand the steps taken for data quality assurance, visualization, and preparation for analysis.")
 
     # Step 1: Load the Data
-    data = pd.read_csv('hour.csv')
+    with section("Open history store"):
+        history_store.ensure_store()
+        data = history_store.head(5)
     st.write("We have loaded the dataset to understand its structure and assess data quality.")
 
     # Step 2: Initial Data Overview
-    with st.expander("📊 Initial Data Overview"):
+    with st.expander("📊 Initial Data Overview"), section("📊 Initial Data Overview"):
         st.markdown("<div class='expander-title'>Initial Data Overview</div>", unsafe_allow_html=True)
         st.write("We review the initial dataset to understand its columns and types.")
         st.dataframe(data.head())
 
     # Step 3: Data Quality Assessment
-    with st.expander("🔍 Data Quality Assessment"):
+    with st.expander("🔍 Data Quality Assessment"), section("🔍 Data Quality Assessment"):
         st.markdown("<div class='expander-title'>Data Quality Assessment</div>", unsafe_allow_html=True)
         st.write("### Data Structure")
         st.write("All features are correctly typed as `int64` or `float64`, with the exception of the `dteday` column, which holds date information.")
@@ -50,13 +54,13 @@ def data_cleaning_page():
         st.write("No missing values were found in the dataset, ensuring high data quality.")
 
     # Step 4: Handling Outliers
-    with st.expander("⚠️ Handling Outliers and Ensuring Integrity"):
+    with st.expander("⚠️ Handling Outliers and Ensuring Integrity"), section("⚠️ Handling Outliers and Ensuring Integrity"):
         st.markdown("<div class='expander-title'>Handling Outliers and Ensuring Integrity</div>", unsafe_allow_html=True)
         st.write("We analyze the data for any outliers using visual methods to ensure they don't skew our analysis.")
         st.write("We verified the data for outliers using visual methods like box plots and found no extreme values that would skew our analysis.")
 
     # Step 5: Verifying Quarter Behavior
-    with st.expander("📅 Verifying Quarter Behavior"):
+    with st.expander("📅 Verifying Quarter Behavior"), section("📅 Verifying Quarter Behavior"):
         st.markdown("<div class='expander-title'>Verifying Quarter Behavior</div>", unsafe_allow_html=True)
         st.write("""
         We check if the dataset correctly represents data across quarters, which is important for understanding patterns in bike rentals.
@@ -70,7 +74,7 @@ def data_cleaning_page():
         st.table(quarter_data)
 
     # Step 6: Checking for Missing Data in Time Series
-    with st.expander("⏰ Checking for Missing Data in Time Series"):
+    with st.expander("⏰ Checking for Missing Data in Time Series"), section("⏰ Checking for Missing Data in Time Series"):
         st.markdown("<div class='expander-title'>Checking for Missing Data in Time Series</div>", unsafe_allow_html=True)
         st.write("""
         Ensuring the time series data has no missing entries is vital for accurate analysis.
@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+from scipy.special import kolmogorov
+from model_store import current_model_version, load_current_model
+from scoring import FEATURE_COLUMNS, model_version
+from training import CATEGORICAL_FEATURES, DATA_PATH, load_training_data, split_training_data
+
+logger = logging.getLogger('bike_app.drift')
+
+DRIFT_DIR = 'monitoring'
+BASELINE_FILE = 'drift_baseline.json'
+# Continuous inputs and predictions are binned at training quantiles, categorical ones per category
+BINS = 20
+MONITORED = FEATURE_COLUMNS + ['prediction']
+# Usual PSI reading: below 0.1 stable, up to 0.25 moderate shift, above that significant
+PSI_WARNING = 0.1
+PSI_ALERT = 0.25
+CHECK_INTERVAL_SECONDS = 300
+# Windows with fewer rows keep accumulating instead of producing a noisy comparison
+MIN_WINDOW_ROWS = 100
+# Reports kept in memory: a day of 5-minute checks
+HISTORY = 288
+# Empty bins are smoothed so PSI stays finite
+PSI_EPSILON = 1e-4
+
+
+def bin_edges(values, categorical, bins=BINS):
+    if categorical:
+        categories = np.unique(values)
+        return (categories[:-1] + categories[1:]) / 2
+    return np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]))
+
+
+# Counts per bin; values equal to an edge fall in the upper bin, the outer bins are open-ended
+def histogram(values, edges):
+    return np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+
+
+# Population stability index of the live distribution against the expected one
+def psi(expected, actual, epsilon=PSI_EPSILON):
+    p = np.maximum(expected / expected.sum(), epsilon)
+    q = np.maximum(actual / actual.sum(), epsilon)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+# Two-sample Kolmogorov-Smirnov statistic on the binned distributions (a lower bound of the exact
+# statistic, since the CDFs are only compared at the bin edges) and its asymptotic p-value
+def ks(expected, actual):
+    n, m = expected.sum(), actual.sum()
+    statistic = float(np.abs(np.cumsum(expected) / n - np.cumsum(actual) / m).max())
+    return statistic, float(kolmogorov(statistic * np.sqrt(n * m / (n + m))))
+
+
+def drift_status(value):
+    return 'alert' if value > PSI_ALERT else 'warning' if value > PSI_WARNING else 'stable'
+
+
+# Bin edges and counts of the model inputs and its predictions on the training split
+def build_baseline(model, X_train, version, data_version):
+    columns = {name: X_train[name].to_numpy(dtype=float) for name in FEATURE_COLUMNS}
+    columns['prediction'] = np.clip(model.predict(X_train), 0, None)
+    features = {}
+    for name, values in columns.items():
+        edges = bin_edges(values, name in CATEGORICAL_FEATURES)
+        features[name] = {'edges': edges.tolist(), 'counts': histogram(values, edges).tolist()}
+    return {'model_version': version, 'data_version': data_version, 'rows': len(X_train), 'features': features}
+
+
+# Stored baseline of the current model, rebuilt when the model or hour.csv changed since it was written
+def load_baseline(directory=DRIFT_DIR, data_path=DATA_PATH):
+    version, data_version = current_model_version(), model_version(data_path)
+    path = os.path.join(directory, BASELINE_FILE)
+    try:
+        with open(path) as f:
+            baseline = json.load(f)
+        if baseline['model_version'] == version and baseline['data_version'] == data_version:
+            return baseline
+    except (OSError, ValueError, KeyError):
+        pass
+
+    model, _ = load_current_model()
+    X, y = load_training_data(data_path)
+    X_train, _, _, _ = split_training_data(X, y)
+    baseline = build_baseline(model, X_train, version, data_version)
+    os.makedirs(directory, exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(baseline, f)
+    os.replace(path + '.tmp', path)
+    return baseline
+
+
+# Constant-memory histograms of live inputs and predictions, compared with the baseline every interval.
+# observe() only bins the batch and adds the counts; the comparison runs at most once per interval.
+class DriftMonitor:
+    def __init__(self, baseline, interval_seconds=CHECK_INTERVAL_SECONDS, min_rows=MIN_WINDOW_ROWS,
+                 history=HISTORY, clock=time.monotonic):
+        self.model_version = baseline['model_version']
+        self.names = [name for name in MONITORED if name in baseline['features']]
+        self.edges = [np.asarray(baseline['features'][name]['edges']) for name in self.names]
+        self.expected = [np.asarray(baseline['features'][name]['counts'], dtype=float) for name in self.names]
+        # All histograms live in one flat array, column i in bins offsets[i]:offsets[i + 1]
+        self.offsets = np.concatenate([[0], np.cumsum([len(counts) for counts in self.expected])])
+        self.window = np.zeros(self.offsets[-1])
+        self.total = np.zeros(self.offsets[-1])
+        self.window_rows = 0
+        self.total_rows = 0
+        self.interval_seconds = interval_seconds
+        self.min_rows = min_rows
+        self.reports = deque(maxlen=history)
+        self._clock = clock
+        self._last_check = clock()
+        self._lock = threading.Lock()
+
+    # Add one scored batch: the model features (FEATURE_COLUMNS) and the predictions.
+    # Every column is binned with one searchsorted and all bins are counted with one bincount.
+    def observe(self, features, predictions):
+        # One conversion of the whole frame is much cheaper than selecting columns by label
+        values = features.to_numpy(dtype=float)[:, features.columns.get_indexer(self.names[:-1])]
+        values = np.column_stack([values, predictions])
+        bins = np.concatenate([np.searchsorted(edges, values[:, i], side='right') + self.offsets[i]
+                               for i, edges in enumerate(self.edges)])
+        counts = np.bincount(bins, minlength=self.offsets[-1])
+        with self._lock:
+            self.window += counts
+            self.total += counts
+            self.window_rows += len(predictions)
+            self.total_rows += len(predictions)
+        if self._clock() - self._last_check >= self.interval_seconds:
+            self.check()
+
+    # Compare the current window with the baseline and start a new window; None while the window is too small
+    def check(self, force=False):
+        with self._lock:
+            if self.window_rows == 0 or (self.window_rows < self.min_rows and not force):
+                return None
+            window, rows = self.window, self.window_rows
+            self.window = np.zeros(self.offsets[-1])
+            self.window_rows = 0
+            self._last_check = self._clock()
+
+        features = {}
+        for i, (name, expected) in enumerate(zip(self.names, self.expected)):
+            actual = window[self.offsets[i]:self.offsets[i + 1]]
+            statistic, p_value = ks(expected, actual)
+            value = psi(expected, actual)
+            features[name] = {'psi': value, 'ks': statistic, 'ks_p_value': p_value, 'status': drift_status(value)}
+        report = {'time': pd.Timestamp.now(tz='UTC').isoformat(timespec='seconds'), 'rows': rows, 'features': features}
+        self.reports.append(report)
+
+        drifted = {name: round(result['psi'], 3) for name, result in features.items() if result['status'] == 'alert'}
+        if drifted:
+            logger.warning(json.dumps({'drift_alert': drifted, 'rows': rows}))
+        return report
+
+    def latest(self):
+        return self.reports[-1] if self.reports else None
+
+
+# One row per monitored column of a drift report
+def report_table(report):
+    table = pd.DataFrame(report['features']).T.rename_axis('feature').reset_index()
+    return table[['feature', 'psi', 'ks', 'ks_p_value', 'status']]
+
+
+# Replay a scored scenario file (scoring.py output) through a monitor:
+# python drift.py predictions.csv
+if __name__ == '__main__':
+    import sys
+    from scoring import calculate_features, load_hourly_averages
+
+    scored = pd.read_csv(sys.argv[1])
+    features = calculate_features(scored, load_hourly_averages('workingday_counts_with_weekday.csv'),
+                                  load_hourly_averages('non_workingday_counts_with_weekday.csv'))
+    monitor = DriftMonitor(load_baseline())
+    monitor.observe(features, scored['prediction'].to_numpy())
+    print(report_table(monitor.check(force=True)).round(4).to_string(index=False))
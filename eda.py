@@ -1,11 +1,43 @@
 import streamlit as st
+from perf import section
 import matplotlib.pyplot as plt
 import seaborn as sns
-import pandas as pd
+import plotly.express as px
+import history_store
+from chart_data import frequency_figure, frequency_points, line_figure
+from streaming_correlation import correlation_report
+
+# hour.csv columns the charts on this page use
+EDA_COLUMNS = ['hr', 'mnth', 'workingday', 'temp', 'atemp', 'hum', 'windspeed', 'cnt']
+
+
+# Columns the notebook engineered before building its correlation matrix
+def add_engineered_columns(chunk):
+    chunk = chunk.copy()
+    chunk['windspeed_binned'] = (chunk['windspeed'] * 67 >= 40).astype(int) + 1
+    chunk['dry_precip'] = chunk['weathersit'].isin([1, 2]).map({True: 1, False: 2})
+    return chunk
+
+
+# Numeric and lagged-temperature correlation matrices, streamed partition by partition once per store version
+@st.cache_data
+def load_correlations(version, station=history_store.DEFAULT_STATION):
+    chunks = (add_engineered_columns(chunk.drop(columns='dteday')) for chunk in history_store.scan(stations=station))
+    return correlation_report(chunks)
+
+
+def correlation_heatmap(matrix, title):
+    fig = px.imshow(matrix.round(2), text_auto=True, color_continuous_scale='RdBu_r', zmin=-1, zmax=1,
+                    aspect='auto', title=title)
+    fig.update_layout(height=max(400, 35 * len(matrix)))
+    return fig
+
 
 def eda_page():
     # Load data
-    data = pd.read_csv('hour.csv')
+    with section("Load history"):
+        history_store.ensure_store()
+        data = history_store.load(EDA_COLUMNS, stations=history_store.DEFAULT_STATION)
 
     st.title("✨ Comprehensive Exploratory Data Analysis")
     st.markdown("---")
@@ -33,7 +65,7 @@ def eda_page():
     st.header("📊 General Overview")
     
     # Denormalizing Data Section
-    with st.expander("Denormalizing Data for Clarity"):
+    with st.expander("Denormalizing Data for Clarity"), section("Denormalizing Data for Clarity"):
         st.subheader("Denormalizing Data for Clarity")
         st.markdown("""
         The following features were denormalized to their original scale for easier interpretation:
@@ -44,7 +76,7 @@ def eda_page():
         """, unsafe_allow_html=True)
 
     # Distribution of Target Variable
-    with st.expander("Distribution of Target Variable (Count of Bikes)"):
+    with st.expander("Distribution of Target Variable (Count of Bikes)"), section("Distribution of Target Variable (Count of Bikes)"):
         st.subheader("Distribution of Target Variable (Count of Bikes)")
         st.markdown("""
         <p>The <code>cnt</code> column represents the total count of bike rentals per hour. Analyzing its distribution provides insights into typical rental volumes and helps identify potential skewness in the data.</p>
@@ -62,7 +94,7 @@ def eda_page():
         st.pyplot(plt)
 
     # Instances where Count <= 5 Analysis
-    with st.expander("Instances with Very Low Count (<= 5)"):
+    with st.expander("Instances with Very Low Count (<= 5)"), section("Instances with Very Low Count (<= 5)"):
         st.subheader("Instances where Count <= 5 Analysis")
         st.markdown("""
         <p>This analysis highlights the distribution and frequency of instances with very low bike rental counts to uncover patterns related to specific hours or conditions.</p>
@@ -71,22 +103,17 @@ def eda_page():
         - Large spikes in lower counts may indicate specific conditions or times leading to low rentals.
         """, unsafe_allow_html=True)
 
+        # One point per (hour, month) instead of one per low-count row keeps the chart size bounded
         filtered_data = data[data['cnt'] <= 5]
-        freq = filtered_data.groupby(['hr', 'mnth']).size().reset_index(name='frequency')
-        filtered_data = filtered_data.merge(freq, on=['hr', 'mnth'], how='left')
+        freq = frequency_points(filtered_data, 'hr', 'mnth')
 
-        plt.figure(figsize=(10, 6))
-        sns.scatterplot(x='hr', y='mnth', data=filtered_data, hue='frequency', palette='viridis', size='frequency', sizes=(20, 200))
-        plt.title('Instances where Count <= 5')
-        plt.xlabel('Hour')
-        plt.ylabel('Month')
-        plt.legend(title='Frequency', bbox_to_anchor=(1.05, 1), loc='upper left')
-        st.pyplot(plt)
+        st.plotly_chart(frequency_figure(freq, 'hr', 'mnth', title='Instances where Count <= 5',
+                                         labels={'hr': 'Hour', 'mnth': 'Month', 'frequency': 'Frequency'}))
         
         st.write("Low count values are observed across all months and are more frequent during nighttime hours.")
 
 
-    with st.expander("Analysis of Hours with Count <= 5"):
+    with st.expander("Analysis of Hours with Count <= 5"), section("Analysis of Hours with Count <= 5"):
         st.subheader("🕵️‍♂️ Analysis of Hours with Count <= 5")
         st.markdown("""
         This section breaks down the frequency of bike rentals when the count is 5 or less, observed across different months.
@@ -104,7 +131,7 @@ def eda_page():
 
 
         # Expander for Relations Between Features and Target
-    with st.expander("Relation Between Hour (hr) and Count (cnt)"):
+    with st.expander("Relation Between Hour (hr) and Count (cnt)"), section("Relation Between Hour (hr) and Count (cnt)"):
         st.subheader("Relation Between Features and Target")
         st.markdown("""
         <p>This boxplot shows how bike rental counts vary throughout the day, helping identify peak and low-demand hours.</p>
@@ -119,7 +146,7 @@ def eda_page():
         st.write("The plot highlights the morning and evening rush hours as peak times for bike rentals, indicating a potential feature for model optimization.")
 
          # Expander for Deep Dive into Weekly Patterns
-    with st.expander("Average Count by Hour for Each Weekday"):
+    with st.expander("Average Count by Hour for Each Weekday"), section("Average Count by Hour for Each Weekday"):
         st.subheader("Average Count by Hour for Each Weekday")
         st.markdown("""
         This visualization breaks down the average bike count for each hour, analyzed by the day of the week. This helps identify weekday versus weekend patterns.
@@ -141,7 +168,7 @@ def eda_page():
     st.header("🕰️ Detailed Analysis by Time")
     
     # Hourly Analysis on Working and Non-Working Days
-    with st.expander("Hourly Analysis on Working and Non-Working Days"):
+    with st.expander("Hourly Analysis on Working and Non-Working Days"), section("Hourly Analysis on Working and Non-Working Days"):
         st.subheader("Difference between Working and Non-Working Days")
         st.markdown("""
         <p>This section compares bike rental counts on working days versus non-working days to uncover patterns that could inform feature engineering.</p>
@@ -163,7 +190,7 @@ def eda_page():
         st.pyplot(fig)
 
     # Hourly Averages for Working and Non-Working Days
-    with st.expander("Hourly Averages for Working and Non-Working Days"):
+    with st.expander("Hourly Averages for Working and Non-Working Days"), section("Hourly Averages for Working and Non-Working Days"):
         st.subheader("Hourly Averages for Working and Non-Working Days")
         st.markdown("""
         This analysis calculates average bike counts per hour and month for both working and non-working days.
@@ -209,7 +236,7 @@ def eda_page():
     st.header("🌦️ Weather and Temperature Analysis")
     
     # Boxplot Analysis of Weather Variables and Count
-    with st.expander("☁Relationship Between Weather Variables and Count"):
+    with st.expander("☁Relationship Between Weather Variables and Count"), section("☁Relationship Between Weather Variables and Count"):
         st.subheader("Weather Impact on Bike Rentals")
         st.markdown("""
         This analysis shows how weather-related variables (temperature, humidity, apparent temperature, and windspeed) affect bike rentals.
@@ -234,7 +261,7 @@ def eda_page():
         """)
 
     # Expander for creating windspeed category
-    with st.expander("Creating a Windspeed Category"):
+    with st.expander("Creating a Windspeed Category"), section("Creating a Windspeed Category"):
         st.subheader("Categorizing Windspeed for Analysis")
         st.markdown("""
         To analyze the impact of windspeed on bike rentals, we categorized windspeed values into two main bins:
@@ -252,7 +279,7 @@ def eda_page():
         """)
 
         # Expander for the windspeed binned analysis
-    with st.expander("Effect of Windspeed_Binned on Count"):
+    with st.expander("Effect of Windspeed_Binned on Count"), section("Effect of Windspeed_Binned on Count"):
         st.subheader("📊 Effect of Windspeed_Binned on Count")
         st.markdown("""
         This section examines the impact of categorized windspeed (binned) on bike rental counts.
@@ -267,7 +294,7 @@ def eda_page():
         st.image("wind_binned.png", caption="Effect of Windspeed_Binned on Count", use_column_width=True)
 
     # Histogram of Windspeed Distribution
-    with st.expander("Distribution of Windspeed"):
+    with st.expander("Distribution of Windspeed"), section("Distribution of Windspeed"):
         st.subheader("Windspeed Distribution Analysis")
         st.markdown("""
         This section visualizes the distribution of windspeed in the dataset to understand its effect on bike rentals.
@@ -290,7 +317,7 @@ def eda_page():
         st.write(f"**Number of records**: Windspeed > 40: {count_above}, Windspeed ≤ 40: {count_below}")
 
     # Average Count by Windspeed Analysis
-    with st.expander("Average Count by Windspeed Analysis"):
+    with st.expander("Average Count by Windspeed Analysis"), section("Average Count by Windspeed Analysis"):
         st.subheader("Average Bike Count by Windspeed")
         st.markdown("""
         This analysis explores how average bike rental counts change with varying levels of windspeed.
@@ -303,22 +330,18 @@ def eda_page():
         # Calculate average count by windspeed
         average_count_by_windspeed = data.groupby('windspeed')['cnt'].mean().reset_index()
 
-        # Plotting the average bike count by windspeed
-        plt.figure(figsize=(16, 8))
-        sns.lineplot(x='windspeed', y='cnt', data=average_count_by_windspeed)
-        plt.xlabel('Windspeed')
-        plt.ylabel('Average Bike Count')
-        plt.title('Average Bike Count by Windspeed')
-        max_windspeed = int(data['windspeed'].max())
-        plt.xticks(range(0, max_windspeed + 1, 2))  # Adjust step size if needed
-        st.pyplot(plt)
+        # Plotting the average bike count by windspeed; line_figure downsamples once the series gets long
+        fig = line_figure(average_count_by_windspeed, 'windspeed', 'cnt', title='Average Bike Count by Windspeed',
+                          labels={'windspeed': 'Windspeed', 'cnt': 'Average Bike Count'})
+        fig.update_xaxes(dtick=2)
+        st.plotly_chart(fig)
 
         st.write("""
         **Summary**: The highest windspeed values show noticeable peaks, which could impact average bike count analysis due to limited data. Care should be taken to evaluate how these peaks affect overall trends.
         """)
 
         # Expander for the high windspeed analysis
-    with st.expander("Counts for Windspeeds Above 40 Analysis"):
+    with st.expander("Counts for Windspeeds Above 40 Analysis"), section("Counts for Windspeeds Above 40 Analysis"):
         st.subheader("🌬️ Counts for Windspeeds Above 40")
         st.markdown("""
         This section explores the relationship between bike counts and high windspeed values above 40.
@@ -336,14 +359,15 @@ def eda_page():
     st.header("🔗 Correlation Analysis")
     
     # Correlation Matrix Analysis
-    with st.expander("Correlation Matrix Overview"):
+    with st.expander("Correlation Matrix Overview"), section("Correlation Matrix Overview"):
         st.subheader("Exploring Relationships Between Variables")
         st.markdown("""
         This section shows the correlation between numerical features in the dataset using a correlation matrix. Understanding these relationships helps with feature selection and model building.
         """, unsafe_allow_html=True)
 
-        # Display correlation matrix image
-        st.image('output_corre_matrix.png', caption='Correlation Matrix Analysis', use_column_width=True)
+        # Correlation matrix computed from streamed sufficient statistics
+        numeric_correlation, _ = load_correlations(history_store.store_version())
+        st.plotly_chart(correlation_heatmap(numeric_correlation, 'Correlation Matrix Analysis'))
 
         st.write("""
         **Key Insights from the Correlation Matrix:**
@@ -361,7 +385,7 @@ def eda_page():
     st.header("🕒 Lagged Variable Analysis")
     
     # Lagged Temperature Analysis
-    with st.expander("Lagged Temperature Impact on Rentals"):
+    with st.expander("Lagged Temperature Impact on Rentals"), section("Lagged Temperature Impact on Rentals"):
         st.subheader("Lagged Variables Analysis")
         st.markdown("""
         By shifting temperature values to create lagged features, we examine their impact on bike rental counts.
@@ -371,18 +395,28 @@ def eda_page():
         - The correlation diminishes with increased lag time, suggesting the immediacy of temperature data is more relevant.
         """, unsafe_allow_html=True)
 
-        # Display lagged correlation bar chart image
-        st.image("lagged_histogram.png", caption="Correlation of Temperature, Apparent Temperature, and Lagged Features with Count (cnt)")
+        # Correlation of every lag with cnt, from the same single pass as the matrices
+        _, lagged_correlation = load_correlations(history_store.store_version())
+        lag_order = ['temp', 'atemp'] + [f'temp_expected_{lag}' for lag in range(1, 11)]
+        lag_fig = px.bar(
+            lagged_correlation.loc[lag_order, 'cnt'].rename_axis('Feature').reset_index(name='Correlation'),
+            x='Feature',
+            y='Correlation',
+            title='Correlation of Temperature, Apparent Temperature, and Lagged Features with Count (cnt)',
+            labels={'Feature': 'Temperature Features (Chronological Order)'}
+        )
+        st.plotly_chart(lag_fig)
 
     # Temperature Feature Correlation Matrix
-    with st.expander("📊 Detailed Temperature Feature Correlation Matrix"):
+    with st.expander("📊 Detailed Temperature Feature Correlation Matrix"), section("📊 Detailed Temperature Feature Correlation Matrix"):
         st.subheader("Temperature Feature Correlation Matrix")
         st.markdown("""
         We analyze the correlation matrix of lagged temperature features to identify multicollinearity and determine the most impactful variable.
         """, unsafe_allow_html=True)
 
-        # Display correlation matrix for lagged temperature features
-        st.image("corre_lagged.png", caption="Correlation Matrix of Temperature Features and Count (cnt)")
+        # Correlation matrix for lagged temperature features
+        _, lagged_correlation = load_correlations(history_store.store_version())
+        st.plotly_chart(correlation_heatmap(lagged_correlation, 'Correlation Matrix of Temperature Features and Count (cnt)'))
 
         st.write("""
         **Insights:**
@@ -393,7 +427,7 @@ def eda_page():
     st.header("🌧️ Analysis of Weather Situation and Its Impact on Count")
     
     # Expander for Weather Situation Analysis 1
-    with st.expander("Initial Weather Situation Analysis"):
+    with st.expander("Initial Weather Situation Analysis"), section("Initial Weather Situation Analysis"):
         st.subheader("Effect of Weather Situation on Count")
         st.markdown("""
         In this analysis, we explore the distribution of bike rental counts across different weather situations (`weathersit`). The categories are:
@@ -415,7 +449,7 @@ def eda_page():
         """)
 
     # Expander for Binned Weather Situation Analysis
-    with st.expander("Binned Weather Situation Analysis"):
+    with st.expander("Binned Weather Situation Analysis"), section("Binned Weather Situation Analysis"):
         st.subheader("Simplified Weather Situation (Dry vs. Precipitation)")
         st.markdown("""
         To simplify modeling, we created a new feature called `dry_precip`:
@@ -434,7 +468,7 @@ def eda_page():
         - The presence of precipitation (category 2) correlates with a notable drop in rentals.
         """)
 
-    with st.expander("Correlation Analysis for Weather and Precipitation"):
+    with st.expander("Correlation Analysis for Weather and Precipitation"), section("Correlation Analysis for Weather and Precipitation"):
         st.subheader("Correlation Insights Between Weather Features and Bike Rentals")
         st.markdown("""
         This section presents a heatmap that illustrates the correlation between `cnt` (bike rental counts), the original `weathersit` feature, and the new `dry_precip` variable. The goal is to identify which feature may better represent weather-related influences on bike rentals.
@@ -451,7 +485,7 @@ def eda_page():
         """)
 
 
-    with st.expander("Precipitation Intensity Bins Analysis"):
+    with st.expander("Precipitation Intensity Bins Analysis"), section("Precipitation Intensity Bins Analysis"):
         st.markdown("""
         <h3>Understanding Precipitation Intensity Bins</h3>
         <p>We categorized precipitation levels into three bins based on the <code>weathersit</code> variable:</p>
@@ -472,7 +506,7 @@ def eda_page():
         - Bins 2 and 3, representing precipitation, show a clear decline in bike counts, with heavy precipitation having the lowest counts.
         - This analysis supports the decision to create distinct bins for better predictive modeling.
         """)
-    with st.expander("Frequency Distribution of Weather Situations"):
+    with st.expander("Frequency Distribution of Weather Situations"), section("Frequency Distribution of Weather Situations"):
         st.subheader("Distribution Analysis of Weather Situations")
     
         # Display the image
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+from model_store import current_model_version, load_current_model, regression_metrics
+from scoring import FEATURE_COLUMNS, model_version
+from training import DATA_PATH, load_training_data, split_training_data
+
+SPLITS = ['train', 'test']
+METRIC_NAMES = ['MAE', 'MSE', 'RMSE', 'R2', 'Adjusted R2']
+# Both splits share the same residual bin edges so their histograms are comparable
+RESIDUAL_BINS = 60
+
+
+# Adjusted R² penalizes R² by the number of model features
+def adjusted_r2(r2, n_rows, n_features=len(FEATURE_COLUMNS)):
+    return 1 - (1 - r2) * (n_rows - 1) / (n_rows - n_features - 1)
+
+
+def split_metrics(y_true, y_pred):
+    metrics = regression_metrics(y_true, y_pred)
+    metrics['Adjusted R2'] = adjusted_r2(metrics['R2'], len(y_true))
+    return metrics
+
+
+# Score both splits in one batched predict and derive metrics, residuals and histograms from it
+def evaluate_model(model, X_train, y_train, X_test, y_test, bins=RESIDUAL_BINS):
+    predictions = np.asarray(model.predict(pd.concat([X_train, X_test])), dtype=float)
+    actuals = np.concatenate([np.asarray(y_train, dtype=float), np.asarray(y_test, dtype=float)])
+    residuals = actuals - predictions
+    edges = np.histogram_bin_edges(residuals, bins=bins)
+
+    evaluation = {'residual_edges': edges, 'metrics': {}, 'residual_counts': {}, 'points': {}}
+    bounds = {'train': slice(0, len(X_train)), 'test': slice(len(X_train), None)}
+    for split in SPLITS:
+        part = bounds[split]
+        evaluation['metrics'][split] = split_metrics(actuals[part], predictions[part])
+        evaluation['residual_counts'][split] = np.histogram(residuals[part], bins=edges)[0]
+        evaluation['points'][split] = pd.DataFrame({
+            'actual': actuals[part], 'predicted': predictions[part], 'residual': residuals[part],
+        })
+    return evaluation
+
+
+# Metric table with one row per metric and one column per split, as shown on the model page
+def metrics_table(evaluation, decimals=4):
+    table = pd.DataFrame(evaluation['metrics']).loc[METRIC_NAMES].round(decimals)
+    table.columns = [split.title() for split in table.columns]
+    return table.rename_axis('Metric').reset_index()
+
+
+# The evaluation only changes when the deployed model or hour.csv changes
+def evaluation_key(data_path=DATA_PATH):
+    return current_model_version(), model_version(data_path)
+
+
+# Evaluate the deployed model on the notebook's train/test split of hour.csv
+def evaluate_current_model(data_path=DATA_PATH):
+    model, _ = load_current_model()
+    X, y = load_training_data(data_path)
+    X_train, X_test, y_train, y_test = split_training_data(X, y)
+    return evaluate_model(model, X_train, y_train, X_test, y_test)
+
+
+if __name__ == '__main__':
+    print(evaluation_key())
+    print(metrics_table(evaluate_current_model()).to_string(index=False))
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from calendar_features import calendar_columns
+from scoring import predict_counts
+
+# The model was trained on 2011 (yr 0) and 2012 (yr 1), later years reuse the latest trained level
+MAX_TRAINED_YR = 1
+
+
+# Hourly timestamps covering every day from start_date to end_date (inclusive)
+def forecast_hours(start_date, end_date):
+    start = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+    return pd.date_range(start, end, freq='h', inclusive='left')
+
+
+# Default hourly weather series: the same conditions for every hour of the range
+def constant_weather(timestamps, temp_expected_1=20, hum=50, weathersit=1):
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'temp_expected_1': float(temp_expected_1),
+        'hum': float(hum),
+        'weathersit': int(weathersit),
+    })
+
+
+# Build one scenario row per hour, with calendar fields derived from the real dates
+def forecast_frame(weather, calendar=None):
+    timestamps = pd.DatetimeIndex(weather['timestamp'])
+    frame = calendar_columns(timestamps, calendar)
+    frame.insert(0, 'timestamp', timestamps)
+    frame['yr'] = np.clip(frame['yr'], 0, MAX_TRAINED_YR)
+    frame['temp_expected_1'] = weather['temp_expected_1'].to_numpy(dtype=float)
+    frame['hum'] = weather['hum'].to_numpy(dtype=float)
+    frame['weathersit'] = weather['weathersit'].to_numpy(dtype=int)
+    return frame
+
+
+# Score all 24 x N hours of a forecast frame in one batched pass
+def multi_day_forecast(pipeline, weather, workingday_counts, non_workingday_counts, calendar=None, monitor=None):
+    frame = forecast_frame(weather, calendar)
+    frame['prediction'] = predict_counts(pipeline, frame, workingday_counts, non_workingday_counts, monitor)
+    return frame
+
+
+# Per-day summary of a scored forecast frame
+def daily_summary(frame):
+    summary = frame.groupby('dteday').agg(
+        weekday=('weekday', 'first'),
+        workingday=('workingday', 'first'),
+        holiday=('holiday', 'first'),
+        total=('prediction', 'sum'),
+        minimum=('prediction', 'min'),
+        maximum=('prediction', 'max'),
+        peak_hour=('prediction', lambda p: int(frame.loc[p.idxmax(), 'hr'])),
+    )
+    return summary.round({'total': 0, 'minimum': 0, 'maximum': 0})
@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+# Hourly history partitioned as history/station=<id>/year=<yyyy>/month=<mm>/part.arrow.
+# Partitions are uncompressed Arrow IPC files, so opening one memory-maps it and reading a column
+# touches only that column's pages; nothing is read whole into memory.
+STORE_DIR = 'history'
+MANIFEST_FILE = 'manifest.json'
+PARTITION_FILE = 'part.arrow'
+SOURCE_PATH = 'hour.csv'
+# hour.csv holds the system-wide totals, imported as one station
+DEFAULT_STATION = 'system'
+BLOCK_BYTES = 1 << 24   # ~16 MB of CSV text per imported batch
+
+_import_lock = threading.Lock()
+
+
+def station_dir(station, directory=STORE_DIR):
+    return os.path.join(directory, f'station={station}')
+
+
+def partition_path(station_path, year, month):
+    return os.path.join(station_path, f'year={year:04d}', f'month={month:02d}', PARTITION_FILE)
+
+
+# (station, year, month, path) of every partition, in station then chronological order.
+# Only directory names are read, so pruning costs no data I/O.
+def list_partitions(directory=STORE_DIR):
+    partitions = []
+    for station_name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        if not station_name.startswith('station='):
+            continue
+        for year_dir in sorted(os.listdir(os.path.join(directory, station_name))):
+            for month_dir in sorted(os.listdir(os.path.join(directory, station_name, year_dir))):
+                path = os.path.join(directory, station_name, year_dir, month_dir, PARTITION_FILE)
+                if os.path.exists(path):
+                    partitions.append((station_name.split('=', 1)[1], int(year_dir.split('=', 1)[1]),
+                                       int(month_dir.split('=', 1)[1]), path))
+    return partitions
+
+
+# Partitions that can hold rows of the given stations between start and end (inclusive dates)
+def select_partitions(start=None, end=None, stations=None, directory=STORE_DIR):
+    first = (pd.Timestamp(start).year, pd.Timestamp(start).month) if start is not None else (0, 0)
+    last = (pd.Timestamp(end).year, pd.Timestamp(end).month) if end is not None else (9999, 12)
+    stations = None if stations is None else {str(s) for s in ([stations] if isinstance(stations, str) else stations)}
+    return [p for p in list_partitions(directory)
+            if (stations is None or p[0] in stations) and first <= (p[1], p[2]) <= last]
+
+
+# Rows of one memory-mapped partition matching the row predicates, restricted to `columns`
+def read_partition(path, columns=None, start=None, end=None, workingday=None):
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    mask = None
+    if start is not None:
+        mask = pc.greater_equal(table['dteday'], pa.scalar(pd.Timestamp(start).date(), pa.date32()))
+    if end is not None:
+        upper = pc.less_equal(table['dteday'], pa.scalar(pd.Timestamp(end).date(), pa.date32()))
+        mask = upper if mask is None else pc.and_(mask, upper)
+    if workingday is not None:
+        working = pc.equal(table['workingday'], int(workingday))
+        mask = working if mask is None else pc.and_(mask, working)
+    if columns is not None:
+        table = table.select(list(columns))
+    return table if mask is None else table.filter(mask)
+
+
+# One pandas frame per matching partition, so callers can aggregate without holding the whole history
+def scan(columns=None, start=None, end=None, stations=None, workingday=None, include_station=False,
+         directory=STORE_DIR):
+    for station, _, _, path in select_partitions(start, end, stations, directory):
+        frame = read_partition(path, columns, start, end, workingday).to_pandas(date_as_object=False)
+        if include_station:
+            frame.insert(0, 'station', station)
+        if len(frame):
+            yield frame
+
+
+def load(columns=None, start=None, end=None, stations=None, workingday=None, include_station=False,
+         directory=STORE_DIR):
+    frames = list(scan(columns, start, end, stations, workingday, include_station, directory))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+# First n rows of the history, read from the first partitions only
+def head(n=5, columns=None, stations=None, directory=STORE_DIR):
+    frames, rows = [], 0
+    for frame in scan(columns, stations=stations, directory=directory):
+        frames.append(frame)
+        rows += len(frame)
+        if rows >= n:
+            break
+    return pd.concat(frames, ignore_index=True).head(n) if frames else pd.DataFrame(columns=columns)
+
+
+def read_manifest(directory=STORE_DIR):
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'stations': {}}
+
+
+def write_manifest(manifest, directory=STORE_DIR):
+    path = os.path.join(directory, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+# Changes whenever a station is (re)imported; used as a cache key for derived results
+def store_version(directory=STORE_DIR):
+    manifest = read_manifest(directory)
+    return json.dumps(manifest['stations'], sort_keys=True)
+
+
+def source_key(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'bytes': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# Import an hour.csv-schema file (hour.csv itself or ingest.py output) as one station.
+# The CSV is streamed in record batches and every batch is appended to its month's partition,
+# which is built in a scratch directory and renamed into place once complete.
+def import_csv(path=SOURCE_PATH, station=DEFAULT_STATION, directory=STORE_DIR, block_bytes=BLOCK_BYTES):
+    final_dir = station_dir(station, directory)
+    scratch_dir = os.path.join(directory, f'.import-{station}')
+    shutil.rmtree(scratch_dir, ignore_errors=True)
+    reader = pacsv.open_csv(path, read_options=pacsv.ReadOptions(use_threads=False, block_size=block_bytes),
+                            convert_options=pacsv.ConvertOptions(column_types={'dteday': pa.date32()}))
+    writers, rows = {}, 0
+    try:
+        for batch in reader:
+            dates = batch.column('dteday')
+            month_keys = pc.add(pc.multiply(pc.year(dates), 100), pc.month(dates)).to_numpy()
+            for key in np.unique(month_keys):
+                if key not in writers:
+                    partition = partition_path(scratch_dir, int(key // 100), int(key % 100))
+                    os.makedirs(os.path.dirname(partition), exist_ok=True)
+                    writers[key] = pa.ipc.new_file(partition, batch.schema)
+                writers[key].write_batch(batch.filter(pa.array(month_keys == key)))
+            rows += batch.num_rows
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    # Two renames rather than a delete and a rename: readers never see a half-deleted station, only a
+    # brief gap between the renames, and the old partitions are removed once the new ones are in place
+    old_dir = os.path.join(directory, f'.replaced-{station}')
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(final_dir):
+        os.rename(final_dir, old_dir)
+    os.replace(scratch_dir, final_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    manifest = read_manifest(directory)
+    manifest['stations'][station] = {'source': source_key(path), 'rows': rows, 'partitions': len(writers)}
+    write_manifest(manifest, directory)
+    return manifest['stations'][station]
+
+
+# Import the source file when the station is missing or the file changed since its import
+def ensure_store(source=SOURCE_PATH, station=DEFAULT_STATION, directory=STORE_DIR):
+    with _import_lock:
+        os.makedirs(directory, exist_ok=True)
+        entry = read_manifest(directory)['stations'].get(station)
+        if entry is None or entry['source'] != source_key(source):
+            entry = import_csv(source, station, directory)
+        return entry
+
+
+# python history_store.py import hour.csv [--station system]
+# python history_store.py query [--start 2012-01-01] [--end 2012-03-31] [--station system] [--workingday 1] [--columns hr cnt]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Partitioned hourly history store')
+    parser.add_argument('command', choices=['import', 'query'])
+    parser.add_argument('path', nargs='?', default=SOURCE_PATH)
+    parser.add_argument('--station', action='append')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--workingday', type=int, choices=[0, 1])
+    parser.add_argument('--columns', nargs='+')
+    parser.add_argument('--directory', default=STORE_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        for station in args.station or [DEFAULT_STATION]:
+            print(station, import_csv(args.path, station, args.directory))
+    else:
+        partitions = select_partitions(args.start, args.end, args.station, args.directory)
+        result = load(args.columns, args.start, args.end, args.station, args.workingday, True, args.directory)
+        print(f'{len(partitions)} of {len(list_partitions(args.directory))} partitions read')
+        print(result)
@@ -0,0 +1,157 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from calendar_features import calendar_columns
+
+# Trip log columns, as in the Capital Bikeshare system data
+START_COLUMN = 'Start date'
+MEMBER_COLUMN = 'Member type'
+# Member types counted as casual riders, everything else is registered
+CASUAL_MEMBER_TYPES = {'casual', 'customer'}
+# ISO timestamps and the older m/d/Y H:M export format
+TIMESTAMP_FORMATS = [pacsv.ISO8601, '%m/%d/%Y %H:%M']
+BLOCK_BYTES = 1 << 24   # ~16 MB of CSV text per streamed batch
+
+WEATHER_COLUMNS = ['weathersit', 'temp', 'atemp', 'hum', 'windspeed']
+HOUR_COLUMNS = ['instant', 'dteday', 'season', 'yr', 'mnth', 'hr', 'holiday', 'weekday', 'workingday',
+                'weathersit', 'temp', 'atemp', 'hum', 'windspeed', 'casual', 'registered', 'cnt']
+SECONDS_PER_HOUR = 3600
+# Written next to hour.csv rather than over it; import it with history_store.py or copy it over deliberately
+OUTPUT_PATH = 'hour_ingested.csv'
+
+
+# Hourly casual/registered counts, indexed by hours since the Unix epoch from `origin` on.
+# Arrays grow in both directions as batches reach earlier or later hours.
+class HourlyCounts:
+    def __init__(self):
+        self.origin = None
+        self.casual = np.zeros(0, dtype=np.int64)
+        self.total = np.zeros(0, dtype=np.int64)
+
+    def add(self, hours, is_casual):
+        if len(hours) == 0:
+            return
+        lo, hi = int(hours.min()), int(hours.max())
+        if self.origin is None:
+            self.origin = lo
+        if lo < self.origin:
+            pad = np.zeros(self.origin - lo, dtype=np.int64)
+            self.casual, self.total = np.concatenate([pad, self.casual]), np.concatenate([pad, self.total])
+            self.origin = lo
+        size = hi - self.origin + 1
+        offset = hours - self.origin
+        if size > len(self.total):
+            pad = np.zeros(size - len(self.total), dtype=np.int64)
+            self.casual, self.total = np.concatenate([self.casual, pad]), np.concatenate([self.total, pad])
+        self.total += np.bincount(offset, minlength=len(self.total))
+        self.casual += np.bincount(offset[is_casual], minlength=len(self.total))
+
+    # Hours with at least one trip, like hour.csv (hours without rentals are absent)
+    def frame(self):
+        hours = np.nonzero(self.total)[0]
+        return pd.DataFrame({
+            'hour': hours + self.origin,
+            'casual': self.casual[hours],
+            'registered': self.total[hours] - self.casual[hours],
+            'cnt': self.total[hours],
+        })
+
+
+# Stream a trip log in record batches: timestamps are parsed by Arrow and bucketed to whole hours
+# with integer division, the member type stays dictionary-encoded so it is classified once per batch
+def read_trip_hours(path, start_column=START_COLUMN, member_column=MEMBER_COLUMN, block_bytes=BLOCK_BYTES, stats=None):
+    stats = stats if stats is not None else {}
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(use_threads=False, block_size=block_bytes),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=[start_column, member_column],
+            column_types={start_column: pa.timestamp('s'), member_column: pa.dictionary(pa.int32(), pa.string())},
+            timestamp_parsers=TIMESTAMP_FORMATS,
+        ),
+    )
+    for batch in reader:
+        start = batch.column(start_column)
+        member = batch.column(member_column)
+        valid = start.is_valid().to_numpy(zero_copy_only=False)
+        seconds = start.cast(pa.int64()).fill_null(0).to_numpy()
+        casual_codes = np.array([str(v).strip().lower() in CASUAL_MEMBER_TYPES for v in member.dictionary.to_pylist()] + [False])
+        codes = member.indices.fill_null(len(casual_codes) - 1).to_numpy()
+        stats['trips'] = stats.get('trips', 0) + int(valid.sum())
+        stats['rejected'] = stats.get('rejected', 0) + int((~valid).sum())
+        yield np.floor_divide(seconds[valid], SECONDS_PER_HOUR), casual_codes[codes[valid]]
+
+
+def count_trips(path, **kwargs):
+    counts = HourlyCounts()
+    for hours, is_casual in read_trip_hours(path, **kwargs):
+        counts.add(hours, is_casual)
+    return counts.frame()
+
+
+# Hourly weather keyed by hours since the epoch, from a frame with dteday/hr (hour.csv) or timestamp columns
+def load_weather(path):
+    weather = pd.read_csv(path)
+    if 'timestamp' in weather:
+        timestamps = pd.to_datetime(weather['timestamp'])
+    else:
+        timestamps = pd.to_datetime(weather['dteday']) + pd.to_timedelta(weather['hr'], unit='h')
+    hours = timestamps.to_numpy().astype('datetime64[h]').astype(np.int64)
+    return weather[WEATHER_COLUMNS].set_index(pd.Index(hours, name='hour')).sort_index()
+
+
+# hour.csv rows for the counted hours: calendar columns derived from the dates, weather joined by hour.
+# Hours missing from the weather feed take the last known reading (the first ones the next known reading).
+def build_hourly(counts, weather, stats=None):
+    stats = stats if stats is not None else {}
+    weather = weather[~weather.index.duplicated(keep='last')]
+    joined = weather.reindex(counts['hour'])
+    stats['weather_filled_hours'] = int(joined['weathersit'].isna().sum())
+    joined = joined.ffill().bfill()
+
+    timestamps = pd.DatetimeIndex(counts['hour'].to_numpy().astype('datetime64[h]'))
+    hourly = calendar_columns(timestamps)
+    hourly['dteday'] = hourly['dteday'].dt.strftime('%Y-%m-%d')
+    hourly['instant'] = np.arange(1, len(hourly) + 1)
+    for column in WEATHER_COLUMNS:
+        hourly[column] = joined[column].to_numpy()
+    hourly['weathersit'] = hourly['weathersit'].astype(int)
+    for column in ['casual', 'registered', 'cnt']:
+        hourly[column] = counts[column].to_numpy()
+    return hourly[HOUR_COLUMNS]
+
+
+# Trip log + hourly weather -> hour.csv-compatible file, returns throughput statistics.
+# An existing output (hour.csv above all, which every cache and the history store derive from) is only
+# replaced with overwrite=True.
+def ingest(trips_path, weather_path, output_path=OUTPUT_PATH, overwrite=False, **kwargs):
+    if not overwrite and os.path.exists(output_path):
+        raise FileExistsError(f"{output_path} already exists, not overwriting it")
+    stats = {}
+    start = time.perf_counter()
+    counts = count_trips(trips_path, stats=stats, **kwargs)
+    stats['count_seconds'] = time.perf_counter() - start
+    hourly = build_hourly(counts, load_weather(weather_path), stats)
+    hourly.to_csv(output_path, index=False)
+    stats['hours'] = len(hourly)
+    stats['seconds'] = time.perf_counter() - start
+    stats['trips_per_second'] = stats['trips'] / stats['count_seconds'] if stats['count_seconds'] else None
+    return stats
+
+
+# python ingest.py trips.csv weather.csv [--output hour_ingested.csv] [--overwrite]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aggregate a trip log and hourly weather into an hour.csv-schema file')
+    parser.add_argument('trips')
+    parser.add_argument('weather')
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    parser.add_argument('--overwrite', action='store_true', help='replace an existing output file')
+    args = parser.parse_args()
+    try:
+        print(ingest(args.trips, args.weather, args.output, overwrite=args.overwrite))
+    except FileExistsError as e:
+        raise SystemExit(f"{e}; pass --overwrite to replace it")
@@ -0,0 +1,128 @@
+import os
+import joblib
+import numpy as np
+from sklearn.tree import DecisionTreeRegressor
+from model_store import MAX_FLAT_DEPTH, TREE_ARRAYS, FlatEnsemble, flatten_ensemble
+from scoring import split_pipeline
+from training import GBR_PARAMS, RANDOM_STATE
+
+JOINT_MODEL_PATH = 'gbr_joint.pkl'
+# Outputs of the joint model; the total is their sum, so the three always add up
+JOINT_TARGETS = ['casual', 'registered']
+RIDER_COLUMNS = JOINT_TARGETS + ['total']
+# Hyperparameters taken over from a classic gradient boosting point model
+JOINT_PARAM_NAMES = ['n_estimators', 'learning_rate', 'max_depth', 'min_samples_split', 'min_samples_leaf', 'subsample']
+# Batches up to this size are scored from the padded arrays, larger ones tree by tree in sklearn; lower than
+# model_store.FLAT_BATCH_LIMIT because this fallback is a Python loop over tree_.predict, not GBR's predict_stages
+JOINT_FLAT_BATCH_LIMIT = 64
+
+
+# Gradient boosting with multi-output trees on squared error: every tree splits on the residuals of all
+# targets at once and stores one value per target in its leaves, so one traversal predicts every target.
+# Residuals are scaled to unit variance per target while fitting, so the smaller casual counts get as
+# much say in the splits as the registered ones; leaf values are stored back in counts.
+class JointBoostingRegressor:
+    def __init__(self, n_estimators=500, learning_rate=0.05, max_depth=5, min_samples_split=40, min_samples_leaf=8,
+                 subsample=0.9, random_state=RANDOM_STATE):
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.min_samples_split = min_samples_split
+        self.min_samples_leaf = min_samples_leaf
+        self.subsample = subsample
+        self.random_state = random_state
+
+    def fit(self, X, Y):
+        X = np.asarray(X, dtype=np.float32)
+        Y = np.asarray(Y, dtype=float)
+        rng = np.random.RandomState(self.random_state)
+        self.n_features_in_ = X.shape[1]
+        self.init_ = Y.mean(axis=0)
+        scale = np.where(Y.std(axis=0) > 0, Y.std(axis=0), 1.0)
+        current = np.tile(self.init_, (len(X), 1))
+        n_rows = max(1, int(self.subsample * len(X)))
+
+        self.estimators_ = np.empty((self.n_estimators, 1), dtype=object)
+        for i in range(self.n_estimators):
+            rows = rng.choice(len(X), n_rows, replace=False) if n_rows < len(X) else np.arange(len(X))
+            tree = DecisionTreeRegressor(max_depth=self.max_depth, min_samples_split=self.min_samples_split,
+                                         min_samples_leaf=self.min_samples_leaf, random_state=rng)
+            tree.fit(X[rows], (Y[rows] - current[rows]) / scale)
+            # Leaf values are residual means, so rescaling them gives the means in counts
+            tree.tree_.value[:, :, 0] *= scale
+            current += self.learning_rate * tree.tree_.predict(X)[:, :, 0]
+            self.estimators_[i, 0] = tree
+
+        arrays, depth = flatten_ensemble(self)
+        self.flat_ = FlatEnsemble(init=self.init_, learning_rate=self.learning_rate,
+                                  **{name: arrays[name] for name in TREE_ARRAYS}) if depth <= MAX_FLAT_DEPTH else None
+        return self
+
+    # (rows, targets) predictions: small batches from the padded arrays, large ones tree by tree in sklearn
+    def predict(self, X):
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} encoded features, got {X.shape[1]}")
+        if self.flat_ is not None and len(X) <= JOINT_FLAT_BATCH_LIMIT:
+            return self.flat_.predict(X)
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        total = np.zeros((len(X), len(self.init_)))
+        for (tree,) in self.estimators_:
+            total += tree.tree_.predict(X)[:, :, 0]
+        return self.init_ + self.learning_rate * total
+
+
+# Same number and depth of trees as a gradient boosting point model, so one joint traversal costs one
+# point predict; other engines get the training defaults
+def joint_params(regressor):
+    if hasattr(regressor, 'estimators_'):
+        return {k: v for k, v in regressor.get_params().items() if k in JOINT_PARAM_NAMES}
+    return dict(GBR_PARAMS)
+
+
+# Fit the joint model on the point pipeline's encoded features, so serving encodes once for all models
+def train_joint_model(pipeline, X_train, Y_train, params=None):
+    encoder, regressor = split_pipeline(pipeline)
+    model = JointBoostingRegressor(**{**joint_params(regressor), **(params or {})})
+    model.feature_names_ = [str(name) for name in encoder.get_feature_names_out()]
+    return model.fit(encoder.transform(X_train), Y_train)
+
+
+def save_joint_model(model, path=JOINT_MODEL_PATH):
+    joblib.dump(model, path)
+
+
+# Returns None when no joint model has been trained, or when it was trained on another encoding of the
+# features than `pipeline` produces (for example after switching engines)
+def load_joint_model(pipeline=None, path=JOINT_MODEL_PATH):
+    if not os.path.exists(path):
+        return None
+    model = joblib.load(path)
+    if pipeline is not None:
+        encoder, _ = split_pipeline(pipeline)
+        if model.feature_names_ != [str(name) for name in encoder.get_feature_names_out()]:
+            return None
+    return model
+
+
+# Train on the notebook split and compare with the single-target model: python joint_model.py
+if __name__ == '__main__':
+    import time
+    # Imported from the module so the pickle refers to joint_model.JointBoostingRegressor, not __main__
+    from joint_model import save_joint_model, train_joint_model
+    from model_store import current_pipeline, regression_metrics
+    from scoring import predict_riders
+    from training import load_training_data, split_training_data
+
+    pipeline = current_pipeline()
+    X, Y = load_training_data(target=JOINT_TARGETS)
+    X_train, X_test, Y_train, Y_test = split_training_data(X, Y)
+    start = time.perf_counter()
+    model = train_joint_model(pipeline, X_train, Y_train)
+    print(f"Trained in {time.perf_counter() - start:.1f} s")
+    save_joint_model(model)
+
+    riders = predict_riders(pipeline, model, X_test)
+    actual = Y_test.assign(total=Y_test.sum(axis=1))
+    for column in RIDER_COLUMNS:
+        print(column, {k: round(v, 3) for k, v in regression_metrics(actual[column], riders[column]).items()})
+    print('cnt model', {k: round(v, 3) for k, v in regression_metrics(actual['total'], pipeline.predict(X_test)).items()})
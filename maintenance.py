@@ -0,0 +1,163 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import history_store
+from calendar_features import season_from_dates
+from forecast import forecast_hours
+from model_router import ModelRouter
+from rebalancing import forecast_station_demand
+
+WINDOW_HOURS = 4
+# At most this fraction of the fleet may be in maintenance during any hour
+FLEET_CAP = 0.1
+# Every station is serviced once per period, on one of the period's days ranked by their best window
+PERIOD_DAYS = 7
+# First day of every season as coded in hour.csv (1 winter, 2 spring, 3 summer, 4 fall)
+SEASON_STARTS = {1: (12, 21), 2: (3, 21), 3: (6, 21), 4: (9, 23)}
+SEASON_NAMES = {1: 'Winter', 2: 'Spring', 3: 'Summer', 4: 'Fall'}
+
+
+# Hourly timestamps of a season, starting on its first day in `year` (winter runs into the next year)
+def season_hours(season, year):
+    start = pd.Timestamp(year, *SEASON_STARTS[season])
+    days = pd.date_range(start, start + pd.Timedelta(days=100), freq='D')
+    days = days[np.cumprod(season_from_dates(days) == season).astype(bool)]
+    return forecast_hours(days[0], days[-1])
+
+
+# Typical weather for every timestamp: mean temperature and humidity and the rounded mean weather
+# situation of its month and hour in the stored history
+def climatology_weather(timestamps, stations=history_store.DEFAULT_STATION, directory=history_store.STORE_DIR):
+    sums = np.zeros((3, 13 * 24))
+    counts = np.zeros(13 * 24)
+    for frame in history_store.scan(['mnth', 'hr', 'temp', 'hum', 'weathersit'], stations=stations, directory=directory):
+        cell = frame['mnth'].to_numpy() * 24 + frame['hr'].to_numpy()
+        counts += np.bincount(cell, minlength=len(counts))
+        for i, column in enumerate(['temp', 'hum', 'weathersit']):
+            sums[i] += np.bincount(cell, weights=frame[column], minlength=len(counts))
+    means = sums / np.maximum(counts, 1)
+    timestamps = pd.DatetimeIndex(timestamps)
+    cell = timestamps.month * 24 + timestamps.hour
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'temp_expected_1': means[0, cell] * 41,
+        'hum': means[1, cell] * 100,
+        'weathersit': np.clip(np.round(means[2, cell]), 1, 4).astype(int),
+    })
+
+
+# Demand of every window of `hours` consecutive hours, (stations, starts) from (stations, hours) forecasts
+def window_sums(demand, hours):
+    cumulative = np.concatenate([np.zeros((len(demand), 1)), np.cumsum(demand, axis=1)], axis=1)
+    return cumulative[:, hours:] - cumulative[:, :-hours]
+
+
+# Lowest-demand window start of every day and its demand, (stations, days) arrays.
+# Windows start within their day but may run past midnight.
+def daily_windows(demand, hours=WINDOW_HOURS):
+    sums = window_sums(demand, hours)
+    days = demand.shape[1] // 24
+    padded = np.full((len(sums), days * 24), np.inf)
+    padded[:, :min(sums.shape[1], days * 24)] = sums[:, :days * 24]
+    padded = padded.reshape(len(sums), days, 24)
+    hour = padded.argmin(axis=2)
+    return hour + np.arange(days) * 24, np.take_along_axis(padded, hour[..., None], axis=2)[..., 0]
+
+
+# Days of every period ranked by the demand of their best window, as (starts, demand) arrays of
+# shape (stations, periods, period_days); days missing from a short last period get inf demand
+def ranked_windows(demand, hours=WINDOW_HOURS, period_days=PERIOD_DAYS):
+    starts, sums = daily_windows(demand, hours)
+    periods = -(-starts.shape[1] // period_days)
+    padded_starts = np.zeros((len(starts), periods * period_days), dtype=int)
+    padded_sums = np.full((len(sums), periods * period_days), np.inf)
+    padded_starts[:, :starts.shape[1]] = starts
+    padded_sums[:, :sums.shape[1]] = sums
+    padded_starts = padded_starts.reshape(len(starts), periods, period_days)
+    padded_sums = padded_sums.reshape(len(sums), periods, period_days)
+    order = np.argsort(padded_sums, axis=2, kind='stable')
+    return np.take_along_axis(padded_starts, order, axis=2), np.take_along_axis(padded_sums, order, axis=2)
+
+
+# Assign every station one window per period while the hourly number of bikes in maintenance stays
+# within the fleet cap. Round r offers every unassigned (station, period) its r-th ranked day; proposals
+# sharing a window start are accepted together, lowest demand first, up to the capacity left in the window.
+# Returns the chosen rank per (station, period), -1 when no day fits, and the hourly occupancy.
+def assign_windows(starts, sums, bikes, total_hours, hours=WINDOW_HOURS, fleet_cap=FLEET_CAP):
+    cap = fleet_cap * bikes.sum()
+    occupancy = np.zeros(total_hours)
+    assigned = np.full(starts.shape[:2], -1)
+    for rank in range(starts.shape[2]):
+        station, period = np.nonzero((assigned < 0) & np.isfinite(sums[..., rank]))
+        order = np.lexsort((sums[station, period, rank], starts[station, period, rank]))
+        station, period = station[order], period[order]
+        window = starts[station, period, rank]
+        for start, first, count in zip(*np.unique(window, return_index=True, return_counts=True)):
+            headroom = cap - occupancy[start:start + hours].max()
+            taken = first + np.nonzero(np.cumsum(bikes[station[first:first + count]]) <= headroom)[0]
+            occupancy[start:start + hours] += bikes[station[taken]].sum()
+            assigned[station[taken], period[taken]] = rank
+    return assigned, occupancy
+
+
+# Ranked maintenance windows and an assigned schedule for every station over a range of hours.
+# stations: station, bikes (in service there) and optionally share, as for rebalancing.
+def maintenance_plan(stations, timestamps, weather=None, router=None, hours=WINDOW_HOURS, fleet_cap=FLEET_CAP,
+                     period_days=PERIOD_DAYS):
+    router = router or ModelRouter()
+    timestamps = pd.DatetimeIndex(timestamps)
+    weather = weather if weather is not None else climatology_weather(timestamps)
+    start = time.perf_counter()
+    demand = forecast_station_demand(router, stations, weather)
+    forecast_seconds = time.perf_counter() - start
+
+    starts, sums = ranked_windows(demand, hours, period_days)
+    bikes = stations['bikes'].to_numpy(dtype=float)
+    assigned, occupancy = assign_windows(starts, sums, bikes, len(timestamps), hours, fleet_cap)
+
+    station, period, rank = np.indices(starts.shape).reshape(3, -1)
+    valid = np.isfinite(sums.ravel())
+    ids = stations['station'].astype(str).to_numpy()
+    first = starts.ravel()[valid]
+    ranked = pd.DataFrame({
+        'station': ids[station[valid]],
+        'period': period[valid] + 1,
+        'rank': rank[valid] + 1,
+        'start': timestamps[first],
+        'end': timestamps[first] + pd.Timedelta(hours=hours),
+        'forecast_rentals': sums.ravel()[valid].round(1),
+        'scheduled': assigned[station[valid], period[valid]] == rank[valid],
+    })
+    schedule = ranked[ranked['scheduled']].drop(columns='scheduled').reset_index(drop=True)
+    summary = {
+        'stations': len(stations),
+        'periods': starts.shape[1],
+        'scheduled': int((assigned >= 0).sum()),
+        'unscheduled': int((assigned < 0).sum()),
+        'peak_fleet_share': float(occupancy.max() / bikes.sum()) if bikes.sum() else 0.0,
+        'forecast_seconds': forecast_seconds,
+        'plan_seconds': time.perf_counter() - start - forecast_seconds,
+    }
+    return schedule, ranked.drop(columns='scheduled'), summary
+
+
+# python maintenance.py stations.csv [--season 3] [--year 2025] [--hours 4] [--fleet-cap 0.1] [--output schedule.csv]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Schedule station maintenance in the lowest-demand windows of a season')
+    parser.add_argument('stations')
+    parser.add_argument('--season', type=int, choices=sorted(SEASON_NAMES), default=3)
+    parser.add_argument('--year', type=int, default=pd.Timestamp.today().year)
+    parser.add_argument('--hours', type=int, default=WINDOW_HOURS)
+    parser.add_argument('--fleet-cap', type=float, default=FLEET_CAP)
+    parser.add_argument('--period-days', type=int, default=PERIOD_DAYS)
+    parser.add_argument('--output', default='schedule.csv')
+    args = parser.parse_args()
+
+    history_store.ensure_store()
+    stations = pd.read_csv(args.stations, dtype={'station': str})
+    schedule, _, summary = maintenance_plan(stations, season_hours(args.season, args.year), hours=args.hours,
+                                            fleet_cap=args.fleet_cap, period_days=args.period_days)
+    schedule.to_csv(args.output, index=False)
+    print(schedule.head(20).to_string(index=False))
+    print(summary)
@@ -1,8 +1,61 @@
 import streamlit as st
+from perf import section
+import numpy as np
 import pandas as pd
+import plotly.graph_objects as go
 from PIL import Image
+from app_resources import get_drift_monitor
+from chart_data import scatter_figure
+from drift import CHECK_INTERVAL_SECONDS, MIN_WINDOW_ROWS, report_table
+from evaluation import evaluate_current_model, evaluation_key, metrics_table
+from model_store import ModelArtifactError, current_model_version
+
+
+# Metrics of the deployed model, recomputed only when the model or hour.csv changes
+@st.cache_resource(max_entries=4)
+def load_evaluation(model_version, data_version):
+    return evaluate_current_model()
+
+
+def get_evaluation():
+    try:
+        with section("Evaluate deployed model"):
+            return load_evaluation(*evaluation_key())
+    except ModelArtifactError as e:
+        st.error(f"The prediction model could not be loaded: {e}")
+        st.stop()
+
+
+# Predicted vs actual points with the ideal y = x line
+def predicted_actual_figure(points, title):
+    fig = scatter_figure(points, 'actual', 'predicted', title=title,
+                         labels={'actual': 'Actual users', 'predicted': 'Predicted users'})
+    upper = float(max(points['actual'].max(), points['predicted'].max()))
+    fig.add_trace(go.Scatter(x=[0, upper], y=[0, upper], mode='lines', line={'color': 'red', 'dash': 'dash'}, name='Ideal'))
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def residuals_figure(points, title):
+    fig = scatter_figure(points, 'predicted', 'residual', title=title,
+                         labels={'predicted': 'Predicted users', 'residual': 'Residual'})
+    fig.add_hline(y=0, line_color='red', line_dash='dash')
+    return fig
+
+
+# Residual histogram from the precomputed counts, no raw residuals are sent to the browser
+def residual_distribution_figure(evaluation, split, title):
+    edges = evaluation['residual_edges']
+    fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=evaluation['residual_counts'][split],
+                           width=np.diff(edges), marker_line_width=0))
+    fig.update_layout(title=title, xaxis_title='Residual', yaxis_title='Count', bargap=0)
+    return fig
+
 
 def ml_model_page():
+    evaluation = get_evaluation()
+    gb_metrics = evaluation['metrics']
+
     st.title("🚴 Comprehensive Machine Learning Model Creation")
 
     # Introduction
@@ -19,10 +72,10 @@ def ml_model_page():
     An Adjusted R² value close to 1 indicates that the model explains a large proportion of the variance in the target variable while considering model complexity.
     """)
 
-    st.markdown("""
+    st.markdown(f"""
     ### Model's Adjusted R² Performance:
-    - **Training Data Adjusted R²**: 0.9656 (Gradient Boosting Regressor)
-    - **Test Data Adjusted R²**: 0.9488 (Gradient Boosting Regressor)
+    - **Training Data Adjusted R²**: {gb_metrics['train']['Adjusted R2']:.4f} (Gradient Boosting Regressor)
+    - **Test Data Adjusted R²**: {gb_metrics['test']['Adjusted R2']:.4f} (Gradient Boosting Regressor)
     """)
 
     # Separation line with a prompt
@@ -31,10 +84,11 @@ def ml_model_page():
     # Comparison Table of Adjusted R² for Models
     st.subheader("📊 Comparison of Adjusted R² Across Models")
     st.write("Below is a comparison of the Adjusted R² metric for the Gradient Boosting and Extra Trees Regressor models:")
+    # Gradient Boosting is the deployed model and is evaluated live, Extra Trees values come from the notebook
     comparison_dict = {
         'Model': ['Gradient Boosting Regressor', 'Extra Trees Regressor'],
-        'Adjusted R² (Train)': [0.9656, 0.9653],
-        'Adjusted R² (Test)': [0.9488, 0.9413]
+        'Adjusted R² (Train)': [round(gb_metrics['train']['Adjusted R2'], 4), 0.9653],
+        'Adjusted R² (Test)': [round(gb_metrics['test']['Adjusted R2'], 4), 0.9413]
     }
     comparison_df = pd.DataFrame(comparison_dict)
     st.table(comparison_df)
@@ -45,7 +99,7 @@ def ml_model_page():
     st.write("The initial dataset was reviewed to identify key features relevant to the analysis.")
 
     # Feature Selection as a dropdown
-    with st.expander("🔧 Feature Selection - Recursive Feature Elimination with Cross-Validation"):
+    with st.expander("🔧 Feature Selection - Recursive Feature Elimination with Cross-Validation"), section("🔧 Feature Selection - Recursive Feature Elimination with Cross-Validation"):
         st.write("""
         We'll start with a shortlist of features that we are interested in using for the model. 
         We dropped certain columns from the dataset due to their redundancy or irrelevance based on the analysis. These include:
@@ -85,54 +139,65 @@ def ml_model_page():
     Below are the performance metrics of the Gradient Boosting Regressor model, showcasing its accuracy and predictive capabilities. These metrics are critical for understanding the quality of the model.
     """)
 
-    # Gradient Boosting Metrics Table
-    gb_results_dict = {
-        'Metric': ['MAE', 'MSE', 'RMSE', 'R2', 'Adjusted R2'],
-        'Train': [21.91, 1140.16, 33.77, 0.9656, 0.9656],
-        'Test': [25.39, 1617.21, 40.21, 0.9489, 0.9488]
-    }
-    gb_results_df = pd.DataFrame(gb_results_dict)
-    st.table(gb_results_df)
+    # Gradient Boosting Metrics Table, computed from the deployed model on the held-out split
+    st.table(metrics_table(evaluation))
 
     st.write("The model's performance indicates high accuracy, with a strong Adjusted R² and relatively low errors, showing it is well-suited for predicting the number of bike users.")
 
     # Predicted vs Actual Values (shown directly)
     st.subheader("🔬 Predicted vs Actual Values - Gradient Boosting Regressor")
     col1, col2 = st.columns(2)
-    with col1:
-        gb_pred_act_train_image = Image.open("pred_act_train.png")
-        st.image(gb_pred_act_train_image, caption="Predicted vs Actual Values (Training Data)", use_column_width=True)
-    with col2:
-        gb_pred_act_test_image = Image.open("pred_act_test.png")
-        st.image(gb_pred_act_test_image, caption="Predicted vs Actual Values (Test Data)", use_column_width=True)
+    with col1, section("Predicted vs Actual - Gradient Boosting (train)"):
+        st.plotly_chart(predicted_actual_figure(evaluation['points']['train'], "Predicted vs Actual Values (Training Data)"))
+    with col2, section("Predicted vs Actual - Gradient Boosting (test)"):
+        st.plotly_chart(predicted_actual_figure(evaluation['points']['test'], "Predicted vs Actual Values (Test Data)"))
 
     # Residuals Analysis as a dropdown
-    with st.expander("📉 Residuals Analysis - Gradient Boosting"):
+    with st.expander("📉 Residuals Analysis - Gradient Boosting"), section("📉 Residuals Analysis - Gradient Boosting"):
         st.write("""
         Residual analysis is crucial for evaluating how well the model's predictions align with the actual data. 
         Ideally, residuals should be randomly scattered around zero with no clear pattern, indicating that the model's predictions are unbiased and that it has captured the underlying structure of the data.
         """)
         col3, col4 = st.columns(2)
         with col3:
-            gb_res_train_image = Image.open("res_test.png")
-            st.image(gb_res_train_image, caption="Residuals vs Predicted Values (Training Data)", use_column_width=True)
+            st.plotly_chart(residuals_figure(evaluation['points']['train'], "Residuals vs Predicted Values (Training Data)"))
         with col4:
-            gb_res_test_image = Image.open("res_test2.png")
-            st.image(gb_res_test_image, caption="Residuals vs Predicted Values (Test Data)", use_column_width=True)
+            st.plotly_chart(residuals_figure(evaluation['points']['test'], "Residuals vs Predicted Values (Test Data)"))
 
     # Residual Distribution Analysis as a dropdown
-    with st.expander("📊 Residual Distribution Analysis - Gradient Boosting"):
+    with st.expander("📊 Residual Distribution Analysis - Gradient Boosting"), section("📊 Residual Distribution Analysis - Gradient Boosting"):
         st.write("""
         To further understand how well the residuals are distributed, we plotted the distribution for both training and test data. 
         A normal distribution centered around zero with most residuals close to zero indicates a good model fit.
         """)
         col5, col6 = st.columns(2)
         with col5:
-            gb_res_dist_train_image = Image.open("red_dis_training.png")
-            st.image(gb_res_dist_train_image, caption="Residual Distribution (Training Data)", use_column_width=True)
+            st.plotly_chart(residual_distribution_figure(evaluation, 'train', "Residual Distribution (Training Data)"))
         with col6:
-            gb_res_dist_test_image = Image.open("red_dist_test.png")
-            st.image(gb_res_dist_test_image, caption="Residual Distribution (Test Data)", use_column_width=True)
+            st.plotly_chart(residual_distribution_figure(evaluation, 'test', "Residual Distribution (Test Data)"))
+
+    # Drift of the Simulation page's live scenarios and predictions against the training split
+    with st.expander("📡 Live Input and Prediction Drift - Gradient Boosting"), section("📡 Live Input and Prediction Drift - Gradient Boosting"):
+        st.write(f"""
+        Every scenario scored on the Simulation page is binned into streaming histograms of the model inputs and predictions. 
+        Every {CHECK_INTERVAL_SECONDS // 60} minutes (once at least {MIN_WINDOW_ROWS} predictions arrived) they are compared with the 
+        training split using the population stability index (PSI: below 0.1 stable, above 0.25 significant drift) and the 
+        Kolmogorov-Smirnov statistic.
+        """)
+        try:
+            monitor = get_drift_monitor(current_model_version())
+        except ModelArtifactError as e:
+            st.error(f"The drift baseline could not be built: {e}")
+        else:
+            if st.button('Compare now'):
+                monitor.check(force=True)
+            report = monitor.latest()
+            if report is None:
+                st.info(f"No comparison yet: {monitor.window_rows} live predictions observed since the last check.")
+            else:
+                st.caption(f"Last comparison at {report['time']} over {report['rows']} predictions "
+                           f"({monitor.total_rows} observed in total).")
+                st.dataframe(report_table(report).round(4), hide_index=True)
 
     # Extra Trees Regressor Section
     st.header("🌳 Extra Trees Regressor: Model Training and Tuning")
@@ -154,15 +219,15 @@ def ml_model_page():
     # Predicted vs Actual Values - Extra Trees Regressor
     st.subheader("🔬 Predicted vs Actual Values - Extra Trees Regressor")
     col7, col8 = st.columns(2)
-    with col7:
+    with col7, section("Predicted vs Actual - Extra Trees (train)"):
         etr_pred_act_train_image = Image.open("extra_tree_pred_actual_train.png")
         st.image(etr_pred_act_train_image, caption="Predicted vs Actual Values (Training Data)", use_column_width=True)
-    with col8:
+    with col8, section("Predicted vs Actual - Extra Trees (test)"):
         etr_pred_act_test_image = Image.open("extra_tree_pred_act_test.png")
         st.image(etr_pred_act_test_image, caption="Predicted vs Actual Values (Test Data)", use_column_width=True)
 
     # Residuals Analysis - Extra Trees
-    with st.expander("📉 Residuals Analysis - Extra Trees"):
+    with st.expander("📉 Residuals Analysis - Extra Trees"), section("📉 Residuals Analysis - Extra Trees"):
         st.write("""
         As expected, there is no even distribution around 0, as there are underpredictions for higher values and overpredictions for lower values.
         """)
@@ -175,7 +240,7 @@ def ml_model_page():
             st.image(etr_res_test_image, caption="Residuals vs Predicted Values (Test Data)", use_column_width=True)
 
     # Residual Distribution Analysis - Extra Trees
-    with st.expander("📊 Residual Distribution Analysis - Extra Trees"):
+    with st.expander("📊 Residual Distribution Analysis - Extra Trees"), section("📊 Residual Distribution Analysis - Extra Trees"):
         st.write("""
         This shows that our model in general is slightly biased towards overpredictions as the the distribution seems to be skewed left from the mean. The reason why average residuals are still close to 0 is likely due to the fact that, as mentioned earlier, the model underpredicts for higher values which affects the average residuals, this can be seen on this graph as well.
         """)
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import history_store
+from model_store import MANIFEST_FILE, ModelArtifactError, artifact_version, current_model_version, load_current_model, load_serving_model
+from scoring import calculate_features, load_hourly_averages, store_hourly_averages
+
+# One model artifact directory (model_store.export_model layout) per station or cluster: models/<name>/.
+# routes.json maps stations to a shared cluster model, {"31201": "downtown", ...}.
+# Stations without a route or a directory of their own use the app's current model.
+MODELS_DIR = 'models'
+ROUTES_FILE = 'routes.json'
+DEFAULT_MODEL = 'default'
+# Loaded models are evicted least recently used first once their artifacts add up to more than this
+MAX_RESIDENT_BYTES = 256 << 20
+
+
+# Station -> model resolution and a bounded LRU of loaded models with load metrics.
+# Safe to share between Streamlit sessions: the LRU and counters are guarded by one lock, held only
+# for bookkeeping and never while a model loads.
+class ModelRouter:
+    def __init__(self, models_dir=MODELS_DIR, max_bytes=MAX_RESIDENT_BYTES, max_models=None):
+        self.models_dir = models_dir
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self._models = OrderedDict()   # (name, version) -> (model, bytes)
+        self._loading = {}             # (name, version) -> Future of a load in progress
+        self._lock = threading.Lock()
+        self._routes = (None, {})
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'load_seconds': 0.0}
+        self.load_times = {}
+
+    # routes.json, re-read only when the file changes
+    def routes(self):
+        path = os.path.join(self.models_dir, ROUTES_FILE)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return {}
+        key = (stat.st_size, stat.st_mtime_ns)
+        if self._routes[0] != key:
+            with open(path) as f:
+                self._routes = (key, {str(station): name for station, name in json.load(f).items()})
+        return self._routes[1]
+
+    def model_dir(self, name):
+        return os.path.join(self.models_dir, name)
+
+    def resolve(self, station):
+        station = str(station)
+        name = self.routes().get(station, station)
+        if name != DEFAULT_MODEL and os.path.exists(os.path.join(self.model_dir(name), MANIFEST_FILE)):
+            return name
+        return DEFAULT_MODEL
+
+    # Stations with a route or a model of their own, plus the default
+    def stations(self):
+        own = sorted(name for name in os.listdir(self.models_dir)
+                     if os.path.exists(os.path.join(self.model_dir(name), MANIFEST_FILE))) if os.path.isdir(self.models_dir) else []
+        return [DEFAULT_MODEL] + sorted(set(own) | set(self.routes()) - {DEFAULT_MODEL})
+
+    def version(self, name):
+        return current_model_version() if name == DEFAULT_MODEL else artifact_version(self.model_dir(name))
+
+    # Model and artifact bytes on disk, the footprint counted against max_bytes. A model loaded without an
+    # artifact manifest is measured by its pickled size, so nothing here assumes gbr_pipeline.pkl exists.
+    def _load(self, name):
+        if name == DEFAULT_MODEL:
+            model, _ = load_current_model()
+            manifest = getattr(model, 'manifest', None)
+            size = sum(f['bytes'] for f in manifest['files'].values()) if manifest else len(pickle.dumps(model))
+            return model, size
+        model = load_serving_model(self.model_dir(name))
+        return model, sum(f['bytes'] for f in model.manifest['files'].values())
+
+    # Loaded model for a model name; a retrained artifact has a new version and is loaded afresh.
+    # Loading happens outside the lock, so other models keep being served meanwhile; concurrent
+    # requests for a model being loaded wait for that one load instead of starting their own.
+    def get(self, name):
+        key = (name, self.version(name))
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.counters['hits'] += 1
+                return self._models[key][0]
+            self.counters['misses'] += 1
+            loading = self._loading.get(key)
+            owner = loading is None
+            if owner:
+                loading = self._loading[key] = Future()
+        if not owner:
+            return loading.result()
+        try:
+            start = time.perf_counter()
+            model, size = self._load(name)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            loading.set_exception(e)
+            raise
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.counters['load_seconds'] += seconds
+            self.load_times[name] = seconds
+            for stale in [k for k in self._models if k[0] == name]:
+                del self._models[stale]
+            self._models[key] = (model, size)
+            self._evict()
+            del self._loading[key]
+        loading.set_result(model)
+        return model
+
+    def _evict(self):
+        # The most recent model always stays, even when it alone exceeds the budget
+        while len(self._models) > 1 and (self.resident_bytes() > self.max_bytes or
+                                         (self.max_models is not None and len(self._models) > self.max_models)):
+            self._models.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def model(self, station):
+        return self.get(self.resolve(station))
+
+    def resident_bytes(self):
+        return sum(size for _, size in self._models.values())
+
+    def stats(self):
+        with self._lock:
+            requests = self.counters['hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'hit_rate': self.counters['hits'] / requests if requests else None,
+                'resident_models': [name for name, _ in self._models],
+                'resident_bytes': self.resident_bytes(),
+                'max_bytes': self.max_bytes,
+            }
+
+    # Predictions for rows of features, one batched predict per model rather than per row or station
+    def predict(self, stations, features):
+        unique, inverse = np.unique(np.asarray(stations, dtype=str), return_inverse=True)
+        models = np.array([self.resolve(station) for station in unique])[inverse]
+        predictions = np.empty(len(features))
+        for name in pd.unique(models):
+            rows = np.nonzero(models == name)[0]
+            predictions[rows] = self.get(name).predict(features.iloc[rows])
+        return np.clip(predictions, 0, None)
+
+
+@lru_cache(maxsize=1)
+def shared_hourly_averages():
+    return (load_hourly_averages('workingday_counts_with_weekday.csv'),
+            load_hourly_averages('non_workingday_counts_with_weekday.csv'))
+
+
+# (workingday_counts, non_workingday_counts) of a station: from its history in the store when it has one,
+# otherwise the shared CSV tables. Months the history does not cover also come from the shared tables,
+# rather than scoring them with averages of 0.
+def station_hourly_averages(station, directory=history_store.STORE_DIR):
+    shared = shared_hourly_averages()
+    if str(station) not in history_store.read_manifest(directory)['stations']:
+        return shared
+    own = store_hourly_averages(str(station), directory=directory)
+    return tuple(np.where(table.any(axis=(1, 2), keepdims=True), table, fallback) for table, fallback in zip(own, shared))
+
+
+# Stations scored by the default model from the shared CSV tables: the setup the quantile models,
+# prediction surface, joint model and drift baseline were all built for
+def uses_system_tables(router, station, directory=history_store.STORE_DIR):
+    return router.resolve(station) == DEFAULT_MODEL and str(station) not in history_store.read_manifest(directory)['stations']
+
+
+# Score scenarios that carry a 'station' column. hourly_averages(station) returns the station's
+# lookup tables; features are built per station, predictions per model.
+def predict_station_scenarios(router, scenarios, hourly_averages=station_hourly_averages):
+    stations = scenarios['station'].astype(str)
+    features = pd.concat([calculate_features(group, *hourly_averages(station))
+                          for station, group in scenarios.groupby(stations, sort=False)])
+    features = features.loc[scenarios.index]
+    return router.predict(stations.to_numpy(), features)
+
+
+# python model_router.py scenarios.csv predictions.csv [--models models] [--max-mb 256]
+# Scenario columns: station plus the scoring.py columns
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score scenarios for many stations through the model router')
+    parser.add_argument('scenarios')
+    parser.add_argument('output')
+    parser.add_argument('--models', default=MODELS_DIR)
+    parser.add_argument('--max-mb', type=float, default=MAX_RESIDENT_BYTES / (1 << 20))
+    args = parser.parse_args()
+
+    router = ModelRouter(args.models, int(args.max_mb * (1 << 20)))
+    scenarios = pd.read_csv(args.scenarios)
+    try:
+        scenarios['prediction'] = predict_station_scenarios(router, scenarios)
+    except ModelArtifactError as e:
+        raise SystemExit(f"Cannot load a station model: {e}")
+    scenarios.to_csv(args.output, index=False)
+    print(json.dumps(router.stats(), indent=2))
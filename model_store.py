@@ -0,0 +1,359 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+from scoring import FEATURE_COLUMNS, MODEL_PATH, model_version, split_pipeline
+
+# Artifact layout: one directory holding the pipeline, the flattened trees and a manifest
+MODEL_DIR = 'model'
+MANIFEST_FILE = 'manifest.json'
+PIPELINE_FILE = 'pipeline.joblib'
+ENCODER_FILE = 'encoder.joblib'
+FORMAT_VERSION = 1
+
+# Trees are stored as perfect binary trees of the ensemble's depth, so traversal is pure index arithmetic.
+# Deeper ensembles would blow up the padded layout and are served through sklearn only.
+MAX_FLAT_DEPTH = 10
+TREE_ARRAYS = ['tree_feature', 'tree_threshold', 'tree_leaf_value']
+
+# Batches up to this size are scored from the memory-mapped arrays, larger ones by sklearn's compiled trees
+FLAT_BATCH_LIMIT = 2_048
+
+
+class ModelArtifactError(Exception):
+    pass
+
+
+_ensure_lock = threading.Lock()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Stable hash of the training frame, so a manifest records exactly what the model saw
+def data_hash(X, y=None):
+    digest = hashlib.sha256(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    if y is not None:
+        digest.update(pd.util.hash_pandas_object(pd.Series(y), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+# Pad every tree of a fitted GradientBoostingRegressor into a perfect binary tree of the ensemble depth.
+# Leaves above the last level become pass-through nodes (threshold +inf) whose subtree repeats the leaf value.
+# tree_cover holds the training weight reaching every padded node (internal nodes first, then leaves);
+# the right branch of a pass-through node is never taken and gets 0.
+# Multi-output trees get one leaf value per output, tree_leaf_value then has shape (trees, leaves, outputs).
+def flatten_ensemble(regressor):
+    trees = [estimator[0].tree_ for estimator in regressor.estimators_]
+    depth = max(tree.max_depth for tree in trees)
+    n_internal = 2 ** depth - 1
+    n_outputs = trees[0].n_outputs
+
+    feature = np.zeros((len(trees), n_internal), dtype=np.int32)
+    threshold = np.full((len(trees), n_internal), np.inf)
+    leaf_value = np.zeros((len(trees), 2 ** depth, n_outputs))
+    cover = np.zeros((len(trees), 2 ** (depth + 1) - 1))
+
+    for t, tree in enumerate(trees):
+        # Walk (sklearn node, position in the padded tree, level, reachable) tuples
+        stack = [(0, 0, 0, True)]
+        while stack:
+            node, position, level, reachable = stack.pop()
+            cover[t, position] = tree.weighted_n_node_samples[node] if reachable else 0.0
+            is_leaf = tree.children_left[node] == -1
+            if level == depth:
+                leaf_value[t, position - n_internal] = tree.value[node, :, 0]
+                continue
+            if is_leaf:
+                stack.append((node, 2 * position + 1, level + 1, reachable))
+                stack.append((node, 2 * position + 2, level + 1, False))
+            else:
+                feature[t, position] = tree.feature[node]
+                threshold[t, position] = tree.threshold[node]
+                stack.append((tree.children_left[node], 2 * position + 1, level + 1, reachable))
+                stack.append((tree.children_right[node], 2 * position + 2, level + 1, reachable))
+
+    if n_outputs == 1:
+        leaf_value = leaf_value[..., 0]
+    arrays = {'tree_feature': feature, 'tree_threshold': threshold, 'tree_leaf_value': leaf_value, 'tree_cover': cover}
+    return arrays, depth
+
+
+# Constant the ensemble starts from (the training mean for squared error)
+def init_prediction(regressor):
+    if regressor.init_ == 'zero':
+        return 0.0
+    return float(np.ravel(regressor.init_.predict(np.zeros((1, regressor.n_features_in_))))[0])
+
+
+# Gradient boosting ensemble evaluated from (possibly memory-mapped) padded tree arrays.
+# With multi-output leaves (and an init per output) one traversal predicts every output.
+class FlatEnsemble:
+    def __init__(self, tree_feature, tree_threshold, tree_leaf_value, init, learning_rate):
+        self.tree_feature = tree_feature
+        self.tree_threshold = tree_threshold
+        self.tree_leaf_value = tree_leaf_value
+        self.init = init
+        self.learning_rate = learning_rate
+        self.depth = int(np.log2(tree_leaf_value.shape[1]))
+
+    @property
+    def n_trees(self):
+        return self.tree_feature.shape[0]
+
+    # Leaf position of every (row, tree) pair, rows processed in chunks to bound memory
+    def apply(self, X_encoded, chunk_cells=1 << 21):
+        # sklearn compares float32 features against float64 thresholds, do the same for identical splits
+        X = np.asarray(X_encoded, dtype=np.float32).astype(np.float64)
+        trees = np.arange(self.n_trees)
+        leaves = np.empty((len(X), self.n_trees), dtype=np.int64)
+        step = max(1, chunk_cells // self.n_trees)
+        for start in range(0, len(X), step):
+            x = X[start:start + step]
+            rows = np.arange(len(x))[:, None]
+            node = np.zeros((len(x), self.n_trees), dtype=np.int64)
+            for _ in range(self.depth):
+                feature = self.tree_feature[trees, node]
+                node = 2 * node + 1 + (x[rows, feature] > self.tree_threshold[trees, node])
+            leaves[start:start + step] = node - (2 ** self.depth - 1)
+        return leaves
+
+    def predict(self, X_encoded):
+        # Positions in the raveled (trees, leaves) values; gathering scalars one output at a time is
+        # much faster than gathering rows of outputs
+        positions = self.apply(X_encoded) + np.arange(self.n_trees) * self.tree_leaf_value.shape[1]
+        if self.tree_leaf_value.ndim == 2:
+            return self.init + self.learning_rate * self.tree_leaf_value.ravel()[positions].sum(axis=1)
+        values = np.column_stack([self.tree_leaf_value[..., k].ravel()[positions].sum(axis=1)
+                                  for k in range(self.tree_leaf_value.shape[2])])
+        return self.init + self.learning_rate * values
+
+
+# Final regressor of a serving model: small batches from the mapped arrays, large ones from sklearn
+class HybridRegressor:
+    def __init__(self, flat, pipeline_loader):
+        self.flat = flat
+        self._pipeline_loader = pipeline_loader
+
+    def predict(self, X_encoded):
+        if self.flat is not None and len(X_encoded) <= FLAT_BATCH_LIMIT:
+            return self.flat.predict(X_encoded)
+        _, regressor = split_pipeline(self._pipeline_loader())
+        return regressor.predict(X_encoded)
+
+
+# Pipeline-like serving model: the encoder plus a HybridRegressor.
+# The full sklearn pipeline is only unpickled when a large batch needs it.
+class ServingModel:
+    def __init__(self, directory, manifest, encoder, flat):
+        self.directory = directory
+        self.manifest = manifest
+        self._pipeline = None
+        regressor = HybridRegressor(flat, self.pipeline)
+        self.steps = [('encoder', encoder), ('regressor', regressor)]
+        self.named_steps = dict(self.steps)
+
+    def pipeline(self):
+        if self._pipeline is None:
+            self._pipeline = load_pipeline(self.directory, verify=None)
+        return self._pipeline
+
+    def predict(self, features):
+        encoder, regressor = self.steps[0][1], self.steps[1][1]
+        return regressor.predict(encoder.transform(features[FEATURE_COLUMNS]))
+
+
+# Regression metrics recorded in the manifest
+def regression_metrics(y_true, y_pred):
+    y_true = np.asarray(y_true, dtype=float)
+    residuals = y_true - y_pred
+    mse = float(np.mean(residuals ** 2))
+    return {
+        'MAE': float(np.mean(np.abs(residuals))),
+        'MSE': mse,
+        'RMSE': float(np.sqrt(mse)),
+        'R2': float(1 - np.sum(residuals ** 2) / np.sum((y_true - y_true.mean()) ** 2)),
+    }
+
+
+# Write a model artifact directory: uncompressed pipeline, padded tree arrays and manifest
+def export_model(pipeline, directory=MODEL_DIR, X_train=None, y_train=None, X_test=None, y_test=None, metrics=None):
+    os.makedirs(directory, exist_ok=True)
+    encoder, regressor = split_pipeline(pipeline)
+
+    # Keep only the fitted estimator, not the RandomizedSearchCV wrapper and its CV results
+    serving_pipeline = Pipeline([('encoder', encoder), ('regressor', regressor)])
+    # compress=0 stores numpy arrays raw so joblib can memory-map them
+    joblib.dump(serving_pipeline, os.path.join(directory, PIPELINE_FILE), compress=0)
+    # The encoder alone is tiny, serving loads it without unpickling the trees
+    joblib.dump(encoder, os.path.join(directory, ENCODER_FILE), compress=0)
+
+    files = [PIPELINE_FILE, ENCODER_FILE]
+    ensemble = None
+    # Only classic gradient boosting (estimators_ of single trees) has a flat layout
+    arrays, depth = flatten_ensemble(regressor) if hasattr(regressor, 'estimators_') else (None, None)
+    if arrays is not None and depth <= MAX_FLAT_DEPTH:
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+            files.append(f'{name}.npy')
+        ensemble = {
+            'n_trees': len(regressor.estimators_),
+            'depth': depth,
+            'learning_rate': float(regressor.learning_rate),
+            'init': init_prediction(regressor),
+        }
+
+    metrics = dict(metrics or {})
+    if X_test is not None and y_test is not None:
+        metrics['test'] = regression_metrics(y_test, serving_pipeline.predict(X_test))
+    if X_train is not None and y_train is not None:
+        metrics['train'] = regression_metrics(y_train, serving_pipeline.predict(X_train))
+
+    if hasattr(encoder, 'named_transformers_'):
+        ohe = encoder.named_transformers_['ohe']
+        categorical = list(ohe.feature_names_in_)
+        categories = {name: [c.item() for c in cats] for name, cats in zip(ohe.feature_names_in_, ohe.categories_)}
+    else:
+        # Native categorical engines see the raw category codes
+        is_categorical = getattr(regressor, 'is_categorical_', None)
+        categorical = [name for name, flag in zip(FEATURE_COLUMNS, is_categorical) if flag] if is_categorical is not None else []
+        categories = {name: sorted(X_train[name].unique().tolist()) for name in categorical} if X_train is not None else None
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'model': type(regressor).__name__,
+        'params': {k: v for k, v in regressor.get_params().items() if isinstance(v, (int, float, str, type(None)))},
+        'feature_names': FEATURE_COLUMNS,
+        'categorical_features': categorical,
+        'categories': categories,
+        'encoded_feature_names': [str(name) for name in encoder.get_feature_names_out()],
+        'training_data_hash': data_hash(X_train, y_train) if X_train is not None else None,
+        'training_rows': int(len(X_train)) if X_train is not None else None,
+        'metrics': metrics,
+        'ensemble': ensemble,
+        'files': {name: {'sha256': file_sha256(os.path.join(directory, name)),
+                         'bytes': os.path.getsize(os.path.join(directory, name))} for name in files},
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# Read the manifest and check the listed files: 'size' is cheap, 'hash' re-reads every file
+def read_manifest(directory=MODEL_DIR, verify='size'):
+    path = os.path.join(directory, MANIFEST_FILE)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ModelArtifactError(f"Cannot read model manifest {path}: {e}") from e
+
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ModelArtifactError(f"Unsupported model format version {manifest.get('format_version')}")
+
+    for name, expected in manifest['files'].items():
+        file_path = os.path.join(directory, name)
+        if not os.path.exists(file_path):
+            raise ModelArtifactError(f"Model file {file_path} is missing")
+        if verify and os.path.getsize(file_path) != expected['bytes']:
+            raise ModelArtifactError(f"Model file {file_path} has the wrong size")
+        if verify == 'hash' and file_sha256(file_path) != expected['sha256']:
+            raise ModelArtifactError(f"Model file {file_path} does not match its manifest checksum")
+    return manifest
+
+
+def artifact_version(directory=MODEL_DIR):
+    return read_manifest(directory, verify=None)['files'][PIPELINE_FILE]['sha256'][:16]
+
+
+# Full sklearn pipeline (encoder + fitted regressor), numpy arrays memory-mapped where joblib can
+def load_pipeline(directory=MODEL_DIR, mmap_mode='r', verify='size'):
+    if verify:
+        read_manifest(directory, verify)
+    try:
+        return joblib.load(os.path.join(directory, PIPELINE_FILE), mmap_mode=mmap_mode)
+    except Exception as e:
+        raise ModelArtifactError(f"Cannot load model pipeline from {directory}: {e}") from e
+
+
+# Padded tree arrays opened read-only and memory-mapped, shared between processes through the page cache
+def load_flat_ensemble(directory=MODEL_DIR, mmap_mode='r', manifest=None):
+    manifest = manifest or read_manifest(directory)
+    if manifest['ensemble'] is None:
+        return None
+    arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode) for name in TREE_ARRAYS}
+    return FlatEnsemble(init=manifest['ensemble']['init'], learning_rate=manifest['ensemble']['learning_rate'], **arrays)
+
+
+# Encoder plus memory-mapped trees, the sklearn trees stay on disk until a large batch needs them
+def load_serving_model(directory=MODEL_DIR, verify='size'):
+    manifest = read_manifest(directory, verify)
+    try:
+        encoder = joblib.load(os.path.join(directory, ENCODER_FILE))
+    except Exception as e:
+        raise ModelArtifactError(f"Cannot load model encoder from {directory}: {e}") from e
+    return ServingModel(directory, manifest, encoder, load_flat_ensemble(directory, manifest=manifest))
+
+
+# A fresh checkout has neither artifact: train the default engine on hour.csv and export it to the
+# artifact directory, once per process. The manifest is written last, so a half-written export is never used.
+def ensure_model(directory=MODEL_DIR, fallback_path=MODEL_PATH):
+    with _ensure_lock:
+        if os.path.exists(os.path.join(directory, MANIFEST_FILE)) or os.path.exists(fallback_path):
+            return
+        from training import build_pipeline, load_training_data, split_training_data
+        X, y = load_training_data()
+        X_train, X_test, y_train, y_test = split_training_data(X, y)
+        export_model(build_pipeline().fit(X_train, y_train), directory, X_train, y_train, X_test, y_test)
+
+
+# The model used by the app: the artifact directory when present, otherwise the notebook's gbr_pipeline.pkl.
+# Returns (model, version); raises ModelArtifactError instead of crashing on a missing or corrupt file.
+def load_current_model(directory=MODEL_DIR, fallback_path=MODEL_PATH):
+    ensure_model(directory, fallback_path)
+    if os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+        return load_serving_model(directory), artifact_version(directory)
+    try:
+        return joblib.load(fallback_path), model_version(fallback_path)
+    except Exception as e:
+        raise ModelArtifactError(f"Cannot load model from {fallback_path}: {e}") from e
+
+
+# Full sklearn pipeline of the current model, for tools that refit, prune or inspect the trees
+def current_pipeline(directory=MODEL_DIR, fallback_path=MODEL_PATH):
+    model, _ = load_current_model(directory, fallback_path)
+    return model.pipeline() if isinstance(model, ServingModel) else model
+
+
+def current_model_version(directory=MODEL_DIR, fallback_path=MODEL_PATH):
+    ensure_model(directory, fallback_path)
+    if os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+        return artifact_version(directory)
+    try:
+        return model_version(fallback_path)
+    except OSError as e:
+        raise ModelArtifactError(f"Cannot find model file {fallback_path}: {e}") from e
+
+
+# Package gbr_pipeline.pkl: python model_store.py [gbr_pipeline.pkl] [model]
+if __name__ == '__main__':
+    from training import load_training_data, split_training_data
+
+    source = sys.argv[1] if len(sys.argv) > 1 else MODEL_PATH
+    target = sys.argv[2] if len(sys.argv) > 2 else MODEL_DIR
+    X, y = load_training_data()
+    X_train, X_test, y_train, y_test = split_training_data(X, y)
+    manifest = export_model(joblib.load(source), target, X_train, y_train, X_test, y_test)
+    print(json.dumps({k: manifest[k] for k in ['model', 'ensemble', 'metrics']}, indent=2))
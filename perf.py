@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+import streamlit as st
+
+# Structured per-section timings, one JSON object per log record
+logger = logging.getLogger('bike_app.perf')
+
+# The debug panel is shown with ?debug=1 in the URL or BIKE_APP_DEBUG=1 in the environment
+DEBUG_ENV = 'BIKE_APP_DEBUG'
+# When set, timings are also appended as JSON lines to this file
+LOG_FILE_ENV = 'BIKE_APP_PERF_LOG'
+
+# Used when no Streamlit session exists (scripts, benchmarks)
+_fallback_state = {}
+
+
+def _state():
+    try:
+        return st.session_state
+    except Exception:
+        return _fallback_state
+
+
+def debug_enabled():
+    if os.environ.get(DEBUG_ENV) == '1':
+        return True
+    try:
+        return st.query_params.get('debug') == '1'
+    except Exception:
+        return False
+
+
+# tracemalloc is process-wide: it slows every session and its counts include every session's allocations,
+# so only the environment flag turns it on, never one session's ?debug=1
+def allocation_tracing_enabled():
+    return os.environ.get(DEBUG_ENV) == '1'
+
+
+# Start a new rerun: clear the previous rerun's records
+def start_rerun():
+    state = _state()
+    state['perf_records'] = []
+    state['perf_stack'] = []
+    state['perf_rerun'] = state.get('perf_rerun', 0) + 1
+    if allocation_tracing_enabled() and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+# Time a block: wall time, CPU time and (when tracing) the net change in traced Python allocations
+@contextmanager
+def section(name):
+    state = _state()
+    stack = state.setdefault('perf_stack', [])
+    stack.append(name)
+    path = ' / '.join(stack)
+    tracing = tracemalloc.is_tracing()
+    alloc_start = tracemalloc.get_traced_memory()[0] if tracing else 0
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        record = {
+            'rerun': state.get('perf_rerun', 0),
+            'section': path,
+            'depth': len(stack) - 1,
+            'wall_ms': (time.perf_counter() - wall_start) * 1000,
+            'cpu_ms': (time.process_time() - cpu_start) * 1000,
+            'alloc_kb': (tracemalloc.get_traced_memory()[0] - alloc_start) / 1024 if tracing else None,
+        }
+        stack.pop()
+        state.setdefault('perf_records', []).append(record)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(record))
+
+
+# Decorator form of section, named after the function by default
+def timed(name=None):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with section(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def records():
+    return list(_state().get('perf_records', []))
+
+
+# Send the JSON records to a file when BIKE_APP_PERF_LOG is set
+def configure_logging():
+    path = os.environ.get(LOG_FILE_ENV)
+    if not path or any(getattr(h, 'baseFilename', None) == os.path.abspath(path) for h in logger.handlers):
+        return
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+# Sidebar panel listing this rerun's sections, slowest first
+def perf_panel():
+    if not debug_enabled():
+        return
+    data = records()
+    with st.sidebar.expander("⏱️ Performance (this rerun)", expanded=True):
+        if not data:
+            st.write("No sections were recorded.")
+            return
+        import pandas as pd
+
+        table = pd.DataFrame(data).sort_values('wall_ms', ascending=False)
+        columns = ['section', 'wall_ms', 'cpu_ms']
+        if tracemalloc.is_tracing():
+            columns.append('alloc_kb')
+            st.caption("alloc_kb is process-wide: it includes allocations of other sessions rerunning meanwhile.")
+        else:
+            st.caption(f"Start the app with {DEBUG_ENV}=1 to also trace allocations (process-wide).")
+        st.dataframe(table[columns].round(1), hide_index=True)
+        st.download_button("Download JSON", '\n'.join(json.dumps(r) for r in data),
+                           file_name='perf_records.jsonl', mime='application/json')
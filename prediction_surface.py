@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from scenario_sweep import HOURS, HUMIDITIES, TEMPERATURES, WEATHERSITS
+from scoring import FEATURE_COLUMNS, calculate_features
+
+# Offline grid of model predictions over the simulator's whole input space:
+# yr x mnth x day type x hr x weathersit x temperature x humidity
+SURFACE_DIR = 'surface'
+SURFACE_FILE = 'surface.npy'
+SURFACE_META_FILE = 'surface.json'
+YEARS = np.array([0, 1])
+MONTHS = np.arange(1, 13)
+# Working Monday to Friday, then non-working Sunday and non-working Saturday. A holiday on a weekday
+# uses Saturday's averages (see calculate_features), so it shares the Saturday slice.
+DAY_TYPES = [(1, 1), (2, 1), (3, 1), (4, 1), (5, 1), (0, 0), (6, 0)]
+SUNDAY_DAY_TYPE = 5
+SATURDAY_DAY_TYPE = 6
+# Counts stay below ~1000, where float16 rounds to within 0.5 bikes
+DEFAULT_DTYPE = 'float16'
+# Random off-grid scenarios compared with the live model to measure the error bound
+VALIDATION_SAMPLES = 20_000
+
+
+# Day-type index of every row: weekday 1-5 when working, Sunday or Saturday/holiday otherwise
+def day_type_index(weekday, workingday):
+    weekday = np.asarray(weekday, dtype=int)
+    working = np.asarray(workingday, dtype=int) == 1
+    non_working = np.where(weekday == 0, SUNDAY_DAY_TYPE, SATURDAY_DAY_TYPE)
+    return np.where(working, np.clip(weekday - 1, 0, 4), non_working)
+
+
+# Fractional grid position of values on an evenly spaced axis, as (lower index, weight of the upper point)
+def axis_position(values, axis):
+    step = axis[1] - axis[0]
+    position = np.clip((np.asarray(values, dtype=float) - axis[0]) / step, 0, len(axis) - 1)
+    lower = np.minimum(position.astype(int), len(axis) - 2)
+    return lower, position - lower
+
+
+class PredictionSurface:
+    def __init__(self, grid, meta):
+        self.grid = grid
+        self.meta = meta
+        self.temperatures = np.asarray(meta['axes']['temp_expected_1'], dtype=float)
+        self.humidities = np.asarray(meta['axes']['hum'], dtype=float)
+
+    @property
+    def model_version(self):
+        return self.meta['model_version']
+
+    @property
+    def error_bound(self):
+        return self.meta['error_bound']
+
+    # Table lookup for a frame of scenarios (yr, mnth, weekday, workingday, hr, weathersit,
+    # temp_expected_1, hum), bilinear in temperature and humidity, clamped to the grid edges
+    def predict(self, scenarios):
+        cell = (np.clip(scenarios['yr'].to_numpy(dtype=int), 0, len(YEARS) - 1),
+                scenarios['mnth'].to_numpy(dtype=int) - 1,
+                day_type_index(scenarios['weekday'], scenarios['workingday']),
+                scenarios['hr'].to_numpy(dtype=int),
+                scenarios['weathersit'].to_numpy(dtype=int) - 1)
+        t, ft = axis_position(scenarios['temp_expected_1'], self.temperatures)
+        h, fh = axis_position(scenarios['hum'], self.humidities)
+
+        v00 = self.grid[cell + (t, h)].astype(np.float32)
+        v01 = self.grid[cell + (t, h + 1)].astype(np.float32)
+        v10 = self.grid[cell + (t + 1, h)].astype(np.float32)
+        v11 = self.grid[cell + (t + 1, h + 1)].astype(np.float32)
+        return (v00 * (1 - ft) * (1 - fh) + v01 * (1 - ft) * fh + v10 * ft * (1 - fh) + v11 * ft * fh).astype(float)
+
+    # Same tidy frame as scenario_sweep.sweep, read straight from the grid
+    def sweep(self, mnth, weekday, workingday, yr=1):
+        day_type = int(day_type_index([weekday], [workingday])[0])
+        block = self.grid[min(yr, len(YEARS) - 1), mnth - 1, day_type].astype(float)
+        hr, ws, temp, hum = np.meshgrid(HOURS, WEATHERSITS, self.temperatures, self.humidities, indexing='ij')
+        return pd.DataFrame({
+            'hr': hr.ravel(), 'weathersit': ws.ravel(), 'temp_expected_1': temp.ravel(), 'hum': hum.ravel(),
+            'prediction': block.ravel(),
+        })
+
+
+# Score every grid point with the live model, one (yr, mnth) block per batched predict
+def build_grid(pipeline, workingday_counts, non_workingday_counts, temperatures=TEMPERATURES,
+               humidities=HUMIDITIES, dtype=DEFAULT_DTYPE):
+    shape = (len(YEARS), len(MONTHS), len(DAY_TYPES), len(HOURS), len(WEATHERSITS), len(temperatures), len(humidities))
+    grid = np.empty(shape, dtype=dtype)
+    day, hr, ws, temp, hum = np.meshgrid(np.arange(len(DAY_TYPES)), HOURS, WEATHERSITS, temperatures, humidities,
+                                         indexing='ij')
+    day_types = np.array(DAY_TYPES)
+    for y, yr in enumerate(YEARS):
+        for m, mnth in enumerate(MONTHS):
+            scenarios = pd.DataFrame({
+                'yr': yr, 'mnth': mnth,
+                'weekday': day_types[day.ravel(), 0], 'workingday': day_types[day.ravel(), 1],
+                'hr': hr.ravel(), 'weathersit': ws.ravel(),
+                'temp_expected_1': temp.ravel().astype(float), 'hum': hum.ravel().astype(float),
+            })
+            features = calculate_features(scenarios, workingday_counts, non_workingday_counts)
+            grid[y, m] = np.clip(pipeline.predict(features[FEATURE_COLUMNS]), 0, None).reshape(shape[2:])
+    return grid
+
+
+def random_scenarios(n, rng):
+    day = rng.integers(0, len(DAY_TYPES), n)
+    return pd.DataFrame({
+        'yr': rng.integers(0, 2, n), 'mnth': rng.integers(1, 13, n),
+        'weekday': np.array(DAY_TYPES)[day, 0], 'workingday': np.array(DAY_TYPES)[day, 1],
+        'hr': rng.integers(0, 24, n), 'weathersit': rng.integers(1, 5, n),
+        'temp_expected_1': rng.uniform(TEMPERATURES[0], TEMPERATURES[-1], n),
+        'hum': rng.uniform(HUMIDITIES[0], HUMIDITIES[-1], n),
+    })
+
+
+# Compare lookups with the live model on random off-grid scenarios and on the grid points themselves
+def measure_error(surface, pipeline, workingday_counts, non_workingday_counts, n=VALIDATION_SAMPLES, seed=0):
+    scenarios = random_scenarios(n, np.random.default_rng(seed))
+    features = calculate_features(scenarios, workingday_counts, non_workingday_counts)
+    live = np.clip(pipeline.predict(features[FEATURE_COLUMNS]), 0, None)
+    error = np.abs(surface.predict(scenarios) - live)
+
+    on_grid = scenarios.copy()
+    on_grid['temp_expected_1'] = surface.temperatures[axis_position(scenarios['temp_expected_1'], surface.temperatures)[0]]
+    on_grid['hum'] = surface.humidities[axis_position(scenarios['hum'], surface.humidities)[0]]
+    grid_features = calculate_features(on_grid, workingday_counts, non_workingday_counts)
+    grid_error = np.abs(surface.predict(on_grid) - np.clip(pipeline.predict(grid_features[FEATURE_COLUMNS]), 0, None))
+    return {
+        'samples': n,
+        'max_abs_error': float(error.max()),
+        'p99_abs_error': float(np.percentile(error, 99)),
+        'mean_abs_error': float(error.mean()),
+        # Error at the grid points themselves is only the storage rounding
+        'max_abs_error_on_grid': float(grid_error.max()),
+    }
+
+
+# Build, validate and save the surface for the current model
+def export_surface(pipeline, version, workingday_counts, non_workingday_counts, directory=SURFACE_DIR,
+                   temperatures=TEMPERATURES, humidities=HUMIDITIES, dtype=DEFAULT_DTYPE):
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    grid = build_grid(pipeline, workingday_counts, non_workingday_counts, temperatures, humidities, dtype)
+    meta = {
+        'model_version': version,
+        'dtype': str(grid.dtype),
+        'shape': list(grid.shape),
+        'axes': {
+            'yr': YEARS.tolist(), 'mnth': MONTHS.tolist(), 'day_type': [list(d) for d in DAY_TYPES],
+            'hr': HOURS.tolist(), 'weathersit': WEATHERSITS.tolist(),
+            'temp_expected_1': np.asarray(temperatures).tolist(), 'hum': np.asarray(humidities).tolist(),
+        },
+        'build_seconds': time.perf_counter() - start,
+    }
+    meta['error_bound'] = measure_error(PredictionSurface(grid, meta), pipeline, workingday_counts, non_workingday_counts)
+    np.save(os.path.join(directory, SURFACE_FILE), grid)
+    with open(os.path.join(directory, SURFACE_META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+# Memory-mapped surface, or None when it is missing or was built from another model version
+def load_surface(version=None, directory=SURFACE_DIR):
+    try:
+        with open(os.path.join(directory, SURFACE_META_FILE)) as f:
+            meta = json.load(f)
+        grid = np.load(os.path.join(directory, SURFACE_FILE), mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if version is not None and meta['model_version'] != version:
+        return None
+    return PredictionSurface(grid, meta)
+
+
+# Precompute the surface for the deployed model:
+# python prediction_surface.py [--dtype float16|float32] [--temp-step 2] [--hum-step 5] [--output surface]
+# With the default 2 °C x 5 % grid (24 MB in float16) lookups are exact up to float16 rounding on the grid
+# and within a few bikes on average between grid points; the measured bound is stored in surface.json.
+if __name__ == '__main__':
+    from model_store import load_current_model
+    from scoring import load_hourly_averages
+
+    parser = argparse.ArgumentParser(description='Precompute model predictions over the simulator input space')
+    parser.add_argument('--dtype', choices=['float16', 'float32'], default=DEFAULT_DTYPE)
+    parser.add_argument('--temp-step', type=float, default=float(TEMPERATURES[1] - TEMPERATURES[0]))
+    parser.add_argument('--hum-step', type=float, default=float(HUMIDITIES[1] - HUMIDITIES[0]))
+    parser.add_argument('--output', default=SURFACE_DIR)
+    args = parser.parse_args()
+
+    temperatures = np.arange(TEMPERATURES[0], TEMPERATURES[-1] + args.temp_step / 2, args.temp_step)
+    humidities = np.arange(HUMIDITIES[0], HUMIDITIES[-1] + args.hum_step / 2, args.hum_step)
+    model, version = load_current_model()
+    workingday_counts = load_hourly_averages('workingday_counts_with_weekday.csv')
+    non_workingday_counts = load_hourly_averages('non_workingday_counts_with_weekday.csv')
+    meta = export_surface(model, version, workingday_counts, non_workingday_counts, args.output,
+                          temperatures, humidities, args.dtype)
+    print(json.dumps({k: meta[k] for k in ['model_version', 'dtype', 'shape', 'build_seconds', 'error_bound']}, indent=2))
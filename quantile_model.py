@@ -0,0 +1,60 @@
+import os
+import joblib
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+from scoring import predict_with_quantiles, split_pipeline
+from training import RANDOM_STATE, load_training_data, split_training_data
+
+QUANTILES = (0.1, 0.5, 0.9)
+QUANTILE_MODEL_PATH = 'gbr_quantiles.pkl'
+
+# Quantile models are kept smaller than the tuned point model,
+# so the three of them together cost about one extra prediction
+QUANTILE_PARAMS = {
+    'n_estimators': 200,
+    'learning_rate': 0.1,
+    'max_depth': 4,
+    'min_samples_leaf': 9,
+    'subsample': 0.9,
+}
+
+
+# Fit one quantile GradientBoostingRegressor per quantile on the point pipeline's encoded features
+def train_quantile_models(pipeline, X_train, y_train, quantiles=QUANTILES, params=None):
+    encoder, _ = split_pipeline(pipeline)
+    X_encoded = encoder.transform(X_train)
+    params = {**QUANTILE_PARAMS, **(params or {})}
+
+    models = {}
+    for quantile in quantiles:
+        model = GradientBoostingRegressor(loss='quantile', alpha=quantile, random_state=RANDOM_STATE, **params)
+        models[quantile] = model.fit(X_encoded, y_train)
+    return models
+
+
+def save_quantile_models(models, path=QUANTILE_MODEL_PATH):
+    joblib.dump(models, path)
+
+
+# Returns None when no quantile models have been trained yet
+def load_quantile_models(path=QUANTILE_MODEL_PATH):
+    if not os.path.exists(path):
+        return None
+    return joblib.load(path)
+
+
+if __name__ == '__main__':
+    from model_store import current_pipeline
+
+    # The deployed model (model/ when exported, otherwise gbr_pipeline.pkl), whose encoder serving uses
+    gbr_pipeline = current_pipeline()
+    X, y = load_training_data()
+    X_train, X_test, y_train, y_test = split_training_data(X, y)
+
+    models = train_quantile_models(gbr_pipeline, X_train, y_train)
+    save_quantile_models(models)
+
+    # Empirical coverage on the held-out split
+    _, quantiles = predict_with_quantiles(gbr_pipeline, models, X_test)
+    for i, quantile in enumerate(sorted(models)):
+        print(f"q{quantile:.2f}: {np.mean(y_test.to_numpy() <= quantiles[:, i]):.3f} of test hours at or below")
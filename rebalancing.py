@@ -0,0 +1,217 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import linprog
+from scipy.spatial import cKDTree
+import history_store
+from forecast import constant_weather, forecast_frame, forecast_hours
+from model_router import DEFAULT_MODEL, ModelRouter, station_hourly_averages
+from scoring import calculate_features
+
+# Station table columns: station, lat, lon, capacity (docks), bikes (on hand now) and optionally
+# share (fraction of system departures starting there) and return_share (fraction of arrivals)
+STATION_COLUMNS = ['station', 'lat', 'lon', 'capacity', 'bikes']
+# Rebalancing windows of the day as [start hour, end hour); trucks move bikes at the start of each window
+WINDOWS = [(0, 6), (6, 10), (10, 16), (16, 20), (20, 24)]
+TRUCKS = 4
+TRUCK_CAPACITY = 20
+TRIPS_PER_WINDOW = 3
+# Bikes and free docks kept at every station on top of the forecast swing
+MIN_BIKES = 2
+MIN_DOCKS = 2
+# Every donor is linked to its nearest receivers and every receiver to its nearest donors
+CANDIDATE_NEIGHBOURS = 8
+MAX_DISTANCE_KM = 10.0
+
+
+# Approximate planar coordinates in km, good enough at city scale
+def station_xy(stations):
+    lat = stations['lat'].to_numpy(dtype=float)
+    lon = stations['lon'].to_numpy(dtype=float)
+    return np.column_stack([lon * 111.32 * np.cos(np.radians(lat.mean())), lat * 110.57])
+
+
+def station_shares(stations, column):
+    if column in stations:
+        share = stations[column].to_numpy(dtype=float)
+    elif column == 'return_share' and 'share' in stations:
+        share = stations['share'].to_numpy(dtype=float)
+    else:
+        share = np.ones(len(stations))
+    return share / share.sum()
+
+
+# (stations, 24) hourly departures for the day described by `weather`.
+# Stations sharing a model and hourly-average tables get identical features, so every distinct
+# group is scored once and each model runs one batched predict. Stations scored by the system-wide
+# default model on the system tables get their share of its prediction; stations with a model or a
+# history of their own are forecast at their own level already.
+def forecast_station_demand(router, stations, weather, directory=history_store.STORE_DIR):
+    day = forecast_frame(weather)
+    ids = stations['station'].astype(str).to_numpy()
+    models = np.array([router.resolve(station) for station in ids])
+    with_history = np.isin(ids, list(history_store.read_manifest(directory)['stations']))
+    tables = np.where(with_history, ids, '')
+    group, keys = pd.factorize(pd.Series(models) + '\0' + tables)
+
+    group_demand = np.empty((len(keys), len(day)))
+    key_model = np.array([key.split('\0')[0] for key in keys])
+    for name in np.unique(key_model):
+        members = np.nonzero(key_model == name)[0]
+        features = pd.concat([calculate_features(day, *station_hourly_averages(keys[g].split('\0')[1], directory))
+                              for g in members], ignore_index=True)
+        predictions = np.clip(router.get(name).predict(features), 0, None)
+        group_demand[members] = predictions.reshape(len(members), len(day))
+
+    scale = np.where((models == DEFAULT_MODEL) & ~with_history, station_shares(stations, 'share'), 1.0)
+    return group_demand[group] * scale[:, None]
+
+
+# Hourly net change of bikes at every station: arrivals follow each station's share of returns
+def net_flow(departures, stations):
+    arrivals = departures.sum(axis=0)[None, :] * station_shares(stations, 'return_share')[:, None]
+    return arrivals - departures
+
+
+# Inventory range at the window start that keeps every hour of the window between MIN_BIKES and
+# capacity - MIN_DOCKS. Stations whose swing does not fit aim at the middle of the two bounds.
+def window_targets(flow, capacity, min_bikes=MIN_BIKES, min_docks=MIN_DOCKS):
+    cumulative = np.cumsum(flow, axis=1)
+    low = min_bikes - np.minimum(cumulative.min(axis=1), 0)
+    high = capacity - min_docks - np.maximum(cumulative.max(axis=1), 0)
+    middle = (low + high) / 2
+    low, high = np.where(low > high, middle, low), np.where(low > high, middle, high)
+    return np.ceil(low), np.floor(np.maximum(high, np.ceil(low)))
+
+
+# Transport problem: move bikes from surplus to deficit stations along candidate edges, moving as
+# many bikes as the truck budget allows and, among those plans, the fewest bike-kilometres.
+# The constraint matrix is a network matrix, so the simplex vertex HiGHS returns is integral.
+def allocate(surplus, deficit, xy, budget, neighbours=CANDIDATE_NEIGHBOURS, max_km=MAX_DISTANCE_KM):
+    donors, receivers = np.nonzero(surplus > 0)[0], np.nonzero(deficit > 0)[0]
+    empty = (np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0), np.zeros(0))
+    if len(donors) == 0 or len(receivers) == 0 or budget <= 0:
+        return empty
+
+    k = min(neighbours, len(receivers))
+    distance, nearest = cKDTree(xy[receivers]).query(xy[donors], k=k)
+    edges_from = np.repeat(np.arange(len(donors)), k)
+    edges_to = np.asarray(nearest).reshape(-1)
+    edge_km = np.asarray(distance).reshape(-1)
+    k = min(neighbours, len(donors))
+    distance, nearest = cKDTree(xy[donors]).query(xy[receivers], k=k)
+    edges_from = np.concatenate([edges_from, np.asarray(nearest).reshape(-1)])
+    edges_to = np.concatenate([edges_to, np.repeat(np.arange(len(receivers)), k)])
+    edge_km = np.concatenate([edge_km, np.asarray(distance).reshape(-1)])
+
+    keep = edge_km <= max_km
+    edges, first = np.unique(np.column_stack([edges_from[keep], edges_to[keep]]), axis=0, return_index=True)
+    edge_km = edge_km[keep][first]
+    if len(edges) == 0:
+        return empty
+
+    n = len(edges)
+    columns = np.arange(n)
+    A = sparse.vstack([
+        sparse.csr_matrix((np.ones(n), (edges[:, 0], columns)), shape=(len(donors), n)),
+        sparse.csr_matrix((np.ones(n), (edges[:, 1], columns)), shape=(len(receivers), n)),
+        sparse.csr_matrix(np.ones((1, n))),
+    ], format='csr')
+    b = np.concatenate([surplus[donors], deficit[receivers], [budget]])
+    # Every moved bike earns more than the longest edge costs, so volume comes first
+    result = linprog(edge_km - (max_km + 1), A_ub=A, b_ub=b, bounds=(0, None), method='highs-ds')
+    bikes = np.round(result.x) if result.status == 0 else np.zeros(n)
+    moved = bikes > 0
+    return donors[edges[moved, 0]], receivers[edges[moved, 1]], bikes[moved], edge_km[moved]
+
+
+# Hours at which each station runs empty or full, simulating the flow from an inventory
+def simulate_window(inventory, flow, capacity):
+    empty_hours = np.zeros(len(inventory))
+    full_hours = np.zeros(len(inventory))
+    for hour in range(flow.shape[1]):
+        inventory = np.clip(inventory + flow[:, hour], 0, capacity)
+        empty_hours += inventory <= 0
+        full_hours += inventory >= capacity
+    return inventory, empty_hours, full_hours
+
+
+# Move plan for every window of the day, and a per-window summary with and without the moves
+def plan_day(stations, departures, windows=WINDOWS, trucks=TRUCKS, truck_capacity=TRUCK_CAPACITY,
+             trips_per_window=TRIPS_PER_WINDOW, min_bikes=MIN_BIKES, min_docks=MIN_DOCKS,
+             neighbours=CANDIDATE_NEIGHBOURS, max_km=MAX_DISTANCE_KM):
+    ids = stations['station'].astype(str).to_numpy()
+    capacity = stations['capacity'].to_numpy(dtype=float)
+    inventory = stations['bikes'].to_numpy(dtype=float)
+    baseline = inventory.copy()
+    xy = station_xy(stations)
+    flow = net_flow(departures, stations)
+    budget = trucks * truck_capacity * trips_per_window
+
+    moves, summary = [], []
+    for start, end in windows:
+        window_flow = flow[:, start:end]
+        low, high = window_targets(window_flow, capacity, min_bikes, min_docks)
+        # Forecast inventories are fractional, trucks move whole bikes
+        on_hand = np.round(inventory)
+        surplus = np.maximum(on_hand - high, 0)
+        deficit = np.maximum(low - on_hand, 0)
+        source, target, bikes, km = allocate(surplus, deficit, xy, budget, neighbours, max_km)
+        label = f'{start:02d}:00-{end:02d}:00'
+        moves.append(pd.DataFrame({'window': label, 'from_station': ids[source], 'to_station': ids[target],
+                                   'bikes': bikes.astype(int), 'distance_km': km.round(2)}))
+
+        inventory = inventory - np.bincount(source, bikes, len(ids)) + np.bincount(target, bikes, len(ids))
+        inventory, empty_hours, full_hours = simulate_window(inventory, window_flow, capacity)
+        baseline, base_empty, base_full = simulate_window(baseline, window_flow, capacity)
+        summary.append({
+            'window': label,
+            'surplus_bikes': int(surplus.sum()),
+            'deficit_bikes': int(deficit.sum()),
+            'bikes_moved': int(bikes.sum()),
+            'truck_loads': int(np.ceil(bikes.sum() / truck_capacity)) if len(bikes) else 0,
+            'bike_km': float((bikes * km).sum()),
+            'empty_station_hours': int(empty_hours.sum()),
+            'full_station_hours': int(full_hours.sum()),
+            'empty_station_hours_without_plan': int(base_empty.sum()),
+            'full_station_hours_without_plan': int(base_full.sum()),
+        })
+    return pd.concat(moves, ignore_index=True), pd.DataFrame(summary)
+
+
+# Forecast next-day demand for every station and plan the moves, with timings of both steps
+def rebalance(stations, date, weather=None, router=None, **plan_options):
+    missing = [column for column in STATION_COLUMNS if column not in stations]
+    if missing:
+        raise ValueError(f"Station table is missing the columns {missing}")
+    router = router or ModelRouter()
+    weather = weather if weather is not None else constant_weather(forecast_hours(date, date))
+    start = time.perf_counter()
+    departures = forecast_station_demand(router, stations, weather)
+    forecast_seconds = time.perf_counter() - start
+    moves, summary = plan_day(stations, departures, **plan_options)
+    timings = {'stations': len(stations), 'forecast_seconds': forecast_seconds,
+               'plan_seconds': time.perf_counter() - start - forecast_seconds}
+    return moves, summary, timings
+
+
+# python rebalancing.py stations.csv [--date 2012-06-01] [--trucks 4] [--truck-capacity 20] [--output moves.csv]
+# Weather defaults to a clear 20 °C, 50 % humidity day, as in the Simulation page's multi-day mode.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plan next-day bike rebalancing moves from batched demand forecasts')
+    parser.add_argument('stations')
+    parser.add_argument('--date', default=str((pd.Timestamp.today() + pd.Timedelta(days=1)).date()))
+    parser.add_argument('--trucks', type=int, default=TRUCKS)
+    parser.add_argument('--truck-capacity', type=int, default=TRUCK_CAPACITY)
+    parser.add_argument('--trips-per-window', type=int, default=TRIPS_PER_WINDOW)
+    parser.add_argument('--output', default='moves.csv')
+    args = parser.parse_args()
+
+    stations = pd.read_csv(args.stations, dtype={'station': str})
+    moves, summary, timings = rebalance(stations, args.date, trucks=args.trucks, truck_capacity=args.truck_capacity,
+                                        trips_per_window=args.trips_per_window)
+    moves.to_csv(args.output, index=False)
+    print(summary.to_string(index=False))
+    print(timings)
@@ -0,0 +1,91 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from scoring import FEATURE_COLUMNS, calculate_features
+
+# Default grid: the Simulation page's input ranges
+TEMPERATURES = np.arange(-20, 51, 2)   # °C
+HUMIDITIES = np.arange(0, 101, 5)      # %
+WEATHERSITS = np.array([1, 2, 3, 4])
+HOURS = np.arange(24)
+GRID_AXES = ['hr', 'weathersit', 'temp_expected_1', 'hum']
+
+CACHE_SIZE = 32
+# Shared by every Streamlit session; the lock guards the LRU bookkeeping, not the sweep itself
+_sweep_cache = OrderedDict()
+_sweep_lock = threading.Lock()
+
+
+# Score the full hours x weathersit x temperature x humidity grid for one calendar context.
+# Returns a tidy DataFrame with one row per grid point (C order over GRID_AXES).
+def sweep(pipeline, workingday_counts, non_workingday_counts, mnth, weekday, workingday, yr=1,
+          temperatures=TEMPERATURES, humidities=HUMIDITIES, weathersits=WEATHERSITS, hours=HOURS):
+    hours = np.asarray(hours)
+    # Only the hourly averages depend on the calendar, compute them once per hour
+    calendar = pd.DataFrame({
+        'yr': yr, 'mnth': mnth, 'weekday': weekday, 'workingday': workingday, 'hr': hours,
+        'hum': 0.0, 'temp_expected_1': 0.0, 'weathersit': 1,
+    })
+    per_hour = calculate_features(calendar, workingday_counts, non_workingday_counts)
+
+    hr_idx, ws, temp, hum = np.meshgrid(np.arange(len(hours)), weathersits, temperatures, humidities, indexing='ij')
+    hr_idx = hr_idx.ravel()
+    features = pd.DataFrame({
+        'yr': per_hour['yr'].to_numpy()[hr_idx],
+        'mnth': mnth,
+        'hum': hum.ravel().astype(float),
+        'hourly_avg_workingday': per_hour['hourly_avg_workingday'].to_numpy()[hr_idx],
+        'hourly_avg_nonworkingday': per_hour['hourly_avg_nonworkingday'].to_numpy()[hr_idx],
+        'temp_expected_1': temp.ravel().astype(float),
+        'weathersit': ws.ravel(),
+    })[FEATURE_COLUMNS]
+
+    return pd.DataFrame({
+        'hr': hours[hr_idx],
+        'weathersit': features['weathersit'],
+        'temp_expected_1': features['temp_expected_1'],
+        'hum': features['hum'],
+        'prediction': np.clip(pipeline.predict(features), 0, None),
+    })
+
+
+# Same as sweep, memoized per model version, hourly-average tables and grid definition.
+# Stations routed to one cluster model share its version but not their tables, so the tables are hashed.
+def cached_sweep(pipeline, version, workingday_counts, non_workingday_counts, mnth, weekday, workingday, yr=1,
+                 temperatures=TEMPERATURES, humidities=HUMIDITIES, weathersits=WEATHERSITS, hours=HOURS):
+    tables = hashlib.sha1(np.ascontiguousarray(workingday_counts).tobytes() +
+                          np.ascontiguousarray(non_workingday_counts).tobytes()).hexdigest()
+    key = (version, tables, mnth, weekday, workingday, yr,
+           tuple(temperatures), tuple(humidities), tuple(weathersits), tuple(hours))
+    with _sweep_lock:
+        if key in _sweep_cache:
+            _sweep_cache.move_to_end(key)
+            return _sweep_cache[key]
+
+    result = sweep(pipeline, workingday_counts, non_workingday_counts, mnth, weekday, workingday, yr,
+                   temperatures, humidities, weathersits, hours)
+    with _sweep_lock:
+        _sweep_cache[key] = result
+        _sweep_cache.move_to_end(key)
+        if len(_sweep_cache) > CACHE_SIZE:
+            _sweep_cache.popitem(last=False)
+    return result
+
+
+# Reshape a tidy sweep into a dense array with axes (hr, weathersit, temp_expected_1, hum)
+def to_grid(result):
+    shape = tuple(result[axis].nunique() for axis in GRID_AXES)
+    return result['prediction'].to_numpy().reshape(shape)
+
+
+# Temperature x humidity matrix for one hour and weather situation, ready for a heatmap
+def heatmap_matrix(result, hr, weathersit):
+    subset = result[(result['hr'] == hr) & (result['weathersit'] == weathersit)]
+    return subset.pivot(index='hum', columns='temp_expected_1', values='prediction')
+
+
+# Partial dependence of the prediction on one grid axis, averaged over the others, per hour
+def partial_dependence(result, feature):
+    return result.groupby(['hr', feature])['prediction'].mean().unstack(feature)
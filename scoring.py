@@ -0,0 +1,157 @@
+import hashlib
+import os
+import sys
+import numpy as np
+import pandas as pd
+import history_store
+
+MODEL_PATH = 'gbr_pipeline.pkl'
+
+# Columns (and order) expected by gbr_pipeline
+FEATURE_COLUMNS = ['yr', 'mnth', 'hum', 'hourly_avg_workingday', 'hourly_avg_nonworkingday', 'temp_expected_1', 'weathersit']
+
+_version_cache = {}
+
+
+# Content hash of a model file, recomputed only when its size or modification time changes
+def model_version(path=MODEL_PATH):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _version_cache:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _version_cache[key] = digest.hexdigest()[:16]
+    return _version_cache[key]
+
+
+# Load an hourly average CSV into a dense lookup array indexed [mnth, weekday, hr]
+def load_hourly_averages(path):
+    counts = pd.read_csv(path)
+    table = np.zeros((13, 7, 24))
+    table[counts['mnth'], counts['weekday'], counts['hr']] = counts['cnt']
+    return table
+
+
+# Working-day and non-working-day lookup arrays [mnth, weekday, hr] averaged over the history store,
+# for a set of stations and dates. Partitions are aggregated one at a time, so any span of history fits.
+def store_hourly_averages(stations=None, start=None, end=None, directory=history_store.STORE_DIR):
+    sums = np.zeros(2 * 13 * 7 * 24)
+    counts = np.zeros(2 * 13 * 7 * 24)
+    for frame in history_store.scan(['workingday', 'mnth', 'weekday', 'hr', 'cnt'], start, end, stations,
+                                    directory=directory):
+        cell = np.ravel_multi_index((frame['workingday'], frame['mnth'], frame['weekday'], frame['hr']), (2, 13, 7, 24))
+        sums += np.bincount(cell, weights=frame['cnt'], minlength=len(sums))
+        counts += np.bincount(cell, minlength=len(counts))
+    averages = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0).reshape(2, 13, 7, 24)
+    return averages[1], averages[0]
+
+
+# Function to calculate the features, vectorized over all rows of df
+def calculate_features(df, workingday_counts, non_workingday_counts):
+    mnth = df['mnth'].to_numpy(dtype=int)
+    weekday = df['weekday'].to_numpy(dtype=int)
+    hr = df['hr'].to_numpy(dtype=int)
+    workingday = df['workingday'].to_numpy(dtype=int)
+
+    # Non-working weekdays (holidays on weekdays 1 to 5) use Saturday's (weekday == 6) averages
+    nonworking_weekday = np.where((weekday >= 1) & (weekday <= 5), 6, weekday)
+
+    features = pd.DataFrame({
+        'yr': df['yr'].map({0: 0, 1: 1, 2: 2}).to_numpy(),
+        'mnth': mnth,
+        'hum': df['hum'].to_numpy(),
+        'hourly_avg_workingday': np.where(workingday == 1, workingday_counts[mnth, weekday, hr], 0),
+        'hourly_avg_nonworkingday': np.where(workingday == 0, non_workingday_counts[mnth, nonworking_weekday, hr], 0),
+        'temp_expected_1': df['temp_expected_1'].to_numpy(),
+        'weathersit': df['weathersit'].to_numpy(),
+    }, index=df.index)
+    return features[FEATURE_COLUMNS]
+
+
+# Score a frame of scenarios in one batched predict, clipped to non-negative counts.
+# A drift monitor, when given, sees the features and predictions of every batch.
+def predict_counts(pipeline, scenarios, workingday_counts, non_workingday_counts, monitor=None):
+    features = calculate_features(scenarios, workingday_counts, non_workingday_counts)
+    predictions = np.clip(pipeline.predict(features), 0, None)
+    if monitor is not None:
+        monitor.observe(features, predictions)
+    return predictions
+
+
+# Return the fitted encoder and the final regressor of a saved pipeline
+def split_pipeline(pipeline):
+    encoder = pipeline.named_steps['encoder']
+    regressor = pipeline.steps[-1][1]
+    # The notebook pipeline ends with the RandomizedSearchCV object
+    regressor = getattr(regressor, 'best_estimator_', regressor)
+    return encoder, regressor
+
+
+# Point prediction and every quantile from one shared encoded feature matrix.
+# Returns (point, quantiles) where quantiles has one column per quantile, sorted to avoid crossing.
+def predict_with_quantiles(pipeline, quantile_models, features):
+    encoder, regressor = split_pipeline(pipeline)
+    X_encoded = encoder.transform(features)
+
+    point = np.clip(regressor.predict(X_encoded), 0, None)
+    quantiles = np.column_stack([quantile_models[q].predict(X_encoded) for q in sorted(quantile_models)])
+    quantiles = np.clip(np.sort(quantiles, axis=1), 0, None)
+    return point, quantiles
+
+
+# Casual, registered and total riders from a joint_model.JointBoostingRegressor on the pipeline's encoded
+# features: one encoding and one traversal for both targets, and the total is their sum
+def predict_riders(pipeline, joint_model, features):
+    encoder, _ = split_pipeline(pipeline)
+    riders = np.clip(joint_model.predict(encoder.transform(features)), 0, None)
+    return pd.DataFrame({'casual': riders[:, 0], 'registered': riders[:, 1], 'total': riders.sum(axis=1)},
+                        index=features.index)
+
+
+# Score scenarios with prediction intervals, one column per quantile model
+def predict_intervals(pipeline, quantile_models, scenarios, workingday_counts, non_workingday_counts, monitor=None):
+    features = calculate_features(scenarios, workingday_counts, non_workingday_counts)
+    point, quantiles = predict_with_quantiles(pipeline, quantile_models, features)
+    if monitor is not None:
+        monitor.observe(features, point)
+    result = pd.DataFrame({'prediction': point}, index=scenarios.index)
+    for i, quantile in enumerate(sorted(quantile_models)):
+        result[f'q{int(round(quantile * 100))}'] = quantiles[:, i]
+    return result
+
+
+# Batch scoring: python scoring.py scenarios.csv predictions.csv [station]
+# With a station the hourly averages come from that station's history in the store instead of the CSVs.
+# With a joint model (python joint_model.py) casual, registered and total columns are added.
+# Scenario columns: yr, mnth, weekday, hr, workingday, hum, temp_expected_1, weathersit
+if __name__ == '__main__':
+    from joint_model import load_joint_model
+    from model_router import station_hourly_averages
+    from model_store import ModelArtifactError, current_pipeline
+    from quantile_model import load_quantile_models
+
+    scenarios = pd.read_csv(sys.argv[1])
+    # The deployed model (model/ when exported, otherwise gbr_pipeline.pkl), as in the app
+    try:
+        gbr_pipeline = current_pipeline()
+    except ModelArtifactError as e:
+        raise SystemExit(f"Cannot load the model: {e}")
+    if len(sys.argv) > 3:
+        history_store.ensure_store()
+        workingday_counts, non_workingday_counts = station_hourly_averages(sys.argv[3])
+    else:
+        workingday_counts = load_hourly_averages('workingday_counts_with_weekday.csv')
+        non_workingday_counts = load_hourly_averages('non_workingday_counts_with_weekday.csv')
+
+    quantile_models = load_quantile_models()
+    if quantile_models is None:
+        scenarios['prediction'] = predict_counts(gbr_pipeline, scenarios, workingday_counts, non_workingday_counts)
+    else:
+        scenarios = scenarios.join(predict_intervals(gbr_pipeline, quantile_models, scenarios, workingday_counts, non_workingday_counts))
+    joint_model = load_joint_model(gbr_pipeline)
+    if joint_model is not None:
+        features = calculate_features(scenarios, workingday_counts, non_workingday_counts)
+        scenarios = scenarios.join(predict_riders(gbr_pipeline, joint_model, features))
+    scenarios.to_csv(sys.argv[2], index=False)
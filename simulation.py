@@ -1,37 +1,111 @@
 import streamlit as st
+from perf import section
 import pandas as pd
-import joblib
 import plotly.express as px
+import plotly.graph_objects as go
+from app_resources import get_drift_monitor, get_router
+from attribution import feature_contributions, load_attribution
+from forecast import constant_weather, daily_summary, forecast_hours, multi_day_forecast
+from joint_model import JOINT_TARGETS, load_joint_model
+from quantile_model import load_quantile_models
+from scenario_sweep import cached_sweep, heatmap_matrix, partial_dependence
+from model_router import DEFAULT_MODEL, station_hourly_averages, uses_system_tables
+from model_store import ModelArtifactError
+from prediction_surface import load_surface
+from scoring import calculate_features, predict_counts, predict_intervals, predict_riders
+from uncertainty import percentile_bands, simulate_predictions
+
+WEEKDAY_NAMES = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+WEATHER_NAMES = ['Clear', 'Cloudy', 'Light Rain/Snow', 'Heavy Rain/Snow']
+FEATURE_LABELS = {
+    'baseline': 'Average prediction',
+    'yr': 'Year',
+    'mnth': 'Month',
+    'hum': 'Humidity',
+    'hourly_avg_workingday': 'Working-day hourly average',
+    'hourly_avg_nonworkingday': 'Non-working-day hourly average',
+    'temp_expected_1': 'Temperature',
+    'weathersit': 'Weather',
+}
+
+
+# Lookup tables, quantile models and prediction surface of a station's model, loaded on first use.
+# Cached per model version, so a retrained model is picked up without a restart. The model itself
+# stays in the router's bounded LRU rather than in this cache.
+@st.cache_resource(max_entries=16)
+def load_artifacts(version, station):
+    workingday_counts, non_workingday_counts = station_hourly_averages(station)
+    # Quantile models and the surface are built for the default model on the shared tables only;
+    # other stations are scored live by their own model and lookup tables
+    shared = uses_system_tables(get_router(), station)
+    quantile_models = load_quantile_models() if shared else None
+    # Precomputed predictions for the whole input space, ignored when built from another model version
+    surface = load_surface(version) if shared else None
+    return workingday_counts, non_workingday_counts, quantile_models, surface
+
+
+# Shapley tables for the tree ensemble, built on first use per model version (None for engines without them)
+@st.cache_resource(max_entries=16)
+def load_attribution_model(version, station):
+    return load_attribution(get_router().model(station))
+
+
+# Joint casual/registered model, trained on the default model's features (None when not trained for them)
+@st.cache_resource(max_entries=16)
+def load_rider_model(version, station):
+    if not uses_system_tables(get_router(), station):
+        return None
+    return load_joint_model(get_router().model(station))
+
+
+# Only the default model's predictions on the shared tables are comparable with its hour.csv training baseline.
+# Every distinct input is observed once per session: reruns from unrelated widgets return None for an input
+# the monitor has already seen, so they do not count the same rows again.
+def live_drift_monitor(version, station, inputs, key):
+    if not uses_system_tables(get_router(), station):
+        return None
+    digest = (version, station, int(pd.util.hash_pandas_object(inputs, index=False).sum()))
+    if st.session_state.get(key) == digest:
+        return None
+    st.session_state[key] = digest
+    with section("Load drift baseline"):
+        return get_drift_monitor(version)
+
+
+# A missing or corrupted model stops the page with an error instead of crashing the app
+def get_artifacts():
+    router = get_router()
+    station = st.session_state.get('station', DEFAULT_MODEL)
+    try:
+        with section("Load model artifacts"):
+            name = router.resolve(station)
+            version = router.version(name)
+            return (version, router.get(name), *load_artifacts(version, station))
+    except ModelArtifactError as e:
+        st.error(f"The prediction model could not be loaded: {e}")
+        st.stop()
 
-gbr_pipeline = joblib.load('gbr_pipeline.pkl')
-workingday_counts = pd.read_csv('workingday_counts_with_weekday.csv')
-non_workingday_counts = pd.read_csv('non_workingday_counts_with_weekday.csv')
-
-workingday_counts_dict = workingday_counts.set_index(['mnth', 'weekday', 'hr'])['cnt'].to_dict()
-non_workingday_counts_dict = non_workingday_counts.set_index(['mnth', 'weekday', 'hr'])['cnt'].to_dict()
-
-def calculate_features(df, workingday_counts, non_workingday_counts):
-    df['yr'] = df['yr'].map({0: 0, 1: 1, 2: 2})
-    
-    def map_hourly_avg(row):
-        if row['workingday'] == 0 and row['weekday'] in [1, 2, 3, 4, 5]:
-            return non_workingday_counts.get((row['mnth'], 6, row['hr']), 0)
-        elif row['workingday'] == 1:
-            return workingday_counts.get((row['mnth'], row['weekday'], row['hr']), 0)
-        else:
-            return non_workingday_counts.get((row['mnth'], row['weekday'], row['hr']), 0)
-    
-    df['hourly_avg_workingday'] = df.apply(lambda row: map_hourly_avg(row) if row['workingday'] == 1 else 0, axis=1)
-    df['hourly_avg_nonworkingday'] = df.apply(lambda row: map_hourly_avg(row) if row['workingday'] == 0 else 0, axis=1)
-    return df[['yr', 'mnth', 'hum', 'hourly_avg_workingday', 'hourly_avg_nonworkingday', 'temp_expected_1', 'weathersit']]
 
 def bike_usage_simulation():
+    # Stations with models of their own are listed once the models/ directory has any
+    stations = get_router().stations()
+    if len(stations) > 1:
+        st.sidebar.selectbox('Station', stations, key='station',
+                             format_func=lambda s: 'All stations (system model)' if s == DEFAULT_MODEL else s)
+    station = st.session_state.get('station', DEFAULT_MODEL)
+    version, gbr_pipeline, workingday_counts, non_workingday_counts, quantile_models, surface = get_artifacts()
+
     st.title('🚴‍♂️ Bike Usage Prediction')
 
     st.markdown("""
     <hr style="border:1px solid #d4d4d4; margin: 20px 0;">
     """, unsafe_allow_html=True)
 
+    mode = st.radio('Forecast mode', ['Single day', 'Multi-day'], horizontal=True)
+    if mode == 'Multi-day':
+        multi_day_simulation()
+        return
+
     st.header('Input Parameters')
     st.markdown("Please fill in the input parameters below to predict bike usage.")
 
@@ -39,13 +113,13 @@ def bike_usage_simulation():
 
     with col1:
         temp_expected_1 = st.number_input('Temperature (°C)', min_value=-20, max_value=50, value=20)
-        weekday = st.selectbox('Weekday (0: Sunday, 6: Saturday)', options=[i for i in range(7)], format_func=lambda x: ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'][x])
+        weekday = st.selectbox('Weekday (0: Sunday, 6: Saturday)', options=[i for i in range(7)], format_func=lambda x: WEEKDAY_NAMES[x])
         hum = st.number_input('Humidity (%)', min_value=0, max_value=100, value=50)
 
     with col2:
         mnth = st.selectbox('Month', options=[1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12], format_func=lambda x: ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December'][x - 1])
         hr = st.selectbox('Hour of the Day', options=[i for i in range(24)], format_func=lambda x: f"{x}:00")
-        weathersit = st.selectbox('Weather Situation', options=[1, 2, 3, 4], format_func=lambda x: ['Clear', 'Cloudy', 'Light Rain/Snow', 'Heavy Rain/Snow'][x - 1])
+        weathersit = st.selectbox('Weather Situation', options=[1, 2, 3, 4], format_func=lambda x: WEATHER_NAMES[x - 1])
 
     with col3:
         workingday_options = [0, 1]
@@ -55,25 +129,26 @@ def bike_usage_simulation():
 
     year = 1
 
-    base_input_data = pd.DataFrame({
-        'temp_expected_1': [temp_expected_1],
-        'mnth': [mnth],
-        'workingday': [workingday],
-        'hum': [hum],
-        'weathersit': [weathersit],
-        'yr': [year],
-        'weekday': [weekday],
+    # One row per hour of the day, scored in a single batched predict
+    input_data = pd.DataFrame({
+        'temp_expected_1': temp_expected_1,
+        'mnth': mnth,
+        'workingday': workingday,
+        'hum': hum,
+        'weathersit': weathersit,
+        'yr': year,
+        'weekday': weekday,
+        'hr': range(24),
     })
-
-    hourly_predictions = []
-    for hour in range(24):
-        input_data = base_input_data.copy()
-        input_data['hr'] = hour
-        input_data = calculate_features(input_data, workingday_counts_dict, non_workingday_counts_dict)
-        input_data.columns = input_data.columns.str.lower()
-        prediction = gbr_pipeline.predict(input_data)[0]
-        clipped_prediction = max(0, prediction)
-        hourly_predictions.append(clipped_prediction)
+    # With quantile models available the point estimate and the interval come from one fused pass
+    monitor = live_drift_monitor(version, station, input_data, 'drift_observed_day')
+    intervals = None
+    with section("Predict 24 hours"):
+        if quantile_models is not None:
+            intervals = predict_intervals(gbr_pipeline, quantile_models, input_data, workingday_counts, non_workingday_counts, monitor)
+            hourly_predictions = list(intervals['prediction'])
+        else:
+            hourly_predictions = list(predict_counts(gbr_pipeline, input_data, workingday_counts, non_workingday_counts, monitor))
 
     selected_hour_prediction = int(round(hourly_predictions[hr]))
     min_prediction = int(round(min(hourly_predictions)))
@@ -85,6 +160,9 @@ def bike_usage_simulation():
 
     st.subheader('🔍 Prediction for Selected Hour')
     st.write(f"*Predicted bike usage for {hr}:00 is {selected_hour_prediction} bikes.*")
+    if intervals is not None:
+        low, high = intervals.iloc[hr, 1], intervals.iloc[hr, -1]
+        st.write(f"*Prediction interval: {int(round(low))} to {int(round(high))} bikes.*")
 
     st.subheader('📊 Daily Prediction Summary')
     st.write(f"- *Minimum predicted bike usage for the day*: {min_prediction} bikes.")
@@ -99,6 +177,13 @@ def bike_usage_simulation():
 
     hourly_df['Color'] = ['Selected Hour' if h == hr else 'Other Hours' for h in hourly_df['Hour']]
 
+    # Error bars span the lowest to the highest quantile model
+    error_columns = {}
+    if intervals is not None:
+        hourly_df['Upper'] = intervals.iloc[:, -1].to_numpy() - intervals['prediction'].to_numpy()
+        hourly_df['Lower'] = intervals['prediction'].to_numpy() - intervals.iloc[:, 1].to_numpy()
+        error_columns = {'error_y': hourly_df['Upper'].clip(lower=0), 'error_y_minus': hourly_df['Lower'].clip(lower=0)}
+
     fig = px.bar(
         hourly_df,
         x='Hour',
@@ -106,13 +191,187 @@ def bike_usage_simulation():
         color='Color',
         color_discrete_map={'Selected Hour': 'red', 'Other Hours': 'blue'},
         title='Hourly Predictions',
-        labels={'Hour': 'Hour of the Day', 'Predicted Count': 'Number of Bikes'}
+        labels={'Hour': 'Hour of the Day', 'Predicted Count': 'Number of Bikes'},
+        **error_columns
     )
 
     st.plotly_chart(fig)
 
+    # Casual and registered riders of every hour from one multi-output model, stacked to their total
+    with st.expander("👥 Casual and Registered Riders"), section("👥 Casual and Registered Riders"):
+        st.write("One model predicts casual and registered riders together in a single pass; their sum is the total.")
+        show_riders = st.checkbox('Split casual and registered riders')
+        rider_model = load_rider_model(version, station) if show_riders else None
+        if rider_model is not None:
+            features = calculate_features(input_data, workingday_counts, non_workingday_counts)
+            riders = predict_riders(gbr_pipeline, rider_model, features)
+            tidy = riders[JOINT_TARGETS].rename(columns=str.capitalize).rename_axis('Hour').reset_index() \
+                .melt(id_vars='Hour', var_name='Riders', value_name='Bikes')
+            rider_fig = px.bar(
+                tidy,
+                x='Hour',
+                y='Bikes',
+                color='Riders',
+                title='Casual and Registered Riders per Hour',
+                labels={'Hour': 'Hour of the Day', 'Bikes': 'Number of Bikes'}
+            )
+            st.plotly_chart(rider_fig)
+
+            selected = riders.iloc[hr]
+            st.write(f"*At {hr}:00 the model expects {int(round(selected['casual']))} casual and {int(round(selected['registered']))} registered riders, "
+                     f"{int(round(selected['total']))} in total ({selected['casual'] / max(selected['total'], 1):.0%} casual).*")
+        elif show_riders:
+            st.write("No casual/registered model is trained for this model's features yet (run python joint_model.py).")
+
+    # Per-feature contributions of every hourly prediction, stacked on top of the model's average prediction
+    with st.expander("🧩 What Drives Each Hourly Prediction"), section("🧩 What Drives Each Hourly Prediction"):
+        st.write("Each bar splits the hourly prediction into the model's average prediction plus the contribution of every input (TreeSHAP).")
+        show_contributions = st.checkbox('Show feature contributions')
+        attribution = load_attribution_model(version, station) if show_contributions else None
+        if attribution is not None:
+            features = calculate_features(input_data, workingday_counts, non_workingday_counts)
+            contributions = feature_contributions(gbr_pipeline, attribution, features)
+            contributions.index = range(24)
+            tidy = contributions.rename(columns=FEATURE_LABELS).rename_axis('Hour').reset_index() \
+                .melt(id_vars='Hour', var_name='Feature', value_name='Contribution')
+            contribution_fig = px.bar(
+                tidy,
+                x='Hour',
+                y='Contribution',
+                color='Feature',
+                title='Feature Contributions per Hour',
+                labels={'Hour': 'Hour of the Day', 'Contribution': 'Number of Bikes'}
+            )
+            contribution_fig.update_layout(barmode='relative')
+            contribution_fig.add_trace(go.Scatter(x=list(range(24)), y=contributions.sum(axis=1), mode='markers',
+                                                  marker={'color': 'black', 'symbol': 'diamond'}, name='Prediction'))
+            st.plotly_chart(contribution_fig)
+
+            selected = contributions.loc[hr].drop('baseline').rename(FEATURE_LABELS)
+            top = selected.abs().idxmax()
+            st.write(f"*At {hr}:00 the largest driver is {top.lower()}, which moves the prediction by {selected[top]:+.0f} bikes from the average of {attribution.expected_value:.0f}.*")
+        elif show_contributions:
+            st.write("Feature contributions are only available for gradient boosting models.")
+
+    # Monte Carlo bands from perturbed temperature, humidity and weather transitions
+    with st.expander("🎲 Uncertainty Bands"), section("🎲 Uncertainty Bands"):
+        st.write("Thousands of perturbed weather scenarios are scored in one batch to show the likely range of bike usage for each hour.")
+        n_samples = st.select_slider('Number of scenarios', options=[1000, 5000, 10000, 20000], value=10000)
+        if st.checkbox('Show uncertainty bands'):
+            samples = simulate_predictions(gbr_pipeline, input_data, workingday_counts, non_workingday_counts, n_samples=n_samples, seed=0, surface=surface)
+            if surface is not None:
+                st.caption(f"Scenarios are read from the precomputed prediction surface (mean error {surface.error_bound['mean_abs_error']:.1f} bikes, "
+                           f"99% of lookups within {surface.error_bound['p99_abs_error']:.0f} bikes of the live model).")
+            bands = percentile_bands(samples)
+            hours = list(range(24))
 
+            band_fig = go.Figure()
+            band_fig.add_trace(go.Scatter(x=hours, y=bands['p95'], line={'width': 0}, showlegend=False, hoverinfo='skip'))
+            band_fig.add_trace(go.Scatter(x=hours, y=bands['p5'], fill='tonexty', fillcolor='rgba(0, 0, 255, 0.15)', line={'width': 0}, name='5th-95th percentile'))
+            band_fig.add_trace(go.Scatter(x=hours, y=bands['p75'], line={'width': 0}, showlegend=False, hoverinfo='skip'))
+            band_fig.add_trace(go.Scatter(x=hours, y=bands['p25'], fill='tonexty', fillcolor='rgba(0, 0, 255, 0.3)', line={'width': 0}, name='25th-75th percentile'))
+            band_fig.add_trace(go.Scatter(x=hours, y=bands['p50'], line={'color': 'blue'}, name='Median'))
+            band_fig.add_trace(go.Scatter(x=hours, y=hourly_predictions, mode='markers', marker={'color': 'red'}, name='Point Estimate'))
+            band_fig.update_layout(title='Hourly Prediction Ranges', xaxis_title='Hour of the Day', yaxis_title='Number of Bikes')
+            st.plotly_chart(band_fig)
 
+            st.write(f"*For {hr}:00, 90% of scenarios fall between {int(round(bands['p5'][hr]))} and {int(round(bands['p95'][hr]))} bikes.*")
 
+    # Full temperature x humidity x weather grid for the selected day, scored once per model version
+    with st.expander("🌡️ Sensitivity to Temperature, Humidity and Weather"), section("🌡️ Sensitivity to Temperature, Humidity and Weather"):
+        st.write("The whole grid of temperatures, humidities and weather situations is scored in one batch for the selected month and day type.")
+        if st.checkbox('Show sensitivity analysis'):
+            # The default sweep grid is the surface's own grid, so it can be read without scoring
+            if surface is not None:
+                grid = surface.sweep(mnth, weekday, workingday, year)
+            else:
+                grid = cached_sweep(gbr_pipeline, version, workingday_counts, non_workingday_counts, mnth, weekday, workingday, year)
 
+            heatmap = heatmap_matrix(grid, hr, weathersit)
+            heat_fig = px.imshow(
+                heatmap,
+                origin='lower',
+                aspect='auto',
+                color_continuous_scale='Viridis',
+                title=f'Predicted Bikes at {hr}:00 ({WEATHER_NAMES[weathersit - 1]})',
+                labels={'x': 'Temperature (°C)', 'y': 'Humidity (%)', 'color': 'Bikes'}
+            )
+            st.plotly_chart(heat_fig)
 
+            # Partial dependence on temperature for the selected hour, one curve per weather situation
+            curves = grid[grid['hr'] == hr].groupby(['weathersit', 'temp_expected_1'])['prediction'].mean().reset_index()
+            curves['Weather'] = curves['weathersit'].map(lambda x: WEATHER_NAMES[x - 1])
+            pd_fig = px.line(
+                curves,
+                x='temp_expected_1',
+                y='prediction',
+                color='Weather',
+                title=f'Temperature Effect at {hr}:00 (averaged over humidity)',
+                labels={'temp_expected_1': 'Temperature (°C)', 'prediction': 'Number of Bikes'}
+            )
+            st.plotly_chart(pd_fig)
+
+            humidity_effect = partial_dependence(grid, 'hum').loc[hr]
+            st.write(f"*At {hr}:00, moving from 0% to 100% humidity changes the average prediction from {int(round(humidity_effect.iloc[0]))} to {int(round(humidity_effect.iloc[-1]))} bikes.*")
+
+
+def multi_day_simulation():
+    version, gbr_pipeline, workingday_counts, non_workingday_counts, _, _ = get_artifacts()
+
+    st.header('Forecast Range')
+    st.markdown("Pick a date range and adjust the hourly weather series to forecast bike usage for several days at once.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input('Start date', value=pd.Timestamp.today().date())
+        days = st.number_input('Number of days', min_value=1, max_value=14, value=7)
+    with col2:
+        temp_expected_1 = st.number_input('Default temperature (°C)', min_value=-20, max_value=50, value=20)
+        hum = st.number_input('Default humidity (%)', min_value=0, max_value=100, value=50)
+        weathersit = st.selectbox('Default weather situation', options=[1, 2, 3, 4], format_func=lambda x: WEATHER_NAMES[x - 1])
+
+    timestamps = forecast_hours(start_date, pd.Timestamp(start_date) + pd.Timedelta(days=days - 1))
+    weather = constant_weather(timestamps, temp_expected_1, hum, weathersit)
+
+    with st.expander("🌦️ Hourly weather series"), section("🌦️ Hourly weather series"):
+        st.write("Edit individual hours to model weather changes during the forecast range.")
+        weather = st.data_editor(
+            weather,
+            hide_index=True,
+            disabled=['timestamp'],
+            column_config={
+                'temp_expected_1': st.column_config.NumberColumn('Temperature (°C)', min_value=-20, max_value=50),
+                'hum': st.column_config.NumberColumn('Humidity (%)', min_value=0, max_value=100),
+                'weathersit': st.column_config.SelectboxColumn('Weather Situation', options=[1, 2, 3, 4]),
+            },
+        )
+
+    # Calendar fields come from the real dates and all hours are scored in one pass
+    with section("Predict multi-day forecast"):
+        monitor = live_drift_monitor(version, st.session_state.get('station', DEFAULT_MODEL), weather, 'drift_observed_forecast')
+        forecast = multi_day_forecast(gbr_pipeline, weather, workingday_counts, non_workingday_counts, monitor=monitor)
+
+    st.markdown("""
+    <hr style="border:1px solid #d4d4d4; margin: 20px 0;">
+    """, unsafe_allow_html=True)
+
+    st.subheader('📅 Daily Forecast Summary')
+    summary = daily_summary(forecast)
+    summary['weekday'] = summary['weekday'].map(lambda x: WEEKDAY_NAMES[x])
+    st.dataframe(summary)
+
+    st.subheader('📈 Hourly Forecast Timeline')
+    forecast['Day Type'] = forecast['workingday'].map({1: 'Working Day', 0: 'Non-Working Day'})
+    fig = px.line(
+        forecast,
+        x='timestamp',
+        y='prediction',
+        title='Hourly Predictions',
+        labels={'timestamp': 'Date and Hour', 'prediction': 'Number of Bikes'}
+    )
+    fig.add_scatter(
+        x=forecast['timestamp'], y=forecast['prediction'], mode='markers',
+        marker={'color': forecast['workingday'].map({1: 'blue', 0: 'orange'})},
+        text=forecast['Day Type'], name='Day Type', showlegend=False
+    )
+    st.plotly_chart(fig)
@@ -0,0 +1,79 @@
+import subprocess
+import sys
+from app import PAGES
+
+# Number of heaviest transitive imports listed per page
+TOP_IMPORTS = 5
+
+FIRST_RENDER_SCRIPT = '''
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_string({script!r}, default_timeout=300).run()
+assert not at.exception, at.exception
+print(time.perf_counter() - start)
+'''
+
+# Renders the first page after importing every page module up front, like app.py used to
+EAGER_APP = '''
+import importlib
+from app import PAGES
+for module_name, _ in PAGES.values():
+    importlib.import_module(module_name)
+from team_intro import introduction_page
+introduction_page()
+'''
+
+LAZY_APP = '''
+from app import main
+main()
+'''
+
+
+# Run `python -X importtime` in a fresh interpreter and return {module: (self_us, cumulative_us, depth)}
+def import_times(statement):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.setdefault(name.strip(), (int(self_us), int(cumulative_us), depth))
+    return times
+
+
+# Seconds from a fresh interpreter to the first rendered page
+def first_render_seconds(script):
+    result = subprocess.run([sys.executable, '-c', FIRST_RENDER_SCRIPT.format(script=script)],
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    # Streamlit is always needed, so page costs are measured on top of it
+    base = import_times('import streamlit')
+    print(f"{'module':<20}{'import (ms)':>14}  heaviest new imports")
+    print(f"{'streamlit':<20}{base['streamlit'][1] / 1000:>14.1f}")
+
+    for module_name, _ in PAGES.values():
+        times = import_times(f'import streamlit; import {module_name}')
+        new_imports = {name: t for name, t in times.items() if name not in base and name != module_name}
+        # Report top-level packages only, their cumulative time includes submodules
+        heaviest = sorted(
+            ((name.split('.')[0], t[1]) for name, t in new_imports.items() if '.' not in name),
+            key=lambda item: -item[1],
+        )[:TOP_IMPORTS]
+        summary = ', '.join(f'{name} {us / 1000:.0f}ms' for name, us in heaviest)
+        print(f"{module_name:<20}{times[module_name][1] / 1000:>14.1f}  {summary}")
+
+    eager = first_render_seconds(EAGER_APP)
+    lazy = first_render_seconds(LAZY_APP)
+    print()
+    print(f"Cold start to first render, all pages imported up front: {eager:.2f} s")
+    print(f"Cold start to first render, lazy page registry:          {lazy:.2f} s ({lazy / eager:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 100_000
+MAX_LAG = 10
+
+
+# Pairwise-complete correlation from chunked sufficient statistics, like DataFrame.corr() but in one
+# streaming pass. For every column pair it keeps the count, both means, both centered sums of squares
+# and the co-moment over the rows where both values are present; chunks are merged with Chan's update.
+class CorrelationAccumulator:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        p = len(self.columns)
+        self.n = np.zeros((p, p))
+        self.mean_x = np.zeros((p, p))   # mean of column i over rows where i and j are present
+        self.m2_x = np.zeros((p, p))
+        self.comoment = np.zeros((p, p))
+
+    def update(self, frame):
+        X = frame[self.columns].to_numpy(dtype=float)
+        present = ~np.isnan(X)
+        # Shift by the chunk means first so the chunk's own sums do not cancel catastrophically
+        counts = present.sum(axis=0)
+        shift = np.where(counts > 0, np.where(present, X, 0.0).sum(axis=0) / np.maximum(counts, 1), 0.0)
+        Xc = np.where(present, X - shift, 0.0)
+        W = present.astype(float)
+
+        n = W.T @ W
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_c = np.where(n > 0, (Xc.T @ W) / n, 0.0)
+        mean_x = mean_c + shift[:, None]
+        m2_x = (Xc ** 2).T @ W - n * mean_c ** 2
+        comoment = Xc.T @ Xc - n * mean_c * mean_c.T
+        self._merge(n, mean_x, m2_x, comoment)
+        return self
+
+    def merge(self, other):
+        self._merge(other.n, other.mean_x, other.m2_x, other.comoment)
+        return self
+
+    def _merge(self, n_b, mean_b, m2_b, comoment_b):
+        n = self.n + n_b
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(n > 0, self.n * n_b / n, 0.0)
+            delta = mean_b - self.mean_x
+            self.mean_x = np.where(n > 0, self.mean_x + delta * np.where(n > 0, n_b / n, 0.0), 0.0)
+        self.m2_x = self.m2_x + m2_b + delta ** 2 * weight
+        self.comoment = self.comoment + comoment_b + delta * delta.T * weight
+        self.n = n
+
+    def correlation(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = self.comoment / np.sqrt(self.m2_x * self.m2_x.T)
+        corr[self.n < 2] = np.nan
+        np.fill_diagonal(corr, np.where(np.diag(self.m2_x) > 0, 1.0, np.nan))
+        return pd.DataFrame(np.clip(corr, -1, 1), index=self.columns, columns=self.columns)
+
+
+# Read a CSV in chunks, optionally transforming every chunk
+def read_chunks(path, chunk_rows=CHUNK_ROWS, transform=None):
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        yield transform(chunk) if transform else chunk
+
+
+# Add future values column_expected_1..max_lag (column.shift(-k)) to a stream of chunks.
+# The last max_lag rows of each chunk are held back until the next chunk completes their window;
+# at the end of the stream the missing future values are NaN, as with shift.
+def with_lags(chunks, column, max_lag=MAX_LAG):
+    carry = None
+    for chunk in chunks:
+        frame = chunk if carry is None else pd.concat([carry, chunk], ignore_index=True)
+        ready, carry = frame.iloc[:max(len(frame) - max_lag, 0)], frame.iloc[max(len(frame) - max_lag, 0):]
+        if len(ready):
+            yield add_lags(ready, frame[column].to_numpy(dtype=float), column, max_lag)
+    if carry is not None and len(carry):
+        yield add_lags(carry, carry[column].to_numpy(dtype=float), column, max_lag)
+
+
+def add_lags(ready, window, column, max_lag):
+    ready = ready.copy()
+    padded = np.concatenate([window, np.full(max_lag, np.nan)])
+    for lag in range(1, max_lag + 1):
+        ready[f'{column}_expected_{lag}'] = padded[lag:lag + len(ready)]
+    return ready
+
+
+# Correlation matrix of the numeric columns of a chunk stream (columns taken from the first chunk)
+def correlation_matrix(chunks, columns=None):
+    accumulator = None
+    for chunk in chunks:
+        if accumulator is None:
+            accumulator = CorrelationAccumulator(columns or chunk.select_dtypes(include='number').columns)
+        accumulator.update(chunk)
+    return accumulator.correlation()
+
+
+# One pass producing both the full numeric correlation matrix and the lagged-temperature matrix
+def correlation_report(chunks, column='temp', target='cnt', extra=('atemp',), max_lag=MAX_LAG):
+    lag_columns = [f'{column}_expected_{lag}' for lag in range(1, max_lag + 1)]
+    numeric = lagged = None
+    for chunk in with_lags(chunks, column, max_lag):
+        if numeric is None:
+            numeric = CorrelationAccumulator(chunk.drop(columns=lag_columns).select_dtypes(include='number').columns)
+            lagged = CorrelationAccumulator(lag_columns + [column, *extra, target])
+        numeric.update(chunk)
+        lagged.update(chunk)
+    return numeric.correlation(), lagged.correlation()
+
+
+if __name__ == '__main__':
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'hour.csv'
+    numeric, lagged = correlation_report(read_chunks(path))
+    print(numeric.round(2).to_string())
+    print(lagged['cnt'].round(4).to_string())
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder
+from scoring import FEATURE_COLUMNS
+
+DATA_PATH = 'hour.csv'
+TARGET = 'cnt'
+CATEGORICAL_FEATURES = ['yr', 'mnth', 'weathersit']
+# Same split as the notebook, so metrics stay comparable
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+# Training engines: classic GradientBoostingRegressor behind the one-hot encoder,
+# or HistGradientBoostingRegressor with native categorical splits on the raw codes
+ENGINES = ['gbr', 'hgb']
+
+# Taken from the middle of the notebook's RandomizedSearchCV space
+GBR_PARAMS = {
+    'n_estimators': 500,
+    'learning_rate': 0.05,
+    'max_depth': 5,
+    'min_samples_split': 40,
+    'min_samples_leaf': 8,
+    'subsample': 0.9,
+}
+
+HGB_PARAMS = {
+    'max_iter': 500,
+    'learning_rate': 0.1,
+    'max_leaf_nodes': 63,
+    'min_samples_leaf': 10,
+    'early_stopping': False,
+}
+
+
+# Reproduce the notebook's feature engineering on a raw hour.csv frame.
+# target may be a list of columns (casual, registered) for multi-output models; features always use cnt.
+def prepare_training_data(data, target=TARGET):
+    data = data.copy()
+
+    # Denormalize to the units used by the Simulation page
+    data['temp'] = data['temp'] * 41
+    data['hum'] = data['hum'] * 100
+
+    # Hourly averages per (mnth, weekday, hr), split by working and non-working days
+    keys = pd.MultiIndex.from_frame(data[['mnth', 'weekday', 'hr']])
+    workingday_counts = data[data['workingday'] == 1].groupby(['mnth', 'weekday', 'hr'])[TARGET].mean()
+    non_workingday_counts = data[data['workingday'] == 0].groupby(['mnth', 'weekday', 'hr'])[TARGET].mean()
+    is_workingday = data['workingday'].to_numpy() == 1
+    data['hourly_avg_workingday'] = np.where(is_workingday, workingday_counts.reindex(keys).fillna(0).to_numpy(), 0)
+    data['hourly_avg_nonworkingday'] = np.where(~is_workingday, non_workingday_counts.reindex(keys).fillna(0).to_numpy(), 0)
+
+    # 1-hour lagged (expected) temperature, the last hour has no successor and is filled with 0
+    data['temp_expected_1'] = data['temp'].shift(-1).fillna(0)
+
+    return data[FEATURE_COLUMNS], data[target]
+
+
+# Load hour.csv and return the model features and target
+def load_training_data(path=DATA_PATH, target=TARGET):
+    return prepare_training_data(pd.read_csv(path), target)
+
+
+def split_training_data(X, y):
+    return train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+
+
+# One-hot encoder used in front of the tree ensembles
+def make_encoder():
+    return ColumnTransformer(
+        transformers=[
+            ('ohe', OneHotEncoder(drop='first', handle_unknown='ignore', sparse_output=False), CATEGORICAL_FEATURES)
+        ],
+        remainder='passthrough'
+    )
+
+
+# Identity step so every engine's pipeline has an 'encoder' to encode shared feature matrices with
+def make_passthrough_encoder():
+    return FunctionTransformer(feature_names_out='one-to-one')
+
+
+# Unfitted pipeline for a training engine, with the same feature columns as gbr_pipeline
+def build_pipeline(engine='gbr', params=None):
+    if engine == 'gbr':
+        regressor = GradientBoostingRegressor(random_state=RANDOM_STATE, **{**GBR_PARAMS, **(params or {})})
+        return Pipeline([('encoder', make_encoder()), ('regressor', regressor)])
+    if engine == 'hgb':
+        # yr, mnth and weathersit are small non-negative integer codes, usable as native categories
+        regressor = HistGradientBoostingRegressor(categorical_features=CATEGORICAL_FEATURES, random_state=RANDOM_STATE,
+                                                  **{**HGB_PARAMS, **(params or {})})
+        return Pipeline([('encoder', make_passthrough_encoder()), ('regressor', regressor)])
+    raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+
+
+# Train an engine on the notebook split and write a model artifact: python training.py [gbr|hgb] [model]
+if __name__ == '__main__':
+    import sys
+    from model_store import export_model
+
+    engine = sys.argv[1] if len(sys.argv) > 1 else 'gbr'
+    directory = sys.argv[2] if len(sys.argv) > 2 else 'model'
+    X, y = load_training_data()
+    X_train, X_test, y_train, y_test = split_training_data(X, y)
+    pipeline = build_pipeline(engine).fit(X_train, y_train)
+    manifest = export_model(pipeline, directory, X_train, y_train, X_test, y_test)
+    print(manifest['metrics'])
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from scoring import FEATURE_COLUMNS, calculate_features
+
+DEFAULT_SAMPLES = 10_000
+TEMP_NOISE_SD = 2.0   # °C, spread of the hourly temperature forecast error
+HUM_NOISE_SD = 8.0    # percentage points of humidity forecast error
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Hour-to-hour weathersit transitions (rows: current state 1-4, columns: next state 1-4),
+# estimated from consecutive hours in hour.csv. Heavy rain/snow has only 3 observations,
+# so it is set to persist half of the time instead of the observed 0.
+WEATHER_TRANSITIONS = np.array([
+    [0.920, 0.071, 0.009, 0.000],
+    [0.178, 0.737, 0.085, 0.000],
+    [0.073, 0.273, 0.652, 0.002],
+    [0.000, 0.000, 0.500, 0.500],
+])
+
+# Temperature and humidity are rounded to this resolution so repeated scenarios are scored once
+TEMP_RESOLUTION = 0.5
+HUM_RESOLUTION = 1.0
+
+
+# Estimate the weathersit transition matrix from consecutive hours of an hourly history
+def weather_transitions(data):
+    states = data['weathersit'].to_numpy() - 1
+    counts = np.zeros((4, 4))
+    np.add.at(counts, (states[:-1], states[1:]), 1)
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, totals, out=np.eye(4), where=totals > 0)
+
+
+# Sample weathersit paths for every scenario, vectorized over samples and looping over hours.
+# Each path follows the Markov chain and restarts from the forecast whenever the forecast changes.
+def sample_weather(forecast_states, n_samples, rng, transitions=WEATHER_TRANSITIONS):
+    forecast_states = np.asarray(forecast_states, dtype=int)
+    cumulative = np.cumsum(transitions, axis=1)
+    states = np.empty((n_samples, len(forecast_states)), dtype=int)
+
+    previous = np.full(n_samples, forecast_states[0])
+    for h, forecast in enumerate(forecast_states):
+        if h > 0 and forecast != forecast_states[h - 1]:
+            previous = np.full(n_samples, forecast)
+        u = rng.random(n_samples)[:, None]
+        previous = (u > cumulative[previous - 1]).sum(axis=1).clip(0, 3) + 1
+        states[:, h] = previous
+    return states
+
+
+# Draw perturbed copies of the hourly scenarios and score them all in one batched predict,
+# or by table lookup when a precomputed prediction surface is given.
+# Returns an (n_samples, hours) array of clipped predictions.
+def simulate_predictions(pipeline, scenarios, workingday_counts, non_workingday_counts,
+                         n_samples=DEFAULT_SAMPLES, temp_sd=TEMP_NOISE_SD, hum_sd=HUM_NOISE_SD,
+                         transitions=WEATHER_TRANSITIONS, seed=None, surface=None):
+    rng = np.random.default_rng(seed)
+    base = calculate_features(scenarios, workingday_counts, non_workingday_counts)
+    hours = len(base)
+
+    temp = base['temp_expected_1'].to_numpy(dtype=float) + rng.normal(0, temp_sd, (n_samples, hours))
+    hum = base['hum'].to_numpy(dtype=float) + rng.normal(0, hum_sd, (n_samples, hours))
+    # Kept inside the -20..50 °C range the page accepts, which is also the range the surface covers
+    temp = np.clip(np.round(temp / TEMP_RESOLUTION) * TEMP_RESOLUTION, -20, 50)
+    hum = np.clip(np.round(hum / HUM_RESOLUTION) * HUM_RESOLUTION, 0, 100)
+    weathersit = sample_weather(base['weathersit'].to_numpy(), n_samples, rng, transitions)
+
+    # Only temperature, humidity and weather vary, so score each distinct (hour, temp, hum, weather) once
+    hour_index = np.broadcast_to(np.arange(hours), (n_samples, hours))
+    keys = np.column_stack([hour_index.ravel(), temp.ravel(), hum.ravel(), weathersit.ravel()])
+    unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+
+    # The surface is indexed by the calendar columns, the pipeline by the model features
+    features = (scenarios if surface is not None else base).iloc[unique_keys[:, 0].astype(int)].reset_index(drop=True)
+    features['temp_expected_1'] = unique_keys[:, 1]
+    features['hum'] = unique_keys[:, 2]
+    features['weathersit'] = unique_keys[:, 3].astype(int)
+    if surface is not None:
+        predictions = surface.predict(features)
+    else:
+        predictions = np.clip(pipeline.predict(features[FEATURE_COLUMNS]), 0, None)
+
+    return predictions[inverse.ravel()].reshape(n_samples, hours)
+
+
+# Percentile bands per hour from a sample matrix
+def percentile_bands(samples, percentiles=PERCENTILES):
+    bands = np.percentile(samples, percentiles, axis=0)
+    frame = pd.DataFrame(bands.T, columns=[f'p{p}' for p in percentiles])
+    frame['mean'] = samples.mean(axis=0)
+    return frame